@@ -0,0 +1,102 @@
+"""
+Fixtures and options for the API benchmark suite (pytest benchmarks).
+
+Every test runs once per --bench-scales value against a data set built by
+production.demo at that scale (seeded, so every run measures the same
+rows). Results are compared with benchmarks/baselines.json, kept per
+database vendor; --bench-update records the current numbers instead.
+"""
+import json
+import pathlib
+
+import pytest
+from django.db import connection
+
+from production import demo
+
+SEED = 42
+BASELINES = pathlib.Path(__file__).with_name('baselines.json')
+
+def pytest_addoption(parser):
+	group = parser.getgroup('benchmarks')
+	group.addoption('--bench-scales', default='0.2,1', help='Comma separated data set scales (production/demo.py units)')
+	group.addoption('--bench-repeat', type=int, default=5, help='Timed requests per endpoint; the median is compared')
+	group.addoption('--bench-tolerance', type=float, default=1.0, help='Allowed slowdown/memory growth over baseline (1.0 = 2x)')
+	group.addoption('--bench-update', action='store_true', help='Write the measurements to the baselines file')
+	group.addoption('--bench-baselines', default=str(BASELINES), help='Baselines file')
+
+def pytest_generate_tests(metafunc):
+	if 'dataset' in metafunc.fixturenames:
+		scales = [float(scale) for scale in metafunc.config.getoption('--bench-scales').split(',')]
+		metafunc.parametrize('dataset', scales, indirect=True, scope='session', ids=lambda scale: f"scale={scale:g}")
+
+@pytest.fixture(scope='session')
+def dataset(request, django_db_setup, django_db_blocker):
+	"""The scale of the data set now loaded (committed, so every test sees it)"""
+	with django_db_blocker.unblock():
+		demo.reset()
+		demo.generate(request.param, seed=SEED, log=lambda message: None)
+	return request.param
+
+class Baselines:
+	"""Measurements by vendor, endpoint and scale, and the budgets derived from them"""
+
+	def __init__(self, path, tolerance):
+		self.path = pathlib.Path(path)
+		self.tolerance = tolerance
+		self.data = json.loads(self.path.read_text()) if self.path.exists() else {}
+		self.results = []
+
+	def get(self, name, scale):
+		return self.data.get(connection.vendor, {}).get(name, {}).get(f"{scale:g}")
+
+	def record(self, name, scale, measured):
+		self.results.append((name, scale, measured))
+
+	def check(self, name, scale, measured):
+		"""Budget violations of measured against the stored baseline, as messages"""
+		baseline = self.get(name, scale)
+		if baseline is None:
+			return []
+		problems = []
+		if measured['queries'] > baseline['queries']:
+			problems.append(f"{measured['queries']} queries, baseline {baseline['queries']}")
+		# Small absolute allowances keep very fast endpoints from flapping
+		seconds = baseline['seconds'] * (1 + self.tolerance) + 0.01
+		if measured['seconds'] > seconds:
+			problems.append(f"{measured['seconds'] * 1000:.1f}ms, budget {seconds * 1000:.1f}ms")
+		peak = baseline['peak_kib'] * (1 + self.tolerance) + 256
+		if measured['peak_kib'] > peak:
+			problems.append(f"peak {measured['peak_kib']}KiB, budget {peak:.0f}KiB")
+		return problems
+
+	def save(self):
+		vendor = self.data.setdefault(connection.vendor, {})
+		for name, scale, measured in self.results:
+			vendor.setdefault(name, {})[f"{scale:g}"] = measured
+		self.data[connection.vendor] = {name: dict(sorted(scales.items())) for name, scales in sorted(vendor.items())}
+		self.path.write_text(json.dumps(self.data, indent=1, sort_keys=True) + '\n')
+
+@pytest.fixture(scope='session')
+def baselines(request):
+	store = Baselines(request.config.getoption('--bench-baselines'), request.config.getoption('--bench-tolerance'))
+	request.config._bench_baselines = store
+	yield store
+	if request.config.getoption('--bench-update'):
+		store.save()
+
+def pytest_terminal_summary(terminalreporter, config):
+	store = getattr(config, '_bench_baselines', None)
+	if store is None or not store.results:
+		return
+	terminalreporter.section('API benchmarks')
+	terminalreporter.write_line(f"{'endpoint':<40} {'scale':>6} {'median ms':>10} {'queries':>8} {'peak KiB':>9}  baseline")
+	for name, scale, measured in store.results:
+		baseline = store.get(name, scale)
+		compared = (
+			f"{baseline['seconds'] * 1000:.1f}ms / {baseline['queries']}q / {baseline['peak_kib']}KiB"
+			if baseline else 'none'
+		)
+		terminalreporter.write_line(
+			f"{name:<40} {scale:>6g} {measured['seconds'] * 1000:>10.1f} {measured['queries']:>8} {measured['peak_kib']:>9}  {compared}"
+		)
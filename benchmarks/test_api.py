@@ -0,0 +1,130 @@
+"""
+Latency, query and memory budgets for every GET route of the API routers.
+
+Endpoints are discovered from the production and quality routers, so a
+new viewset or @action is benchmarked without being listed here; only
+routes that need query parameters or a particular object to do real work
+are configured below. Each request runs with an empty cache, so the
+response cache cannot hide a regression.
+
+Checks per endpoint and scale:
+- median latency and peak traced memory within the baseline budget;
+- no more queries than the baseline (query counts are exact);
+- paginated responses issue the same number of queries for a page of 5
+  as for a page of 50.
+"""
+import statistics
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from production.urls import router as production_router
+from quality.urls import router as quality_router
+
+# Query strings for routes that need them or would otherwise do little work
+PARAMS = {
+	'equipment-impact': {'since': '2000-01-01'},
+	'equipment-impact-export': {'since': '2000-01-01'},
+	'job-by-status': {'status': 'IN_PROCESS'},
+	'spc-chart': {'limit': '500'},
+}
+SMALL_PAGE, LARGE_PAGE = 5, 50
+
+@dataclass
+class Endpoint:
+	name: str
+	model: type
+	detail: bool
+
+	def url(self):
+		if not self.detail:
+			return reverse(self.name)
+		# The middle row by primary key: the same object for the same seed
+		pks = self.model._default_manager.order_by('pk').values_list('pk', flat=True)
+		count = pks.count()
+		if not count:
+			pytest.skip(f"No {self.model._meta.verbose_name} rows at this scale")
+		return reverse(self.name, kwargs={'pk': pks[count // 2]})
+
+def discover():
+	endpoints = []
+	for router in (production_router, quality_router):
+		for pattern in router.urls:
+			actions = getattr(pattern.callback, 'actions', None) or {}
+			groups = pattern.pattern.regex.groupindex
+			if 'get' not in actions or 'format' in groups:
+				continue
+			endpoints.append(Endpoint(pattern.name, pattern.callback.cls.queryset.model, 'pk' in groups))
+	return endpoints
+
+ENDPOINTS = discover()
+
+def fetch(client, url, params):
+	response = client.get(url, params)
+	if response.streaming:
+		for _ in response.streaming_content:
+			pass
+	return response
+
+def measure(client, url, params, repeat):
+	"""Median seconds over repeat cold-cache requests (after one warm-up), queries and peak memory"""
+	timings = []
+	for _ in range(repeat + 1):
+		cache.clear()
+		with CaptureQueriesContext(connection) as queries:
+			began = time.perf_counter()
+			response = fetch(client, url, params)
+			timings.append(time.perf_counter() - began)
+		# Read now: the next request outside the context resets the query log
+		count = len(queries)
+		assert response.status_code == 200, f"{url}: {response.status_code}"
+
+	cache.clear()
+	tracemalloc.start()
+	try:
+		fetch(client, url, params)
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	measured = {
+		'seconds': round(statistics.median(timings[1:]), 5),
+		'queries': count,
+		'peak_kib': peak // 1024,
+	}
+	return measured, response
+
+def query_count(client, url, params):
+	cache.clear()
+	with CaptureQueriesContext(connection) as queries:
+		fetch(client, url, params)
+	return len(queries)
+
+@pytest.fixture
+def client(settings):
+	# Document endpoints render on the first request and serve the stored file afterwards
+	settings.CELERY_TASK_ALWAYS_EAGER = True
+	settings.MEDIA_ROOT = tempfile.mkdtemp()
+	return APIClient()
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS, ids=lambda endpoint: endpoint.name)
+def test_endpoint_budget(endpoint, dataset, db, client, baselines, request):
+	url, params = endpoint.url(), PARAMS.get(endpoint.name, {})
+	measured, response = measure(client, url, params, request.config.getoption('--bench-repeat'))
+	baselines.record(endpoint.name, dataset, measured)
+
+	if not response.streaming and isinstance(getattr(response, 'data', None), dict) and 'results' in response.data:
+		small = query_count(client, url, {**params, 'page_size': SMALL_PAGE})
+		large = query_count(client, url, {**params, 'page_size': LARGE_PAGE})
+		assert small == large, f"{endpoint.name}: {small} queries for {SMALL_PAGE} rows, {large} for {LARGE_PAGE}"
+
+	if not request.config.getoption('--bench-update'):
+		problems = baselines.check(endpoint.name, dataset, measured)
+		assert not problems, f"{endpoint.name} at scale {dataset:g} over budget: {'; '.join(problems)}"
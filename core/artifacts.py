@@ -0,0 +1,120 @@
+"""
+Content-addressed store for generated documents (PDF/XLSX).
+
+An artifact's name is the hash of everything that goes into it, so an
+unchanged document is rendered once and every later download is a file
+read; any change to the source data gives a new name and a fresh render.
+Old files are never served again; sweep_artifacts() (the sweep_artifacts
+command) deletes those older than ARTIFACTS['MAX_AGE_DAYS'], and a swept
+document that is still wanted is simply rendered again.
+
+Rendering runs in Celery workers. enqueue_render() starts at most one task
+per artifact at a time; the API answers 202 with a status URL meanwhile.
+"""
+import hashlib
+import json
+import tempfile
+import uuid
+from datetime import timedelta
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+def config():
+	return getattr(settings, 'ARTIFACTS', {})
+
+def content_hash(payload):
+	"""sha256 of a JSON-serializable description of the document's contents"""
+	encoded = json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder, separators=(',', ':'))
+	return hashlib.sha256(encoded.encode()).hexdigest()
+
+def artifact_path(kind, digest, extension):
+	return f"{config().get('LOCATION', 'artifacts')}/{kind}/{digest[:2]}/{digest}.{extension}"
+
+def artifact_exists(path):
+	return default_storage.exists(path)
+
+def save_artifact(path, write):
+	"""
+	Store the output of write(file) under path unless it is already there.
+
+	write() gets a binary temporary file, so large documents are spooled to
+	disk rather than built up in memory.
+	"""
+	if default_storage.exists(path):
+		return path
+	with tempfile.TemporaryFile() as spool:
+		write(spool)
+		spool.seek(0)
+		saved = default_storage.save(path, File(spool))
+	if saved != path:
+		# Another worker stored the same content first
+		default_storage.delete(saved)
+	return path
+
+def artifact_response(request, path, filename, content_type):
+	"""Serve a stored artifact; its content hash doubles as the ETag"""
+	etag = quote_etag(path.rsplit('/', 1)[-1].split('.')[0])
+	if etag in parse_etags(request.headers.get('If-None-Match', '')):
+		return HttpResponseNotModified(headers={'ETag': etag})
+	response = FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+	response['ETag'] = etag
+	return response
+
+def enqueue_render(task, path, *args):
+	"""
+	Start task(*args) unless a render of path is already running.
+
+	Returns the task's AsyncResult (the running one when deduplicated). The
+	task must call release_render(path) when it finishes.
+	"""
+	lock = f"artifact-render:{path}"
+	task_id = str(uuid.uuid4())
+	if not cache.add(lock, task_id, config().get('RENDER_LOCK_TIMEOUT', 600)):
+		return AsyncResult(cache.get(lock) or task_id)
+	try:
+		return task.apply_async(args=args, task_id=task_id)
+	except Exception:
+		release_render(path)
+		raise
+
+def release_render(path):
+	"""Called by render tasks when done so the next change can be rendered"""
+	cache.delete(f"artifact-render:{path}")
+
+def pending_response(request, result, **extra):
+	return Response({
+		'task_id': result.id,
+		'status_url': reverse('task-status', kwargs={'task_id': result.id}, request=request),
+		**extra,
+	}, status=202)
+
+def stored_artifacts(directory=None):
+	"""Paths of every stored artifact file"""
+	directory = directory or config().get('LOCATION', 'artifacts')
+	if not default_storage.exists(directory):
+		return
+	directories, files = default_storage.listdir(directory)
+	for name in files:
+		yield f"{directory}/{name}"
+	for name in directories:
+		yield from stored_artifacts(f"{directory}/{name}")
+
+def sweep_artifacts(max_age_days=None):
+	"""Delete artifacts last written more than max_age_days ago; returns how many"""
+	if max_age_days is None:
+		max_age_days = config().get('MAX_AGE_DAYS', 30)
+	cutoff = timezone.now() - timedelta(days=max_age_days)
+	expired = [path for path in stored_artifacts() if default_storage.get_modified_time(path) < cutoff]
+	for path in expired:
+		default_storage.delete(path)
+	return len(expired)
@@ -0,0 +1,211 @@
+"""
+Async read path for list endpoints polled by many dashboards at once.
+
+Under WSGI every request holds a worker thread until it returns, including a
+dashboard poll that finds nothing new. AsyncListView serves a viewset's list
+(or a list @action) from an async view instead, served under ASGI
+(uvicorn core.asgi:application):
+
+- the ETag is built like CachedResponseMixin's, from the model version
+  counters, read with the async cache API;
+- If-None-Match plus ?wait=<seconds> makes the request a long poll: it sleeps
+  on the event loop, re-reading the versions every LONG_POLL['INTERVAL'], and
+  answers 200 as soon as a dependency changes, or 304 when the wait runs out;
+- otherwise the page is counted and fetched with the async ORM (acount() and
+  async iteration, prefetches included) and rendered by the viewset's
+  serializer, FragmentCacheListSerializer rows coming from the cache with
+  aget_many().
+
+The viewset supplies the authentication classes, permissions, serializer,
+filters, cache_models and pagination, so the response matches the sync
+endpoint's for the same request. Authentication (sessions, HTTP Basic, any
+DRF authenticator), building the filtered queryset (django-filter validates
+ids against the database) and keyset pages run through sync_to_async.
+
+Under ASGI the sync parts of each request (ORM, cache, session) run on a
+thread of its own that idles while the view sleeps, so a waiting poll costs
+an idle thread instead of a worker other requests queue for. Database work
+happens in a bounded number of slots that close their connection on exit
+(see database_slot), so waiting polls hold no connection and a change that
+wakes every dashboard does not exceed the server's max_connections. Every
+middleware in MIDDLEWARE must be async capable, or Django runs the chain,
+and the wait, on a worker thread again.
+
+Settings (optional) in settings.LONG_POLL:
+    MAX_WAIT        longest ?wait= honoured, in seconds (30)
+    INTERVAL        how often a waiting request re-reads the versions (1.0)
+    DATABASE_SLOTS  async views using the database at once, per process (20)
+"""
+import asyncio
+import contextlib
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+
+from .caching import aget_versions, response_etag
+
+def config():
+	return {'MAX_WAIT': 30, 'INTERVAL': 1.0, 'DATABASE_SLOTS': 20, **getattr(settings, 'LONG_POLL', {})}
+
+_slots = weakref.WeakKeyDictionary()
+_render_locks = weakref.WeakValueDictionary()
+
+def close_connections():
+	# Not one in a transaction (a TestCase, ATOMIC_REQUESTS): closing it would roll that back
+	for connection in connections.all(initialized_only=True):
+		if not connection.in_atomic_block:
+			connection.close()
+
+@contextlib.asynccontextmanager
+async def database_slot():
+	"""
+	Database access for an async view, at most DATABASE_SLOTS at once per
+	event loop; the connection is closed on the way out.
+
+	Each request's sync parts run on a thread of its own, with a connection
+	of its own kept until the response: without the bound, every dashboard
+	waking at once on a change would open one.
+	"""
+	loop = asyncio.get_running_loop()
+	if loop not in _slots:
+		_slots[loop] = asyncio.Semaphore(config()['DATABASE_SLOTS'])
+	async with _slots[loop]:
+		try:
+			yield
+		finally:
+			await sync_to_async(close_connections)()
+
+class AsyncListView(View):
+	"""
+	GET-only async view of viewset.<action>; override get_queryset() for
+	actions that narrow the viewset's queryset.
+	"""
+	viewset = None
+	action = 'list'
+	http_method_names = ['get', 'head', 'options']
+
+	def get_queryset(self, viewset):
+		return viewset.get_queryset()
+
+	def get_viewset(self, request):
+		viewset = self.viewset(action=self.action, format_kwarg=None, args=(), kwargs={})
+		viewset.request = Request(
+			request,
+			authenticators=viewset.get_authenticators(),
+			negotiator=viewset.get_content_negotiator(),
+			parser_context=viewset.get_parser_context(request),
+		)
+		return viewset
+
+	def error_response(self, viewset, exc):
+		"""An APIException as JSON, with the 401/403 choice DRF's handle_exception makes"""
+		headers = {}
+		if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+			authenticate_header = viewset.get_authenticate_header(viewset.request)
+			if authenticate_header:
+				headers['WWW-Authenticate'] = authenticate_header
+			else:
+				exc.status_code = 403
+		detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+		return JsonResponse(detail, status=exc.status_code, safe=False, headers=headers)
+
+	async def get(self, request):
+		viewset = self.get_viewset(request)
+		try:
+			async with database_slot():
+				await sync_to_async(viewset.perform_authentication)(viewset.request)
+			viewset.check_permissions(viewset.request)
+		except APIException as exc:
+			return self.error_response(viewset, exc)
+		user = viewset.request.user
+		try:
+			wait = min(max(float(request.GET.get('wait', 0)), 0), config()['MAX_WAIT'])
+		except ValueError:
+			return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+
+		# ?wait= does not change the response, so a poll can reuse the ETag of a plain GET
+		query = request.GET.copy()
+		query.pop('wait', None)
+		path = f"{request.path}?{query.urlencode()}" if query else request.path
+		user_key = user.pk if user.is_authenticated else 'anon'
+		async def current_etag():
+			versions = await aget_versions(viewset.cache_models)
+			return response_etag(path, user_key, 'json', versions)
+
+		etag = await current_etag()
+		known = parse_etags(request.headers.get('If-None-Match', ''))
+		began = time.monotonic()
+		deadline = began + wait
+		while quote_etag(etag) in known and time.monotonic() < deadline:
+			await asyncio.sleep(min(config()['INTERVAL'], deadline - time.monotonic()))
+			etag = await current_etag()
+		# Not counted as slow by core.metrics
+		request.long_poll_seconds = time.monotonic() - began
+
+		headers = {'ETag': quote_etag(etag), 'Cache-Control': 'private, no-cache'}
+		if quote_etag(etag) in known:
+			return HttpResponse(status=304, headers=headers)
+
+		key = f"response:{etag}"
+		data = await cache.aget(key)
+		if data is None:
+			# Polls woken by the same change wait for the first one's rendering
+			lock_key = (asyncio.get_running_loop(), key)
+			lock = _render_locks.get(lock_key)
+			if lock is None:
+				lock = _render_locks[lock_key] = asyncio.Lock()
+			async with lock:
+				data = await cache.aget(key)
+				if data is None:
+					try:
+						async with database_slot():
+							data = await self.render(viewset)
+					except APIException as exc:
+						return self.error_response(viewset, exc)
+					await cache.aset(key, data, getattr(settings, 'RESPONSE_CACHE', {}).get('TIMEOUT', 300))
+		return JsonResponse(data, safe=False, headers=headers)
+
+	async def render(self, viewset):
+		"""The response data: a page (or all rows) serialized by the viewset's serializer"""
+		queryset = await sync_to_async(lambda: viewset.filter_queryset(self.get_queryset(viewset)))()
+		paginator = viewset.paginator
+		if paginator is None:
+			return await self.serialize(viewset, [row async for row in queryset])
+		use_keyset = getattr(paginator, 'use_keyset', None)
+		if use_keyset is not None and use_keyset(viewset.request):
+			rows = await sync_to_async(paginator.paginate_queryset)(queryset, viewset.request, viewset)
+			return paginator.get_paginated_response(await self.serialize(viewset, rows)).data
+
+		page_size = paginator.get_page_size(viewset.request)
+		if not page_size:
+			return await self.serialize(viewset, [row async for row in queryset])
+		# DRF's page-number pagination, with the count and the page read asynchronously
+		pages = paginator.django_paginator_class(queryset, page_size)
+		pages.count = await queryset.acount()
+		paginator.request = viewset.request
+		# PageOrCursorPagination answers with keyset links when this is set
+		paginator.keyset = None
+		page_number = paginator.get_page_number(viewset.request, pages)
+		try:
+			page = pages.page(page_number)
+		except InvalidPage as exc:
+			raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+		page.object_list = [row async for row in page.object_list]
+		paginator.page = page
+		return paginator.get_paginated_response(await self.serialize(viewset, page.object_list)).data
+
+	async def serialize(self, viewset, rows):
+		serializer = viewset.get_serializer(rows, many=True)
+		if hasattr(serializer, 'ato_representation'):
+			return await serializer.ato_representation(rows)
+		return serializer.data
@@ -0,0 +1,247 @@
+"""
+Response caching for read endpoints, invalidated by per-model version counters.
+
+Every tracked model has a version counter in the cache, bumped on write and
+after commit by post_save/post_delete (and explicitly by code paths that write with
+update()/bulk_create(), which send no signals). A viewset using
+CachedResponseMixin lists the models its output depends on in cache_models;
+the versions of those models, the full URL, the user, the renderer and the
+date make up the ETag. Then:
+
+- If-None-Match with the current ETag -> 304 Not Modified, no query at all
+- otherwise the serialized data is served from the cache under that ETag, or
+  computed and stored
+
+Any write to a dependency changes the ETag, so nothing has to be deleted.
+
+FragmentCacheListSerializer caches each row's representation by model, pk
+and updated_at, so when a list does change only the rows that changed are
+serialized again.
+Versions live in the default cache: use Redis (REDIS_URL) when more than one
+process serves the API, since local memory counters are per process.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.db.models.manager import BaseManager
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .mixins import related_model_for, relation_prefix
+
+VERSION_KEY = 'model-version:{}'
+
+def model_label(model):
+	return (model if isinstance(model, str) else model._meta.label).lower()
+
+def get_versions(models):
+	"""Current version of each model; a missing counter starts from the clock"""
+	keys = [VERSION_KEY.format(model_label(model)) for model in models]
+	versions = cache.get_many(keys)
+	for key in keys:
+		if key not in versions:
+			# Starting from the time keeps a counter that was evicted from
+			# going back to a value an old ETag was built from
+			cache.add(key, int(time.time() * 1000), timeout=None)
+			versions[key] = cache.get(key)
+	return [versions[key] for key in keys]
+
+async def aget_versions(models):
+	"""get_versions() with the async cache API, for async views"""
+	keys = [VERSION_KEY.format(model_label(model)) for model in models]
+	versions = await cache.aget_many(keys)
+	for key in keys:
+		if key not in versions:
+			await cache.aadd(key, int(time.time() * 1000), timeout=None)
+			versions[key] = await cache.aget(key)
+	return [versions[key] for key in keys]
+
+def response_etag(path, user, renderer_format, versions):
+	"""ETag of a cached response: the URL, the user and the versions of what it renders"""
+	# The date is part of it for fields computed against today (overdue, calibration due)
+	parts = [path, str(user), renderer_format, timezone.localdate().isoformat(), *map(str, versions)]
+	return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+def bump_versions(*models):
+	"""
+	Invalidate everything built from these models.
+
+	Bumped right away, so reads later in the same transaction miss the cache,
+	and again after commit, so nothing another request cached from the
+	pre-commit data under the first bump survives.
+	"""
+	def bump():
+		for model in models:
+			key = VERSION_KEY.format(model_label(model))
+			try:
+				cache.incr(key)
+			except ValueError:
+				cache.add(key, int(time.time() * 1000), timeout=None)
+	bump()
+	transaction.on_commit(bump)
+
+def _bump_sender(sender, **kwargs):
+	bump_versions(sender)
+
+def track_versions(*models):
+	"""Bump a model's version on every save/delete (call from AppConfig.ready)"""
+	for model in models:
+		uid = f"track-versions:{model_label(model)}"
+		post_save.connect(_bump_sender, sender=model, dispatch_uid=uid)
+		post_delete.connect(_bump_sender, sender=model, dispatch_uid=uid)
+
+class CachedResponseMixin:
+	"""
+	ETag/304 and a response data cache for list, retrieve and any GET
+	@action named in cached_actions.
+
+	cache_models: labels ('production.Job') of every model the response
+	renders, including related and ?expand= models. An @action can pass its
+	own (@action(cache_models=[...])).
+	"""
+	cache_models = []
+	cached_actions = ('list', 'retrieve')
+
+	def get_cache_timeout(self):
+		return getattr(settings, 'RESPONSE_CACHE', {}).get('TIMEOUT', 300)
+
+	def get_etag(self, request):
+		user = request.user.pk if request.user.is_authenticated else 'anon'
+		return response_etag(
+			request.get_full_path(), user, request.accepted_renderer.format, get_versions(self.cache_models),
+		)
+
+	def cached_response(self, request, handler, *args, **kwargs):
+		etag = self.get_etag(request)
+		headers = {'ETag': quote_etag(etag), 'Cache-Control': 'private, no-cache'}
+
+		if quote_etag(etag) in parse_etags(request.headers.get('If-None-Match', '')):
+			return Response(status=304, headers=headers)
+
+		key = f"response:{etag}"
+		data = cache.get(key)
+		if data is not None:
+			return Response(data, headers=headers)
+
+		response = handler(request, *args, **kwargs)
+		if response.status_code == 200:
+			cache.set(key, response.data, self.get_cache_timeout())
+			for name, value in headers.items():
+				response[name] = value
+		return response
+
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs)
+		if request.method == 'GET' and self.action in self.cached_actions and self.action not in ('list', 'retrieve'):
+			handler = getattr(self, self.action)
+			self.get = lambda request, *args, **kwargs: self.cached_response(request, handler, *args, **kwargs)
+
+	def list(self, request, *args, **kwargs):
+		if 'list' not in self.cached_actions:
+			return super().list(request, *args, **kwargs)
+		return self.cached_response(request, super().list, *args, **kwargs)
+
+	def retrieve(self, request, *args, **kwargs):
+		if 'retrieve' not in self.cached_actions:
+			return super().retrieve(request, *args, **kwargs)
+		return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+def rendered_models(model, serializer):
+	"""Labels of the related models a serializer reads (nested serializers, dotted sources)"""
+	labels = set()
+	for field in serializer.fields.values():
+		if field.write_only or field.source == '*':
+			continue
+		path = field.source.replace('.', '__')
+		if isinstance(field, serializers.BaseSerializer):
+			nested = field.child if isinstance(field, serializers.ListSerializer) else field
+			related = related_model_for(model, path)
+			if related is not None:
+				labels.add(model_label(related))
+				labels |= rendered_models(related, nested)
+			continue
+		joins, _ = relation_prefix(model, path)
+		parts = joins.split('__') if joins else []
+		for depth in range(1, len(parts) + 1):
+			labels.add(model_label(related_model_for(model, '__'.join(parts[:depth]))))
+	return labels
+
+class FragmentCacheListSerializer(serializers.ListSerializer):
+	"""
+	Caches each item's representation under (model, pk, updated_at, shape).
+
+	The shape covers the child serializer class, its fields (after ?fields=
+	and ?expand=) and the versions of the related models it renders, so an
+	edited customer name or an expanded operation change is picked up too.
+	All hits come back in one get_many; only the misses are serialized.
+
+	Use as Meta.list_serializer_class on serializers of models with stamp_field.
+	"""
+	stamp_field = 'updated_at'
+
+	def get_fragment_dependencies(self):
+		return sorted(rendered_models(self.child.Meta.model, self.child))
+
+	def get_fragment_prefix(self, versions=None):
+		model = self.child.Meta.model
+		if versions is None:
+			versions = get_versions(self.get_fragment_dependencies())
+		parts = [
+			f"{type(self.child).__module__}.{type(self.child).__qualname__}",
+			','.join(self.child.fields),
+			*map(str, versions),
+		]
+		shape = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+		return f"fragment:{model_label(model)}:{shape}"
+
+	def get_fragment_keys(self, items, prefix):
+		keys = []
+		for item in items:
+			stamp = getattr(item, self.stamp_field, None)
+			keys.append(f"{prefix}:{item.pk}:{stamp.timestamp()}" if stamp else None)
+		return keys
+
+	def merge_fragments(self, items, keys, cached):
+		"""(representation, {key: row} of the rows that had to be serialized)"""
+		representation, misses = [], {}
+		for item, key in zip(items, keys):
+			if key in cached:
+				representation.append(cached[key])
+				continue
+			row = self.child.to_representation(item)
+			representation.append(row)
+			if key:
+				misses[key] = row
+		return representation, misses
+
+	def get_fragment_timeout(self):
+		return getattr(settings, 'RESPONSE_CACHE', {}).get('FRAGMENT_TIMEOUT', 3600)
+
+	def to_representation(self, data):
+		items = list(data.all() if isinstance(data, BaseManager) else data)
+		if not items:
+			return []
+		keys = self.get_fragment_keys(items, self.get_fragment_prefix())
+		cached = cache.get_many([key for key in keys if key])
+		representation, misses = self.merge_fragments(items, keys, cached)
+		if misses:
+			cache.set_many(misses, self.get_fragment_timeout())
+		return representation
+
+	async def ato_representation(self, items):
+		"""to_representation() of already fetched rows with the async cache API (core.asyncviews)"""
+		if not items:
+			return []
+		prefix = self.get_fragment_prefix(await aget_versions(self.get_fragment_dependencies()))
+		keys = self.get_fragment_keys(items, prefix)
+		cached = await cache.aget_many([key for key in keys if key])
+		representation, misses = self.merge_fragments(items, keys, cached)
+		if misses:
+			await cache.aset_many(misses, self.get_fragment_timeout())
+		return representation
@@ -0,0 +1,19 @@
+"""
+Celery application for background work (document rendering and the like).
+
+Run a worker with:
+
+    celery -A core worker -l info
+
+Configuration comes from the CELERY_* settings. Without REDIS_URL tasks run
+eagerly in the calling process, which keeps development and tests broker-free.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+app = Celery('core')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,325 @@
+"""
+Request and database instrumentation, exported in Prometheus text format.
+
+MetricsMiddleware times each request and labels it with the resolved view
+name (e.g. 'job-list'), so label cardinality is bounded by the URLconf. A
+database execute wrapper installed on every connection counts queries and
+their time against the request in progress (tracked in a contextvar, so it
+also follows sync_to_async into the database thread), and logs statements
+slower than SLOW_QUERY_SECONDS. Time spent producing serializer.data is
+measured at the outermost serializer only.
+
+Everything is aggregated in memory under one lock per observation; nothing
+is written per request. GET /metrics renders the current totals. Each
+process keeps its own registry, so with several workers Prometheus sees
+one of them per scrape: scrape workers individually or run one per
+container.
+
+Settings (optional) in settings.METRICS:
+    ENABLED               install the middleware and query wrapper (True)
+    SLOW_QUERY_SECONDS    log queries slower than this; None disables (0.5)
+    SLOW_REQUEST_SECONDS  log requests slower than this; None disables (2.0)
+    TOKEN                 if set, /metrics requires "Authorization: Bearer <TOKEN>";
+                          otherwise only logged-in staff users can read it
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import got_request_exception, setting_changed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+@functools.cache
+def config():
+	return {
+		'ENABLED': True,
+		'SLOW_QUERY_SECONDS': 0.5,
+		'SLOW_REQUEST_SECONDS': 2.0,
+		'TOKEN': None,
+		**getattr(settings, 'METRICS', {}),
+	}
+
+def reset_config(setting, **kwargs):
+	if setting == 'METRICS':
+		config.cache_clear()
+
+setting_changed.connect(reset_config, dispatch_uid='core.metrics.config')
+
+# -- registry --------------------------------------------------------------
+
+def escape(value):
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def label_text(names, values, extra=()):
+	pairs = [*zip(names, values), *extra]
+	if not pairs:
+		return ''
+	return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+class Counter:
+	kind = 'counter'
+
+	def __init__(self, name, documentation, labels=()):
+		self.name = name
+		self.documentation = documentation
+		self.labels = labels
+		self.values = {}
+		self.lock = threading.Lock()
+
+	def inc(self, labels=(), amount=1):
+		with self.lock:
+			self.values[labels] = self.values.get(labels, 0) + amount
+
+	def clear(self):
+		with self.lock:
+			self.values.clear()
+
+	def samples(self):
+		with self.lock:
+			values = dict(self.values)
+		for labels, value in sorted(values.items()):
+			yield f"{self.name}{label_text(self.labels, labels)} {value:g}"
+
+class Histogram:
+	kind = 'histogram'
+
+	def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+		self.name = name
+		self.documentation = documentation
+		self.labels = labels
+		self.buckets = tuple(buckets)
+		# label values -> [count per bucket..., count above the last bucket, sum]
+		self.series = {}
+		self.lock = threading.Lock()
+
+	def observe(self, labels, value):
+		index = bisect.bisect_left(self.buckets, value)
+		with self.lock:
+			series = self.series.get(labels)
+			if series is None:
+				series = self.series[labels] = [0] * (len(self.buckets) + 2)
+			series[index] += 1
+			series[-1] += value
+
+	def clear(self):
+		with self.lock:
+			self.series.clear()
+
+	def samples(self):
+		with self.lock:
+			series = {labels: list(values) for labels, values in self.series.items()}
+		for labels, values in sorted(series.items()):
+			cumulative = 0
+			for bound, count in zip((*self.buckets, '+Inf'), values[:-1]):
+				cumulative += count
+				le = bound if bound == '+Inf' else f"{bound:g}"
+				yield f"{self.name}_bucket{label_text(self.labels, labels, [('le', le)])} {cumulative}"
+			yield f"{self.name}_sum{label_text(self.labels, labels)} {values[-1]:.6f}"
+			yield f"{self.name}_count{label_text(self.labels, labels)} {cumulative}"
+
+class Registry:
+	def __init__(self):
+		self.metrics = []
+
+	def register(self, metric):
+		self.metrics.append(metric)
+		return metric
+
+	def render(self):
+		lines = []
+		for metric in self.metrics:
+			lines.append(f"# HELP {metric.name} {metric.documentation}")
+			lines.append(f"# TYPE {metric.name} {metric.kind}")
+			lines.extend(metric.samples())
+		return '\n'.join(lines) + '\n'
+
+	def clear(self):
+		for metric in self.metrics:
+			metric.clear()
+
+registry = Registry()
+
+REQUEST_LABELS = ('view', 'method', 'status')
+request_seconds = registry.register(Histogram(
+	'http_request_duration_seconds', 'Time from middleware entry to response', REQUEST_LABELS,
+))
+request_queries = registry.register(Histogram(
+	'http_request_db_queries', 'Database queries per request', ('view', 'method'), QUERY_COUNT_BUCKETS,
+))
+request_query_seconds = registry.register(Histogram(
+	'http_request_db_seconds', 'Time spent in database queries per request', ('view', 'method'),
+))
+request_serializer_seconds = registry.register(Histogram(
+	'http_request_serializer_seconds', 'Time spent building serializer.data per request', ('view', 'method'),
+))
+request_exceptions = registry.register(Counter(
+	'http_request_exceptions_total', 'Requests that raised an unhandled exception', ('view', 'method'),
+))
+queries_outside_requests = registry.register(Counter(
+	'db_queries_outside_requests_total', 'Queries run outside a request (tasks, commands)', (),
+))
+slow_queries = registry.register(Counter(
+	'db_slow_queries_total', 'Queries slower than SLOW_QUERY_SECONDS', ('view',),
+))
+
+# -- per-request state -----------------------------------------------------
+
+class RequestStats:
+	__slots__ = ['view', 'queries', 'query_seconds', 'serializer_seconds', 'serializer_depth']
+
+	def __init__(self):
+		self.view = ''
+		self.queries = 0
+		self.query_seconds = 0.0
+		self.serializer_seconds = 0.0
+		self.serializer_depth = 0
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+def instrument_query(execute, sql, params, many, context):
+	"""Connection execute wrapper: attributes query count/time to the current request"""
+	began = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		elapsed = time.perf_counter() - began
+		stats = current.get()
+		if stats is not None:
+			stats.queries += 1
+			stats.query_seconds += elapsed
+		else:
+			queries_outside_requests.inc()
+		threshold = config()['SLOW_QUERY_SECONDS']
+		if threshold is not None and elapsed >= threshold:
+			view = stats.view if stats is not None else ''
+			slow_queries.inc((view,))
+			logger.warning("Slow query (%.3fs) in %s: %s", elapsed, view or '-', sql[:2000])
+
+def install_query_wrapper(sender, connection, **kwargs):
+	if instrument_query not in connection.execute_wrappers:
+		connection.execute_wrappers.append(instrument_query)
+
+def timed_data(prop):
+	"""Wrap a serializer's data property so only the outermost access is timed"""
+	def data(self):
+		stats = current.get()
+		if stats is None:
+			return prop.fget(self)
+		stats.serializer_depth += 1
+		began = time.perf_counter()
+		try:
+			return prop.fget(self)
+		finally:
+			stats.serializer_depth -= 1
+			if not stats.serializer_depth:
+				stats.serializer_seconds += time.perf_counter() - began
+	data.instrumented = True
+	return property(data)
+
+def install():
+	"""Hook the query wrapper into every connection and time serializer.data (idempotent)"""
+	connection_created.connect(install_query_wrapper, dispatch_uid='core.metrics')
+	from django.db import connections
+	for connection in connections.all(initialized_only=True):
+		install_query_wrapper(None, connection)
+	for cls in (serializers.Serializer, serializers.ListSerializer):
+		if not getattr(cls.data.fget, 'instrumented', False):
+			cls.data = timed_data(cls.data)
+
+# -- middleware and view ---------------------------------------------------
+
+class MetricsMiddleware:
+	"""Records per-view latency, query and serializer metrics; put it first in MIDDLEWARE"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.enabled = config()['ENABLED']
+		if self.enabled:
+			install()
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		if not self.enabled:
+			return self.get_response(request)
+		stats, token, began = self.start()
+		try:
+			response = self.get_response(request)
+		finally:
+			current.reset(token)
+		self.finish(request, response, stats, began)
+		return response
+
+	async def __acall__(self, request):
+		if not self.enabled:
+			return await self.get_response(request)
+		stats, token, began = self.start()
+		try:
+			response = await self.get_response(request)
+		finally:
+			current.reset(token)
+		self.finish(request, response, stats, began)
+		return response
+
+	def start(self):
+		stats = RequestStats()
+		return stats, current.set(stats), time.perf_counter()
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		stats = current.get()
+		if stats is not None and request.resolver_match is not None:
+			stats.view = request.resolver_match.view_name
+
+	def finish(self, request, response, stats, began):
+		elapsed = time.perf_counter() - began
+		view = stats.view or ('unmatched' if response.status_code == 404 else 'other')
+		method = request.method
+		request_seconds.observe((view, method, str(response.status_code)), elapsed)
+		request_queries.observe((view, method), stats.queries)
+		request_query_seconds.observe((view, method), stats.query_seconds)
+		if stats.serializer_seconds:
+			request_serializer_seconds.observe((view, method), stats.serializer_seconds)
+
+		threshold = config()['SLOW_REQUEST_SECONDS']
+		# Time a long poll spent waiting for a change (core.asyncviews) is not slowness
+		if threshold is not None and elapsed - getattr(request, 'long_poll_seconds', 0) >= threshold:
+			logger.warning(
+				"Slow request (%.3fs, %d queries in %.3fs, serializers %.3fs): %s %s",
+				elapsed, stats.queries, stats.query_seconds, stats.serializer_seconds, method, request.get_full_path(),
+			)
+
+def count_exception(sender, request=None, **kwargs):
+	stats = current.get()
+	if stats is not None and request is not None:
+		request_exceptions.inc((stats.view or 'other', request.method))
+
+got_request_exception.connect(count_exception, dispatch_uid='core.metrics')
+
+def metrics_view(request):
+	"""Prometheus text exposition of this process's metrics"""
+	token = config()['TOKEN']
+	if token:
+		allowed = constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+	else:
+		# Route names, latencies and error rates are not for anonymous visitors
+		allowed = request.user.is_active and request.user.is_staff
+	if not allowed:
+		return HttpResponseForbidden()
+	return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,136 @@
+"""
+Shared viewset mixins.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .serializers import query_param_list
+
+def optimize_queryset(queryset, serializer):
+	"""
+	Add the select_related/prefetch_related a serializer needs to render queryset
+	without a query per row.
+
+	- dotted sources ('customer.name') become select_related across forward
+	  foreign keys, or a prefetch once the path crosses a to-many relation
+	- nested serializers are select_related (single) or prefetched with a queryset
+	  that is optimized the same way for the nested serializer (many)
+	- many=True related fields are prefetched
+	"""
+	select, prefetch = related_lookups(queryset.model, serializer)
+	if select:
+		queryset = queryset.select_related(*sorted(select))
+	if prefetch:
+		queryset = queryset.prefetch_related(*(
+			Prefetch(path, queryset=child) if child is not None else path
+			for path, child in prefetch.items()
+		))
+	return queryset
+
+def related_lookups(model, serializer):
+	"""(select_related paths, {prefetch path: queryset or None}) for serializer"""
+	select, prefetch = set(), {}
+
+	for field in serializer.fields.values():
+		if field.write_only or field.source == '*':
+			continue
+		path = field.source.replace('.', '__')
+
+		if isinstance(field, serializers.ListSerializer):
+			related_model = related_model_for(model, path)
+			if related_model is not None:
+				prefetch[path] = optimize_queryset(related_model._default_manager.all(), field.child)
+		elif isinstance(field, serializers.BaseSerializer):
+			related_model = related_model_for(model, path)
+			if related_model is not None:
+				nested_select, nested_prefetch = related_lookups(related_model, field)
+				select.add(path)
+				select.update(f"{path}__{name}" for name in nested_select)
+				prefetch.update({f"{path}__{name}": child for name, child in nested_prefetch.items()})
+		elif isinstance(field, serializers.ManyRelatedField):
+			prefetch.setdefault(path, None)
+		else:
+			joins, to_many = relation_prefix(model, path)
+			if to_many:
+				prefetch.setdefault(joins, None)
+			elif joins:
+				select.add(joins)
+
+	return select, prefetch
+
+def related_model_for(model, path):
+	try:
+		for part in path.split('__'):
+			model = model._meta.get_field(part).related_model
+	except (FieldDoesNotExist, AttributeError):
+		return None
+	return model
+
+def relation_prefix(model, path):
+	"""
+	The relation part of a source path and whether it crosses a to-many relation.
+
+	'customer__name' -> ('customer', False); 'job__customer__name' -> ('job__customer', False);
+	'name' -> ('', False). Properties and unknown names end the walk.
+	"""
+	parts = path.split('__')
+	joins = []
+	for part in parts[:-1]:
+		try:
+			field = model._meta.get_field(part)
+		except FieldDoesNotExist:
+			break
+		if not field.is_relation:
+			break
+		joins.append(part)
+		if field.many_to_many or field.one_to_many:
+			return '__'.join(joins), True
+		model = field.related_model
+	return '__'.join(joins), False
+
+class OptimizedQuerysetMixin:
+	"""
+	Shapes the queryset to what the serializer will actually render:
+
+	- select_related/prefetch_related derived from the serializer's fields
+	  (see optimize_queryset), so relations are loaded only when rendered
+	- with ?fields=, model columns nobody asked for are deferred
+
+	Pair with core.serializers.DynamicFieldsMixin on the serializers.
+	"""
+
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		if self.request is None or self.request.method not in SAFE_METHODS:
+			return queryset
+
+		serializer = self.get_serializer()
+		queryset = optimize_queryset(queryset, serializer)
+
+		if query_param_list(self.request, 'fields'):
+			queryset = queryset.defer(*self.get_deferred_fields(queryset.model, serializer))
+		return queryset
+
+	def get_deferred_fields(self, model, serializer):
+		needed = set(self.get_ordering_names())
+		# Row fragment caches key on a stamp column (see core.caching)
+		list_serializer_class = getattr(getattr(serializer, 'Meta', None), 'list_serializer_class', None)
+		if list_serializer_class is not None:
+			needed.add(getattr(list_serializer_class, 'stamp_field', None))
+		for field in serializer.fields.values():
+			if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+				return []  # the method may read any column
+			needed.add(field.source.split('.')[0])
+
+		return [
+			field.name for field in model._meta.concrete_fields
+			if field.name not in needed and not field.primary_key and not field.is_relation
+		]
+
+	def get_ordering_names(self):
+		"""Fields the queryset may be ordered by; pagination reads them back off the rows"""
+		ordering = list(getattr(self, 'ordering', None) or [])
+		ordering += query_param_list(self.request, 'ordering')
+		return [name.lstrip('-').split('__')[0] for name in ordering]
@@ -0,0 +1,239 @@
+"""
+API pagination.
+
+PageOrCursorPagination keeps the default page-number behaviour and switches to
+keyset (cursor) pagination when a request opts in with ?pagination=cursor, or
+follows a next/previous link that carries a ?cursor= token.
+
+Keyset pages are fetched with a WHERE clause on the ordering fields of the last
+row seen instead of COUNT(*) + OFFSET, so page N costs the same as page 1 as
+long as an index covers the ordering (plus the id tie-breaker).
+
+StableOrderingFilter adds the same tie-breaker for page-number pages, so rows
+that tie on ?ordering= (e.g. priority) neither repeat nor go missing between pages.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+def tie_breaker(ordering):
+	"""pk in the direction of the last ordering field"""
+	return '-pk' if ordering and ordering[-1].startswith('-') else 'pk'
+
+class StableOrderingFilter(OrderingFilter):
+	"""OrderingFilter ending in the pk tie-breaker keyset pages use"""
+
+	def get_ordering(self, request, queryset, view):
+		ordering = super().get_ordering(request, queryset, view)
+		if not ordering:
+			return ordering
+		ordering = list(ordering)
+		if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+			ordering.append(tie_breaker(ordering))
+		return ordering
+
+class KeysetPagination(BasePagination):
+	cursor_query_param = 'cursor'
+	page_size_query_param = 'page_size'
+	max_page_size = 500
+	invalid_cursor_message = 'Invalid cursor'
+
+	def __init__(self, page_size=None):
+		self.page_size = page_size
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		self.ordering = self.get_ordering(request, queryset, view)
+
+		values, self.reverse = self.decode_cursor(request)
+		self.has_cursor = values is not None
+
+		ordering = [self.invert(field) for field in self.ordering] if self.reverse else self.ordering
+		queryset = queryset.order_by(*ordering)
+		if values is not None:
+			queryset = queryset.filter(self.keyset_filter(ordering, values))
+
+		rows = list(queryset[:self.page_size + 1])
+		self.has_more = len(rows) > self.page_size
+		rows = rows[:self.page_size]
+		if self.reverse:
+			rows.reverse()
+		self.page = rows
+		return rows
+
+	def get_paginated_response(self, data):
+		return Response({
+			'next': self.get_next_link(),
+			'previous': self.get_previous_link(),
+			'results': data,
+		})
+
+	def get_paginated_response_schema(self, schema):
+		return {
+			'type': 'object',
+			'required': ['results'],
+			'properties': {
+				'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+				'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+				'results': schema,
+			},
+		}
+
+	def get_page_size(self, request):
+		default = self.page_size or PageNumberPagination.page_size or 50
+		try:
+			requested = int(request.query_params[self.page_size_query_param])
+		except (KeyError, ValueError):
+			return default
+		return min(max(requested, 1), self.max_page_size)
+
+	# -- ordering ----------------------------------------------------------
+
+	def get_ordering(self, request, queryset, view):
+		"""
+		The view's effective ordering followed by a pk tie-breaker.
+
+		Nullable fields are dropped because NULL cannot take part in the keyset
+		comparison; the pk keeps the order total either way.
+		"""
+		ordering = None
+		if view is not None:
+			if any(issubclass(backend, OrderingFilter) for backend in getattr(view, 'filter_backends', [])):
+				ordering = OrderingFilter().get_ordering(request, queryset, view)
+			if not ordering:
+				ordering = getattr(view, 'ordering', None)
+		if not ordering:
+			ordering = queryset.query.order_by or queryset.model._meta.ordering
+		if isinstance(ordering, str):
+			ordering = [ordering]
+
+		fields = []
+		for field in ordering:
+			name = field.lstrip('-')
+			if name in ('pk', 'id', queryset.model._meta.pk.name):
+				break
+			if not self.is_nullable(queryset, name):
+				fields.append(field)
+		return fields + [tie_breaker(fields)]
+
+	@staticmethod
+	def is_nullable(queryset, name):
+		if name in queryset.query.annotations:
+			return getattr(queryset.query.annotations[name].output_field, 'null', False)
+		model, field = queryset.model, None
+		try:
+			for part in name.split('__'):
+				field = model._meta.get_field(part)
+				if field.null:
+					return True
+				model = field.related_model
+		except FieldDoesNotExist:
+			return True
+		return False
+
+	@staticmethod
+	def invert(field):
+		return field[1:] if field.startswith('-') else '-' + field
+
+	def keyset_filter(self, ordering, values):
+		"""
+		Rows strictly after values in the given ordering:
+		f1 >= v1 AND (f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...)
+
+		The redundant leading bound gives the planner an index range to start from.
+		"""
+		def bound(field, value, inclusive=False):
+			lookup = 'lt' if field.startswith('-') else 'gt'
+			return Q(**{f"{field.lstrip('-')}__{lookup}{'e' if inclusive else ''}": value})
+
+		after = Q()
+		for i, (field, value) in enumerate(zip(ordering, values)):
+			equal = Q(**{ordering[j].lstrip('-'): values[j] for j in range(i)})
+			after |= equal & bound(field, value)
+		return bound(ordering[0], values[0], inclusive=True) & after
+
+	# -- cursors -----------------------------------------------------------
+
+	def decode_cursor(self, request):
+		token = request.query_params.get(self.cursor_query_param)
+		if not token:
+			return None, False
+		try:
+			payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+			values, reverse = payload['v'], bool(payload.get('r'))
+		except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+			raise NotFound(self.invalid_cursor_message)
+		if not isinstance(values, list) or len(values) != len(self.ordering):
+			raise NotFound(self.invalid_cursor_message)
+		return values, reverse
+
+	def encode_cursor(self, instance, reverse):
+		values = [self.encode_value(self.value_for(instance, field)) for field in self.ordering]
+		token = base64.urlsafe_b64encode(json.dumps({'v': values, 'r': int(reverse)}).encode()).decode()
+		url = self.request.build_absolute_uri()
+		return replace_query_param(url, self.cursor_query_param, token)
+
+	@staticmethod
+	def value_for(instance, field):
+		value = instance
+		for part in field.lstrip('-').split('__'):
+			value = getattr(value, part)
+		return value
+
+	@staticmethod
+	def encode_value(value):
+		# Full precision (DjangoJSONEncoder would truncate microseconds)
+		if isinstance(value, (datetime.date, datetime.time)):
+			return value.isoformat()
+		if isinstance(value, decimal.Decimal):
+			return str(value)
+		return value
+
+	def get_next_link(self):
+		if not self.page:
+			return None
+		if self.reverse or self.has_more:
+			return self.encode_cursor(self.page[-1], reverse=False)
+		return None
+
+	def get_previous_link(self):
+		if not self.page or not self.has_cursor:
+			return None
+		if not self.reverse or self.has_more:
+			return self.encode_cursor(self.page[0], reverse=True)
+		return None
+
+class PageOrCursorPagination(PageNumberPagination):
+	"""Page numbers by default; keyset pages with ?pagination=cursor or ?cursor=..."""
+	mode_query_param = 'pagination'
+	keyset_class = KeysetPagination
+
+	def use_keyset(self, request):
+		params = request.query_params
+		return (
+			params.get(self.mode_query_param) == 'cursor'
+			or self.keyset_class.cursor_query_param in params
+		)
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.keyset = None
+		if self.use_keyset(request):
+			self.keyset = self.keyset_class(self.page_size)
+			return self.keyset.paginate_queryset(queryset, request, view)
+		return super().paginate_queryset(queryset, request, view)
+
+	def get_paginated_response(self, data):
+		if self.keyset is not None:
+			return self.keyset.get_paginated_response(data)
+		return super().get_paginated_response(data)
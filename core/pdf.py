@@ -0,0 +1,109 @@
+"""
+Minimal PDF writer that streams pages to the output file.
+
+reportlab's canvas keeps every page in memory until save(), which is fine for
+a quote but not for a report of thousands of lines. StreamingPDF writes each
+page's compressed content stream as soon as the page is finished and keeps
+only the byte offsets needed for the cross-reference table, so memory stays
+flat however many pages are written.
+
+It covers what tabular forms need: text in the standard Helvetica fonts
+(WinAnsi encoding, no embedding) and stroked rectangles. Use reportlab's
+stringWidth() to measure text.
+"""
+import zlib
+
+FONTS = {
+	'Helvetica': 'F1',
+	'Helvetica-Bold': 'F2',
+}
+
+def pdf_string(text):
+	raw = str(text).encode('cp1252', errors='replace')
+	return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+class StreamingPDF:
+	# Fixed object numbers; pages and their contents are numbered from FIRST_PAGE_OBJECT
+	CATALOG, PAGES, INFO = 1, 2, 3
+	FIRST_FONT_OBJECT = 4
+	FIRST_PAGE_OBJECT = FIRST_FONT_OBJECT + len(FONTS)
+
+	def __init__(self, file, pagesize, title=''):
+		self.file = file
+		self.width, self.height = pagesize
+		self.title = title
+		self.offsets = {}
+		self.page_objects = []
+		self.next_object = self.FIRST_PAGE_OBJECT
+		self.commands = None
+		self.position = 0
+		self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+	def write(self, data):
+		self.file.write(data)
+		self.position += len(data)
+
+	def write_object(self, number, body):
+		self.offsets[number] = self.position
+		self.write(f"{number} 0 obj\n".encode() + body + b'\nendobj\n')
+
+	# -- drawing -----------------------------------------------------------
+
+	def begin_page(self):
+		if self.commands is not None:
+			self.end_page()
+		self.commands = []
+
+	def text(self, x, y, string, font='Helvetica', size=8):
+		self.commands.append(b'BT /%s %g Tf %.2f %.2f Td %s Tj ET' % (
+			FONTS[font].encode(), size, x, y, pdf_string(string)
+		))
+
+	def rect(self, x, y, width, height, line_width=0.5):
+		self.commands.append(b'%g w %.2f %.2f %.2f %.2f re S' % (line_width, x, y, width, height))
+
+	def end_page(self):
+		content = zlib.compress(b'\n'.join(self.commands))
+		self.commands = None
+
+		content_number, page_number = self.next_object, self.next_object + 1
+		self.next_object += 2
+		self.write_object(
+			content_number,
+			f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode() + content + b'\nendstream',
+		)
+		fonts = ' '.join(
+			f"/{name} {self.FIRST_FONT_OBJECT + index} 0 R" for index, name in enumerate(FONTS.values())
+		)
+		self.write_object(page_number, (
+			f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {self.width:.2f} {self.height:.2f}] "
+			f"/Resources << /Font << {fonts} >> >> /Contents {content_number} 0 R >>"
+		).encode())
+		self.page_objects.append(page_number)
+
+	# -- document ----------------------------------------------------------
+
+	def close(self):
+		if self.commands is not None:
+			self.end_page()
+
+		for index, base_font in enumerate(FONTS):
+			self.write_object(
+				self.FIRST_FONT_OBJECT + index,
+				f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>".encode(),
+			)
+		kids = ' '.join(f"{number} 0 R" for number in self.page_objects)
+		self.write_object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_objects)} >>".encode())
+		self.write_object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+		self.write_object(self.INFO, b'<< /Title ' + pdf_string(self.title) + b' /Producer (MachineShop ERP) >>')
+
+		xref_offset = self.position
+		count = self.next_object
+		lines = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+		for number in range(1, count):
+			lines.append(f"{self.offsets[number]:010d} 00000 n \n")
+		self.write(''.join(lines).encode())
+		self.write((
+			f"trailer\n<< /Size {count} /Root {self.CATALOG} 0 R /Info {self.INFO} 0 R >>\n"
+			f"startxref\n{xref_offset}\n%%EOF\n"
+		).encode())
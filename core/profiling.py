@@ -0,0 +1,426 @@
+"""
+On-demand profiling of individual requests.
+
+A request is profiled when a superuser asks for it with ?profile=1 or an
+"X-Profile: 1" header (session authentication, i.e. logged in to the admin
+or browsable API), or when it is picked by sampling SAMPLE_RATE of traffic.
+Profiled responses carry an X-Profile-Id header.
+
+Each capture holds:
+- a cProfile dump (profile.prof, opens in snakeviz or pstats) for the top
+  functions by cumulative/own time and call counts;
+- stacks sampled from the request thread every INTERVAL seconds, in the
+  collapsed "a;b;c count" format (stacks.txt), drawn as a flame graph;
+- every SQL statement with its parameters, time, and the project code line
+  that issued it, so N+1 patterns show up grouped by statement.
+
+Captures are directories under DIRECTORY (newest MAX_PROFILES kept) and
+are browsed at /admin/profiles/ by superusers. Only one request per process
+is profiled at a time; others that ask meanwhile run normally. The body of
+a streaming response is produced after the middleware returns and is not
+part of the profile. Under ASGI a profiled request runs on a thread, where
+the profilers see the sync views and the queries of async views (both run
+there through sync_to_async); code on the event loop itself is not sampled.
+
+Settings (optional) in settings.PROFILING:
+    ENABLED       install the middleware's triggers (True)
+    SAMPLE_RATE   fraction of all requests to profile (0.0)
+    INTERVAL      stack sampling interval in seconds (0.005)
+    DIRECTORY     where captures are stored (logs/profiles)
+    MAX_PROFILES  captures kept on disk (200)
+    MAX_QUERIES   statements recorded per capture (2000)
+"""
+import collections
+import contextlib
+import cProfile
+import functools
+import html
+import json
+import pathlib
+import pstats
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.signals import setting_changed
+from django.db import connections
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+SORTS = {'cumulative': 3, 'tottime': 2, 'calls': 1}
+FILES = {
+	'profile.prof': 'application/octet-stream',
+	'stacks.txt': 'text/plain; charset=utf-8',
+}
+
+# Only one capture at a time: cProfile and the sampler slow the request down
+busy = threading.Lock()
+
+@functools.cache
+def config():
+	return {
+		'ENABLED': True,
+		'SAMPLE_RATE': 0.0,
+		'INTERVAL': 0.005,
+		'DIRECTORY': pathlib.Path(settings.BASE_DIR) / 'logs' / 'profiles',
+		'MAX_PROFILES': 200,
+		'MAX_QUERIES': 2000,
+		**getattr(settings, 'PROFILING', {}),
+	}
+
+def reset_config(setting, **kwargs):
+	if setting == 'PROFILING':
+		config.cache_clear()
+
+setting_changed.connect(reset_config, dispatch_uid='core.profiling.config')
+
+def directory():
+	return pathlib.Path(config()['DIRECTORY'])
+
+@functools.lru_cache(maxsize=4096)
+def short_path(filename):
+	"""filename relative to the project or to site-packages, for display"""
+	base = str(settings.BASE_DIR) + '/'
+	if filename.startswith(base):
+		return filename[len(base):]
+	_, found, rest = filename.rpartition('site-packages/')
+	return rest if found else filename
+
+def is_project_file(filename):
+	return filename.startswith(str(settings.BASE_DIR)) and 'site-packages' not in filename and filename != __file__
+
+@functools.lru_cache(maxsize=8192)
+def frame_label(code):
+	return f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+# -- capture ---------------------------------------------------------------
+
+class StackSampler(threading.Thread):
+	"""Counts the stacks of one thread, sampled every interval seconds"""
+
+	def __init__(self, thread_id, interval):
+		super().__init__(name='request-profiler', daemon=True)
+		self.thread_id = thread_id
+		self.interval = interval
+		self.stacks = collections.Counter()
+		self.done = threading.Event()
+
+	def run(self):
+		while not self.done.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			labels = []
+			while frame is not None:
+				labels.append(frame_label(frame.f_code))
+				frame = frame.f_back
+			if labels:
+				self.stacks[';'.join(reversed(labels))] += 1
+
+	def stop(self):
+		self.done.set()
+		self.join()
+
+class QueryRecorder:
+	"""Connection execute wrapper keeping each statement, its time and the project line that ran it"""
+
+	def __init__(self, limit):
+		self.limit = limit
+		self.queries = []
+		self.count = 0
+		self.seconds = 0.0
+
+	def __call__(self, execute, sql, params, many, context):
+		began = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			elapsed = time.perf_counter() - began
+			self.count += 1
+			self.seconds += elapsed
+			if len(self.queries) < self.limit:
+				self.queries.append({
+					'sql': sql,
+					'params': repr(params)[:500],
+					'many': many,
+					'seconds': round(elapsed, 6),
+					'source': self.source(),
+				})
+
+	def source(self):
+		frame = sys._getframe(2)
+		while frame is not None:
+			if is_project_file(frame.f_code.co_filename):
+				return f"{short_path(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+			frame = frame.f_back
+		return ''
+
+def capture(request, trigger, get_response):
+	"""Run get_response(request) under the profilers and store the result; returns (response, profile id)"""
+	options = config()
+	profiler = cProfile.Profile()
+	sampler = StackSampler(threading.get_ident(), options['INTERVAL'])
+	queries = QueryRecorder(options['MAX_QUERIES'])
+	started_at = timezone.now()
+	began = time.perf_counter()
+	with contextlib.ExitStack() as stack:
+		for connection in connections.all():
+			stack.enter_context(connection.execute_wrapper(queries))
+		sampler.start()
+		profiler.enable()
+		try:
+			response = get_response(request)
+		finally:
+			profiler.disable()
+			sampler.stop()
+	elapsed = time.perf_counter() - began
+
+	user = getattr(request, 'user', None)
+	match = request.resolver_match
+	meta = {
+		'started_at': started_at.isoformat(),
+		'method': request.method,
+		'path': request.get_full_path()[:2000],
+		'view': match.view_name if match else '',
+		'status': response.status_code,
+		'seconds': round(elapsed, 6),
+		'user': user.get_username() if user is not None and user.is_authenticated else '',
+		'trigger': trigger,
+		'query_count': queries.count,
+		'query_seconds': round(queries.seconds, 6),
+		'samples': sum(sampler.stacks.values()),
+		'interval': options['INTERVAL'],
+		'queries': queries.queries,
+	}
+	return response, save(started_at, meta, profiler, sampler.stacks)
+
+def save(started_at, meta, profiler, stacks):
+	profile_id = f"{started_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+	path = directory() / profile_id
+	path.mkdir(parents=True)
+	profiler.dump_stats(path / 'profile.prof')
+	(path / 'stacks.txt').write_text(''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+	(path / 'meta.json').write_text(json.dumps({'id': profile_id, **meta}))
+	prune()
+	return profile_id
+
+def prune():
+	"""Delete all but the newest MAX_PROFILES captures"""
+	names = sorted((entry.name for entry in directory().iterdir() if PROFILE_ID.match(entry.name)), reverse=True)
+	for name in names[config()['MAX_PROFILES']:]:
+		shutil.rmtree(directory() / name, ignore_errors=True)
+
+class ProfilingMiddleware:
+	"""Profiles flagged or sampled requests; place it after AuthenticationMiddleware"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		trigger = self.trigger(request, getattr(request, 'user', None))
+		if not trigger or not busy.acquire(blocking=False):
+			return self.get_response(request)
+		try:
+			response, profile_id = capture(request, trigger, self.get_response)
+		finally:
+			busy.release()
+		response['X-Profile-Id'] = profile_id
+		return response
+
+	async def __acall__(self, request):
+		# Load the user only when asked to, as the sync path's lazy request.user does
+		user = await request.auser() if self.requested(request) and hasattr(request, 'auser') else None
+		trigger = self.trigger(request, user)
+		if not trigger or not busy.acquire(blocking=False):
+			return await self.get_response(request)
+		try:
+			response, profile_id = await sync_to_async(capture)(request, trigger, async_to_sync(self.get_response))
+		finally:
+			busy.release()
+		response['X-Profile-Id'] = profile_id
+		return response
+
+	def requested(self, request):
+		return request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+
+	def trigger(self, request, user):
+		options = config()
+		if not options['ENABLED']:
+			return ''
+		if self.requested(request) and user is not None and user.is_superuser:
+			return 'requested'
+		if options['SAMPLE_RATE'] and random.random() < options['SAMPLE_RATE']:
+			return 'sampled'
+		return ''
+
+# -- reading captures ------------------------------------------------------
+
+def profile_path(profile_id):
+	if not PROFILE_ID.match(profile_id) or not (directory() / profile_id / 'meta.json').exists():
+		raise Http404("No such profile")
+	return directory() / profile_id
+
+def load(profile_id):
+	return json.loads((profile_path(profile_id) / 'meta.json').read_text())
+
+def captures():
+	"""Metadata of every stored capture, newest first, without the query lists"""
+	if not directory().exists():
+		return []
+	found = []
+	for name in sorted((entry.name for entry in directory().iterdir() if PROFILE_ID.match(entry.name)), reverse=True):
+		try:
+			meta = json.loads((directory() / name / 'meta.json').read_text())
+		except (OSError, ValueError):
+			continue
+		meta.pop('queries', None)
+		found.append(meta)
+	return found
+
+def top_functions(profile_id, sort='cumulative', limit=60):
+	stats = pstats.Stats(str(profile_path(profile_id) / 'profile.prof'))
+	column = SORTS.get(sort, SORTS['cumulative'])
+	rows = sorted(stats.stats.items(), key=lambda item: item[1][column], reverse=True)[:limit]
+	return [
+		{
+			'function': name if filename == '~' else f"{name} ({short_path(filename)}:{line})",
+			'calls': calls,
+			'primitive_calls': primitive,
+			'tottime': round(own, 6),
+			'cumtime': round(cumulative, 6),
+		}
+		for (filename, line, name), (primitive, calls, own, cumulative, _) in rows
+	]
+
+def grouped_queries(queries):
+	"""Statements grouped by SQL text, most total time first"""
+	groups = {}
+	for query in queries:
+		group = groups.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'seconds': 0.0, 'sources': set()})
+		group['count'] += 1
+		group['seconds'] += query['seconds']
+		if query['source']:
+			group['sources'].add(query['source'])
+	return sorted(
+		({**group, 'seconds': round(group['seconds'], 6), 'sources': sorted(group['sources'])} for group in groups.values()),
+		key=lambda group: group['seconds'], reverse=True,
+	)
+
+# -- flame graph -----------------------------------------------------------
+
+FLAME_WIDTH = 1200
+FLAME_ROW = 17
+
+def flame_tree(lines):
+	"""Nested {'name', 'value', 'children'} from collapsed stack lines"""
+	root = {'name': 'all', 'value': 0, 'children': {}}
+	for line in lines:
+		stack, _, count = line.rpartition(' ')
+		if not stack:
+			continue
+		count = int(count)
+		root['value'] += count
+		node = root
+		for name in stack.split(';'):
+			node = node['children'].setdefault(name, {'name': name, 'value': 0, 'children': {}})
+			node['value'] += count
+	return root
+
+def flame_svg(lines, title=''):
+	"""A flame graph (root at the bottom) of collapsed stacks as a standalone SVG"""
+	root = flame_tree(lines)
+	total = root['value'] or 1
+	boxes, depth = [], 0
+	pending = [(root, 0.0, 0)]
+	while pending:
+		node, x, level = pending.pop()
+		width = node['value'] / total * FLAME_WIDTH
+		if width < 0.3:
+			continue
+		depth = max(depth, level)
+		boxes.append((node, x, level, width))
+		for child in node['children'].values():
+			pending.append((child, x, level + 1))
+			x += child['value'] / total * FLAME_WIDTH
+
+	height = (depth + 1) * FLAME_ROW + 30
+	parts = [
+		f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{height}" '
+		f'font-family="Verdana,sans-serif" font-size="11">',
+		f'<text x="4" y="14" font-size="13">{html.escape(title)} ({root["value"]} samples)</text>',
+	]
+	for node, x, level, width in boxes:
+		y = height - (level + 1) * FLAME_ROW
+		hue = zlib.crc32(node['name'].encode()) % 55
+		label = f"{node['name']} ({node['value']} samples, {node['value'] / total:.1%})"
+		parts.append(
+			f'<g><title>{html.escape(label)}</title>'
+			f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAME_ROW - 1}" fill="hsl({hue},85%,62%)" rx="2"/>'
+		)
+		if width > 30:
+			chars = int((width - 6) / 6.5)
+			text = node['name'] if len(node['name']) <= chars else node['name'][:max(chars - 2, 0)] + '..'
+			parts.append(f'<text x="{x + 3:.1f}" y="{y + 12}">{html.escape(text)}</text>')
+		parts.append('</g>')
+	parts.append('</svg>')
+	return '\n'.join(parts)
+
+# -- admin views -----------------------------------------------------------
+
+def superuser_view(view):
+	"""Admin login required, and the user must be a superuser (captures contain SQL parameters)"""
+	@functools.wraps(view)
+	def wrapper(request, *args, **kwargs):
+		if not request.user.is_superuser:
+			raise PermissionDenied
+		return view(request, *args, **kwargs)
+	return admin.site.admin_view(wrapper)
+
+@superuser_view
+def profile_list(request):
+	return render(request, 'admin/profiling/list.html', {
+		**admin.site.each_context(request),
+		'title': "Request profiles",
+		'profiles': captures(),
+		'options': config(),
+	})
+
+@superuser_view
+def profile_detail(request, profile_id):
+	meta = load(profile_id)
+	sort = request.GET.get('sort', 'cumulative')
+	return render(request, 'admin/profiling/detail.html', {
+		**admin.site.each_context(request),
+		'title': f"{meta['method']} {meta['path']}",
+		'profile': meta,
+		'sort': sort if sort in SORTS else 'cumulative',
+		'functions': top_functions(profile_id, sort),
+		'groups': grouped_queries(meta['queries']),
+	})
+
+@superuser_view
+def profile_file(request, profile_id, name):
+	path = profile_path(profile_id)
+	if name == 'flame.svg':
+		meta = load(profile_id)
+		with open(path / 'stacks.txt') as lines:
+			svg = flame_svg(lines, f"{meta['method']} {meta['path']} ({meta['seconds']:.3f}s)")
+		return HttpResponse(svg, content_type='image/svg+xml')
+	if name not in FILES:
+		raise Http404("No such file")
+	return FileResponse(open(path / name, 'rb'), as_attachment=True, filename=f"{profile_id}-{name}", content_type=FILES[name])
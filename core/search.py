@@ -0,0 +1,113 @@
+"""
+Cross-entity search: GET /api/search/?q=<term>[&types=job,quote][&limit=10]
+
+Each entity is matched with icontains over a few identifier columns (part,
+job, quote and report numbers, customer names). On PostgreSQL those columns
+carry pg_trgm GIN indexes on UPPER(col::text), the exact expression Django
+generates for icontains, so both this endpoint and the list endpoints'
+?search= use an index scan instead of a sequential ILIKE '%term%'.
+
+Results are ranked exact match > prefix match > substring match, then by
+label. Without pg_trgm (or on SQLite) the same queries run unindexed. The
+indexes are created by production/migrations/0008 and quality/migrations/0005.
+"""
+from django.apps import apps
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+
+MIN_QUERY_LENGTH = 2
+
+class SearchEntity:
+	def __init__(self, type, model, fields, label, description, url_name, url_pk='id'):
+		self.type = type
+		self.model = model
+		self.fields = fields
+		self.label = label
+		self.description = description
+		self.url_name = url_name
+		self.url_pk = url_pk
+
+	def get_model(self):
+		return apps.get_model(self.model)
+
+	def search(self, term, limit):
+		def any_field(lookup):
+			query = Q()
+			for field in self.fields:
+				query |= Q(**{f"{field}__{lookup}": term})
+			return query
+
+		rank = Case(
+			When(any_field('iexact'), then=Value(3)),
+			When(any_field('istartswith'), then=Value(2)),
+			default=Value(1),
+			output_field=IntegerField(),
+		)
+		columns = {'id', self.url_pk, self.label, *self.description}
+		return (
+			self.get_model()._default_manager
+			.filter(any_field('icontains'))
+			.annotate(rank=rank)
+			.order_by('-rank', self.label, 'id')
+			.values('rank', *columns)[:limit]
+		)
+
+	def result(self, row, request):
+		return {
+			'type': self.type,
+			'id': row['id'],
+			'label': row[self.label],
+			'description': ' '.join(str(row[field]) for field in self.description if row[field]),
+			'rank': row['rank'],
+			'url': reverse(self.url_name, kwargs={'pk': row[self.url_pk]}, request=request),
+		}
+
+SEARCH_ENTITIES = [
+	SearchEntity(
+		'customer', 'production.Customer', ['name', 'company_name', 'identification_prefix'],
+		label='name', description=['identification_prefix'], url_name='customer-detail',
+	),
+	SearchEntity(
+		'job', 'production.Job', ['job_number', 'part_number'],
+		label='job_number', description=['part_number', 'customer__name'], url_name='job-detail',
+	),
+	SearchEntity(
+		'quote', 'production.Quote', ['quote_number'],
+		label='quote_number', description=['customer__name'], url_name='quote-detail',
+	),
+	SearchEntity(
+		'quote_part', 'production.QuoteLineItem', ['part_number'],
+		label='part_number', description=['quote__quote_number'], url_name='quote-detail', url_pk='quote_id',
+	),
+	SearchEntity(
+		'inspection', 'quality.InspectionReport', ['fai_report_number', 'part_number'],
+		label='fai_report_number', description=['part_number', 'part_name'], url_name='inspection-detail',
+	),
+]
+
+class SearchView(APIView):
+	permission_classes = [IsAuthenticatedOrReadOnly]
+	entities = SEARCH_ENTITIES
+	default_limit = 10
+	max_limit = 50
+
+	def get(self, request):
+		term = request.query_params.get('q', '').strip()
+		if len(term) < MIN_QUERY_LENGTH:
+			return Response({"error": f"q must be at least {MIN_QUERY_LENGTH} characters"}, status=400)
+
+		types = [part.strip() for part in request.query_params.get('types', '').split(',') if part.strip()]
+		entities = [entity for entity in self.entities if not types or entity.type in types]
+		try:
+			limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+		except ValueError:
+			return Response({"error": "limit must be a number"}, status=400)
+
+		results = []
+		for entity in entities:
+			results.extend(entity.result(row, request) for row in entity.search(term, limit))
+		results.sort(key=lambda result: -result['rank'])
+		return Response({'query': term, 'results': results})
@@ -0,0 +1,46 @@
+"""
+Shared serializer helpers.
+
+DynamicFieldsMixin lets list/detail endpoints answer ?fields= and ?expand=:
+
+    /api/production/jobs/?fields=id,job_number,due_date
+    /api/production/jobs/?expand=operations,inspections
+
+Only the top-level serializer is pruned; nested serializers keep their fields.
+"""
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+def query_param_list(request, name):
+	"""Comma separated query parameter as a list of non-empty names"""
+	if request is None:
+		return []
+	value = request.query_params.get(name, '')
+	return [part.strip() for part in value.split(',') if part.strip()]
+
+class DynamicFieldsMixin:
+	# name -> (serializer class or dotted path, kwargs), added only when expanded
+	expandable_fields = {}
+
+	def is_top_level(self):
+		parent = self.parent
+		return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+	def get_fields(self):
+		fields = super().get_fields()
+		if not self.is_top_level():
+			return fields
+
+		request = self.context.get('request')
+		expanded = [name for name in query_param_list(request, 'expand') if name in self.expandable_fields]
+		for name in expanded:
+			serializer_class, kwargs = self.expandable_fields[name]
+			if isinstance(serializer_class, str):
+				serializer_class = import_string(serializer_class)
+			fields[name] = serializer_class(**kwargs)
+
+		selected = query_param_list(request, 'fields')
+		if selected:
+			keep = set(selected) | set(expanded)
+			fields = {name: field for name, field in fields.items() if name in keep}
+		return fields
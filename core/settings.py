@@ -56,12 +56,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timing covers the rest of the stack (core/metrics.py)
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
 	'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # After authentication, so ?profile=1 can be limited to superusers (core/profiling.py)
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,7 +75,7 @@ ROOT_URLCONF = 'core.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -171,7 +175,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Page numbers by default, keyset pages with ?pagination=cursor (see core/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.PageOrCursorPagination',
     'PAGE_SIZE': 50,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -184,6 +189,29 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache: Redis when REDIS_URL is set (needed with more than one API process,
+# see core/caching.py), per-process local memory otherwise
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Read endpoint response cache (core.caching.CachedResponseMixin)
+RESPONSE_CACHE = {
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300)),
+    # Per-row fragments (core.caching.FragmentCacheListSerializer)
+    'FRAGMENT_TIMEOUT': int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 3600)),
+}
+
 # Celery Configuration (for async tasks)
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -191,6 +219,38 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# No broker configured: run tasks inline (development, tests)
+CELERY_TASK_ALWAYS_EAGER = not os.getenv('REDIS_URL')
+
+# Generated documents (core/artifacts.py), stored under MEDIA_ROOT
+ARTIFACTS = {
+    'LOCATION': 'artifacts',
+    'RENDER_LOCK_TIMEOUT': 600,
+    # Age after which the sweep_artifacts command deletes a stored document
+    'MAX_AGE_DAYS': 30,
+}
+
+# Request/query metrics on /metrics (core/metrics.py); staff sessions only unless METRICS_TOKEN is set for scrapers
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'SLOW_QUERY_SECONDS': float(os.getenv('SLOW_QUERY_SECONDS', 0.5)),
+    'SLOW_REQUEST_SECONDS': float(os.getenv('SLOW_REQUEST_SECONDS', 2.0)),
+    'TOKEN': os.getenv('METRICS_TOKEN') or None,
+}
+
+# ?wait= long polling on the async dashboard endpoints (core/asyncviews.py)
+LONG_POLL = {
+    'MAX_WAIT': float(os.getenv('LONG_POLL_MAX_WAIT', 30)),
+    'INTERVAL': float(os.getenv('LONG_POLL_INTERVAL', 1.0)),
+    'DATABASE_SLOTS': int(os.getenv('LONG_POLL_DATABASE_SLOTS', 20)),
+}
+
+# Per-request profiling, browsed at /admin/profiles/ (core/profiling.py)
+PROFILING = {
+    'SAMPLE_RATE': float(os.getenv('PROFILING_SAMPLE_RATE', 0.0)),
+    'DIRECTORY': LOGS_DIR / 'profiles',
+    'MAX_PROFILES': int(os.getenv('PROFILING_MAX_PROFILES', 200)),
+}
 
 # Email Configuration (for notifications)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -242,5 +302,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        # Slow query/request warnings
+        'core': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
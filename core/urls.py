@@ -18,12 +18,23 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 
+from . import profiling
+from .metrics import metrics_view
+from .search import SearchView
+from .views import TaskStatusView
+
 urlpatterns = [
+    path('admin/profiles/', profiling.profile_list, name='profile-list'),
+    path('admin/profiles/<str:profile_id>/', profiling.profile_detail, name='profile-detail'),
+    path('admin/profiles/<str:profile_id>/<str:name>', profiling.profile_file, name='profile-file'),
     path('admin/', admin.site.urls),
 
     # API URLs
     path('api/production/', include('production.urls')),
     path('api/quality/', include('quality.urls')),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/tasks/<str:task_id>/', TaskStatusView.as_view(), name='task-status'),
+    path('metrics', metrics_view, name='metrics'),
     
     # DRF browsable API login
     path('api-auth/', include('rest_framework.urls')), 
@@ -0,0 +1,21 @@
+"""
+Project-level API views.
+"""
+from celery.result import AsyncResult
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+class TaskStatusView(APIView):
+	"""GET /api/tasks/<id>/: state of a background task started by the API"""
+	# Results (rendered documents, import summaries) are not for anonymous callers
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, task_id):
+		result = AsyncResult(task_id)
+		data = {'task_id': task_id, 'status': result.status}
+		if result.successful():
+			data['result'] = result.result
+		elif result.failed():
+			data['error'] = str(result.result)
+		return Response(data)
@@ -1,8 +1,8 @@
 #production/admin.py
 from django.contrib import admin
 from .models import (
-    Customer, Contact, Quote, QuoteLineItem, QuoteCounter,
-    Job, Operation
+    Customer, Contact, Quote, QuoteLineItem, DocumentSequence,
+    Job, Operation, WorkCenter
 )
 
 @admin.register(Customer)
@@ -30,10 +30,15 @@ class QuoteAdmin(admin.ModelAdmin):
     search_fields = ('quote_number', 'customer__name')
     readonly_fields = ('quote_number', 'subtotal', 'overhead_amount', 'profit_amount', 'total')
 
-@admin.register(QuoteCounter)
-class QuoteCounterAdmin(admin.ModelAdmin):
-    list_display = ('customer', 'year', 'quarter', 'count')
-    list_filter = ('year', 'quarter')
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('key', 'next_value')
+    search_fields = ('key',)
+
+@admin.register(WorkCenter)
+class WorkCenterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'hours_per_day', 'works_weekends')
+    search_fields = ('name',)
 
 class OperationInline(admin.TabularInline):
     model = Operation
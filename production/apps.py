@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'production'
+
+    def ready(self):
+        from core.caching import track_versions
+        from .models import Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter
+
+        track_versions(Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter)
@@ -0,0 +1,466 @@
+# production/demo.py
+"""
+Synthetic shop data at any size, for load testing and benchmarks.
+
+generate(scale) builds customers, contacts, quotes with line items, jobs
+with routings, gauges, and inspection reports with their characteristics.
+One unit of scale is about 4 customers, 60 quotes, 55 jobs, 110 reports
+and 10,000 characteristics, so scale=100 gives a million characteristics.
+
+The shapes follow a real shop rather than uniform noise: a few customers
+get most of the work, each customer has a catalog of parts and every
+report of a part carries that part's drawing (the same balloons and
+tolerances), measurements scatter around a per-feature process mean with
+a capability around Cp 1.5 so roughly one report in ten has a failure,
+completed jobs are fully inspected while open ones are partly measured,
+and each report uses one gauge of the right kind per feature type.
+
+Everything is drawn from random.Random(seed) and a numpy Generator seeded
+the same, so one seed gives the same data (dates are relative to today).
+Rows go in with bulk_create in batches, and characteristics with COPY on
+PostgreSQL; report counters and statuses are computed while generating
+rather than recounted afterwards, and SPC statistics are rebuilt once at
+the end.
+
+reset() empties the production and quality tables with TRUNCATE ...
+RESTART IDENTITY CASCADE on PostgreSQL (DELETE elsewhere, via Django's
+flush SQL). Document number sequences are kept so numbers never repeat.
+"""
+import datetime
+import io
+import math
+import random
+from decimal import Decimal
+
+import numpy as np
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.caching import bump_versions
+
+from .models import Contact, Customer, DocumentSequence, Job, Operation, Quote, QuoteLineItem, WorkCenter
+
+# Rows per unit of scale
+PER_SCALE = {'customers': 4, 'quotes': 60, 'jobs': 55, 'equipment': 4}
+
+COMPANY_WORDS = (
+	['Apex', 'Orbital', 'Summit', 'Vector', 'Meridian', 'Falcon', 'Pinnacle', 'Titan', 'Horizon', 'Atlas', 'Polaris', 'Keystone'],
+	['Aerospace', 'Dynamics', 'Aerostructures', 'Defense', 'Propulsion', 'Systems', 'Avionics', 'Launch', 'Rotorcraft', 'Space'],
+)
+FIRST_NAMES = ['Maria', 'James', 'Priya', 'Wei', 'Carlos', 'Aisha', 'Tom', 'Elena', 'Kenji', 'Sam', 'Olivia', 'Raj']
+LAST_NAMES = ['Garcia', 'Smith', 'Patel', 'Chen', 'Lopez', 'Okafor', 'Brown', 'Novak', 'Tanaka', 'Reyes', 'Miller', 'Singh']
+CONTACT_TITLES = ['Buyer', 'Procurement Lead', 'Supplier Quality Engineer', 'Program Manager', 'Manufacturing Engineer']
+PART_NAMES = ['Bracket', 'Fuel Line', 'Manifold', 'Housing', 'Actuator Rod', 'Flange', 'Bushing', 'Spacer', 'Valve Body', 'Mount', 'Fitting', 'Shaft']
+INSPECTORS = ['R. Alvarez', 'D. Kim', 'S. Howard', 'M. Ortiz', 'J. Walsh']
+
+WORK_CENTERS = [
+	('Saw', 8, False), ('CNC Lathe', 16, False), ('3-Axis Mill', 16, False), ('5-Axis Mill', 20, True),
+	('Deburr', 8, False), ('Heat Treat', 24, True), ('Finishing', 8, False), ('Inspection', 16, False),
+]
+MACHINING = [('CNC Lathe', 'CNC Lathe Op'), ('3-Axis Mill', 'CNC Mill Op'), ('5-Axis Mill', '5-Axis Mill Op')]
+SECONDARY = [('Deburr', 'Deburr'), ('Heat Treat', 'Heat Treat'), ('Finishing', 'Anodize'), ('Finishing', 'Passivate')]
+
+# (name, serial prefix, feature kinds it measures)
+GAUGES = [
+	('Mitutoyo 6in Caliper', 'CAL', ['length', 'width']),
+	('Outside Micrometer 0-1in', 'MIC', ['diameter']),
+	('Bore Gauge', 'BOR', ['diameter']),
+	('Height Gauge', 'HGT', ['length']),
+	('Zeiss Contura CMM', 'CMM', ['position', 'form', 'diameter', 'length']),
+	('Thread Plug Gauge', 'THD', ['thread']),
+	('Surface Profilometer', 'PRF', ['finish']),
+]
+# (description, kind, nominal range in ten-thousandths, weight)
+FEATURES = [
+	('Hole Diameter', 'diameter', (500, 20000), 24),
+	('Outer Diameter', 'diameter', (2500, 60000), 14),
+	('Overall Length', 'length', (5000, 240000), 10),
+	('Step Length', 'length', (1000, 60000), 12),
+	('Slot Width', 'width', (1000, 10000), 10),
+	('Thread Pitch Diameter', 'thread', (1500, 7500), 6),
+	('True Position', 'position', (0, 0), 12),
+	('Flatness', 'form', (0, 0), 6),
+	('Perpendicularity', 'form', (0, 0), 4),
+	('Surface Finish (Ra)', 'finish', (0, 0), 2),
+]
+TOLERANCES = ([5, 10, 20, 50, 100, 300], [5, 20, 30, 25, 15, 5])
+
+def reset():
+	"""Empty every production and quality table except the document number sequences"""
+	models = [
+		model for label in ('production', 'quality') for model in apps.get_app_config(label).get_models()
+		if model is not DocumentSequence
+	]
+	sql = connection.ops.sql_flush(
+		no_style(), [model._meta.db_table for model in models], reset_sequences=True, allow_cascade=True,
+	)
+	if connection.vendor == 'postgresql':
+		# TRUNCATE is refused while deferred FK checks are pending in the same transaction
+		connection.check_constraints()
+	connection.ops.execute_sql_flush(sql)
+	bump_versions(*models)
+
+def decimal(value):
+	"""Ten-thousandths as a Decimal with the fields' four places"""
+	return Decimal(int(value)).scaleb(-4)
+
+def text(value):
+	return f"{value / 10000:.4f}"
+
+def copy_rows(model, fields, rows):
+	"""COPY rows (tuples in the order of the attribute names in fields, None for NULL) into model's table"""
+	columns = ', '.join(connection.ops.quote_name(name) for name in fields)
+	buffer = io.StringIO()
+	for row in rows:
+		buffer.write('\t'.join('\\N' if value is None else 't' if value is True else 'f' if value is False else str(value) for value in row))
+		buffer.write('\n')
+	buffer.seek(0)
+	with connection.cursor() as cursor:
+		cursor.copy_expert(f"COPY {model._meta.db_table} ({columns}) FROM STDIN", buffer)
+
+class Part:
+	"""A part number with its drawing: per-balloon limits and a process that makes the part"""
+
+	def __init__(self, rng, customer, index):
+		self.customer = customer
+		self.name = rng.choice(PART_NAMES)
+		self.part_number = f"{customer.identification_prefix}-{rng.randint(1000, 9999)}-{index:02d}"
+		size = min(250, max(5, round(rng.lognormvariate(4.45, 0.55))))
+		features = rng.choices(FEATURES, weights=[feature[3] for feature in FEATURES], k=size)
+
+		self.rows, self.kinds = [], []
+		nominal, upper, lower = np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.int64)
+		mean, sigma = np.zeros(size), np.zeros(size)
+		for balloon, (description, kind, (low, high), _) in enumerate(features):
+			tolerance = rng.choices(*TOLERANCES)[0]
+			if high:
+				nominal[balloon] = rng.randrange(low, high, 5)
+				if rng.random() < 0.15:
+					upper[balloon], lower[balloon] = (tolerance, 0) if rng.random() < 0.5 else (0, tolerance)
+				else:
+					upper[balloon] = lower[balloon] = tolerance
+				requirement = (
+					f"{text(nominal[balloon])} +/- {text(tolerance)}" if upper[balloon] == lower[balloon]
+					else f"{text(nominal[balloon])} +{text(upper[balloon])}/-{text(lower[balloon])}"
+				)
+			else:
+				# Geometric tolerances: zero is perfect, the tolerance is the maximum
+				upper[balloon] = tolerance * 2
+				requirement = f"{text(upper[balloon])} MAX"
+			width = int(upper[balloon] + lower[balloon])
+			cp = rng.lognormvariate(math.log(1.5), 0.3)
+			sigma[balloon] = width / (6 * cp)
+			center = nominal[balloon] + (upper[balloon] - lower[balloon]) / 2
+			mean[balloon] = center + rng.gauss(0, 0.5 * sigma[balloon])
+			self.rows.append((balloon + 1, description, requirement))
+			self.kinds.append(kind)
+		self.nominal, self.upper, self.lower = nominal, upper, lower
+		self.mean, self.sigma = mean, sigma
+		self.lower_limit, self.upper_limit = nominal - lower, nominal + upper
+
+	def measure(self, generator, count):
+		"""Actual values (ten-thousandths) for the first count balloons, and whether each passes"""
+		values = np.rint(generator.normal(self.mean[:count], self.sigma[:count])).astype(np.int64)
+		values = np.maximum(values, 0)
+		passed = (self.lower_limit[:count] <= values) & (values <= self.upper_limit[:count])
+		return values, passed
+
+class DemoData:
+	def __init__(self, scale, seed=42, batch_size=5000, log=print):
+		self.scale = scale
+		self.rng = random.Random(seed)
+		self.generator = np.random.default_rng(seed)
+		self.batch_size = batch_size
+		self.log = log
+		self.today = timezone.localdate()
+		self.counts = {}
+
+	def count(self, name):
+		return max(1, round(PER_SCALE[name] * self.scale))
+
+	def days_ago(self, days):
+		return self.today - datetime.timedelta(days=days)
+
+	def generate(self):
+		from quality import spc
+		from quality.models import CharacteristicStatistics, Equipment, InspectionCharacteristic, InspectionReport
+
+		with transaction.atomic():
+			self.create_work_centers()
+			self.create_equipment()
+			self.create_customers()
+			self.create_quotes()
+			self.create_jobs()
+			self.create_reports()
+		self.log(f"Rebuilt SPC statistics for {spc.rebuild()} characteristics")
+		if connection.vendor == 'postgresql':
+			with connection.cursor() as cursor:
+				cursor.execute(f"ANALYZE {InspectionCharacteristic._meta.db_table}, {InspectionReport._meta.db_table}")
+		bump_versions(
+			Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter,
+			Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics,
+		)
+		return self.counts
+
+	def created(self, name, count):
+		self.counts[name] = self.counts.get(name, 0) + count
+
+	# -- production ------------------------------------------------------
+
+	def create_work_centers(self):
+		centers = WorkCenter.objects.bulk_create([
+			WorkCenter(name=name, hours_per_day=Decimal(hours), works_weekends=weekends)
+			for name, hours, weekends in WORK_CENTERS
+		])
+		self.work_centers = {center.name: center for center in centers}
+		self.created('work_centers', len(centers))
+
+	def create_customers(self):
+		rng, customers = self.rng, []
+		for index in range(self.count('customers')):
+			name = f"{rng.choice(COMPANY_WORDS[0])} {rng.choice(COMPANY_WORDS[1])}"
+			prefix = f"{name[:3].upper()}{index + 1}"
+			customers.append(Customer(
+				name=name, identification_prefix=prefix, email=f"purchasing@{prefix.lower()}.example.com",
+				company_name=f"{name} Inc.", billing_address=f"{rng.randint(100, 9999)} Industrial Pkwy",
+				phone=f"555-{rng.randint(1000, 9999)}",
+			))
+		self.customers = Customer.objects.bulk_create(customers, batch_size=self.batch_size)
+		# A few customers get most of the work
+		self.customer_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(self.customers))]
+		self.created('customers', len(self.customers))
+
+		contacts = []
+		for customer in self.customers:
+			for index in range(rng.choices([1, 2, 3, 4], weights=[30, 40, 20, 10])[0]):
+				first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+				contacts.append(Contact(
+					customer=customer, first_name=first, last_name=last, title=rng.choice(CONTACT_TITLES),
+					email=f"{first[0].lower()}.{last.lower()}@{customer.identification_prefix.lower()}.example.com",
+					is_key_contact=index == 0,
+				))
+		Contact.objects.bulk_create(contacts, batch_size=self.batch_size)
+		self.created('contacts', len(contacts))
+
+		self.parts = {
+			customer.pk: [Part(rng, customer, index) for index in range(rng.randint(3, 12))]
+			for customer in self.customers
+		}
+
+	def pick_customer(self):
+		return self.rng.choices(self.customers, weights=self.customer_weights)[0]
+
+	def create_quotes(self):
+		rng, quotes, lines = self.rng, [], []
+		for _ in range(self.count('quotes')):
+			customer = self.pick_customer()
+			quote = Quote(
+				customer=customer, status=rng.choices(['PENDING', 'SENT', 'ACCEPTED', 'REJECTED'], weights=[25, 30, 30, 15])[0],
+				valid_until=self.today + datetime.timedelta(days=rng.randint(-300, 60)),
+			)
+			subtotal = Decimal('0')
+			for _ in range(min(8, 1 + int(rng.expovariate(0.6)))):
+				part = rng.choice(self.parts[customer.pk])
+				quantity = rng.choice([1, 2, 5, 10, 25, 50, 100, 250])
+				unit_price = Decimal(f"{rng.lognormvariate(math.log(120), 0.9):.2f}")
+				lines.append((quote, QuoteLineItem(
+					part_number=part.part_number, description=part.name, quantity=quantity,
+					unit_price=unit_price, total_price=unit_price * quantity,
+					setup_hours=Decimal(rng.choice([1, 2, 3, 4])), machining_hours=Decimal(f"{rng.uniform(0.2, 6):.2f}"),
+				)))
+				subtotal += unit_price * quantity
+			quote.subtotal = subtotal
+			quote.overhead_amount = (quote.subtotal * Decimal(rng.choice(['0.05', '0.10', '0.15']))).quantize(Decimal('0.01'))
+			quote.profit_amount = (quote.subtotal * Decimal(rng.choice(['0.10', '0.15', '0.20']))).quantize(Decimal('0.01'))
+			quote.total = quote.subtotal + quote.overhead_amount + quote.profit_amount
+			quotes.append(quote)
+
+		self.number(quotes, Quote.allocate_quote_numbers, 'quote_number')
+		self.quotes = Quote.objects.bulk_create(quotes, batch_size=self.batch_size)
+		for quote, line in lines:
+			line.quote = quote
+		QuoteLineItem.objects.bulk_create([line for _, line in lines], batch_size=self.batch_size)
+		self.created('quotes', len(quotes))
+		self.created('quote_line_items', len(lines))
+
+	def number(self, objects, allocate, field, prefix=lambda item: item.customer.identification_prefix):
+		"""Assign document numbers with one allocation per customer prefix"""
+		by_prefix = {}
+		for item in objects:
+			by_prefix.setdefault(prefix(item), []).append(item)
+		for key, items in by_prefix.items():
+			for item, number in zip(items, allocate(key, len(items))):
+				setattr(item, field, number)
+
+	def create_jobs(self):
+		rng, jobs, self.job_parts = self.rng, [], []
+		accepted = [quote for quote in self.quotes if quote.status == 'ACCEPTED']
+		rng.shuffle(accepted)
+		for _ in range(self.count('jobs')):
+			quote = accepted.pop() if accepted and rng.random() < 0.6 else None
+			customer = quote.customer if quote else self.pick_customer()
+			part = rng.choice(self.parts[customer.pk])
+			due = int(rng.triangular(-400, 90, 30))
+			due_date = self.today + datetime.timedelta(days=due)
+			if due < -30:
+				status = rng.choices(['COMPLETE', 'IN_PROCESS'], weights=[92, 8])[0]
+			elif due < 0:
+				status = rng.choices(['COMPLETE', 'IN_PROCESS', 'SCHEDULED'], weights=[60, 30, 10])[0]
+			else:
+				status = rng.choices(['QUOTE', 'SCHEDULED', 'IN_PROCESS'], weights=[20, 45, 35])[0]
+			job = Job(
+				customer=customer, part_number=part.part_number, source_quote=quote,
+				quantity=rng.choice([1, 2, 5, 10, 25, 50, 100]), due_date=due_date, status=status,
+				priority=rng.choices(['LOW', 'NORMAL', 'HIGH', 'URGENT'], weights=[10, 60, 25, 5])[0],
+			)
+			if status in ('IN_PROCESS', 'COMPLETE'):
+				job.started_at = self.moment(min(due_date, self.today) - datetime.timedelta(days=rng.randint(10, 40)))
+			if status == 'COMPLETE':
+				job.completed_at = self.moment(min(due_date + datetime.timedelta(days=rng.randint(-10, 5)), self.today))
+			jobs.append(job)
+			self.job_parts.append(part)
+
+		self.number(jobs, Job.allocate_job_numbers, 'job_number')
+		self.jobs = Job.objects.bulk_create(jobs, batch_size=self.batch_size)
+		self.created('jobs', len(jobs))
+		self.create_operations()
+
+	def create_operations(self):
+		rng, operations = self.rng, []
+		for job in self.jobs:
+			routing = [('Saw', 'Saw Cut')]
+			for index in range(rng.choices([1, 2, 3, 4], weights=[30, 40, 20, 10])[0]):
+				center, name = rng.choice(MACHINING)
+				routing.append((center, f"{name} {index + 1}"))
+			routing += rng.sample(SECONDARY, rng.randint(0, 2)) + [('Inspection', 'Final Inspection')]
+
+			start = job.due_date - datetime.timedelta(days=2 * len(routing) + rng.randint(0, 10))
+			for index, (center, name) in enumerate(routing):
+				hours = min(rng.lognormvariate(math.log(2), 0.7), 99)
+				scheduled = job.status != 'QUOTE'
+				operations.append(Operation(
+					job=job, work_center=self.work_centers[center], name=name,
+					estimated_hours=Decimal(f"{hours:.2f}"),
+					start_date=start + datetime.timedelta(days=2 * index) if scheduled else None,
+					end_date=start + datetime.timedelta(days=2 * index + 1) if scheduled else None,
+				))
+		Operation.objects.bulk_create(operations, batch_size=self.batch_size)
+		self.created('operations', len(operations))
+
+	# -- quality ---------------------------------------------------------
+
+	def create_equipment(self):
+		from quality.models import Equipment
+
+		kinds, equipment = [], []
+		for index in range(max(len(GAUGES), self.count('equipment'))):
+			name, code, measures = GAUGES[index % len(GAUGES)]
+			kinds.append(measures)
+			equipment.append(Equipment(
+				name=name, serial_number=f"{code}-{index + 1:04d}",
+				last_calibration_date=self.days_ago(self.rng.randint(0, 400)),
+				calibration_interval_days=self.rng.choice([180, 365]),
+			))
+		equipment = Equipment.objects.bulk_create(equipment, batch_size=self.batch_size)
+		self.gauges = {}
+		for item, measures in zip(equipment, kinds):
+			for kind in measures:
+				self.gauges.setdefault(kind, []).append(item.pk)
+		self.created('equipment', len(equipment))
+
+	def moment(self, date, seconds=0):
+		"""An aware datetime during the working day of date"""
+		return timezone.make_aware(datetime.datetime.combine(date, datetime.time(7)) + datetime.timedelta(seconds=seconds))
+
+	def plan_reports(self, job):
+		"""(inspection type, fraction measured, inspection date) for each report of job"""
+		rng = self.rng
+		if job.status == 'QUOTE':
+			return []
+		if job.status == 'COMPLETE':
+			finished = job.completed_at.date()
+			extra = [
+				('IN_PROCESS', 1.0, finished - datetime.timedelta(days=rng.randint(2, 10)))
+				for _ in range(rng.randint(0, 2))
+			]
+			return [('FAI', 1.0, finished - datetime.timedelta(days=rng.randint(10, 20))), *extra, ('FINAL', 1.0, finished)]
+		if job.status == 'IN_PROCESS':
+			fraction = 1.0 if rng.random() < 0.6 else rng.uniform(0.2, 0.9)
+			return [('FAI', fraction, self.days_ago(rng.randint(0, 20)))]
+		return [('FAI', rng.uniform(0, 0.5) if rng.random() < 0.3 else 0.0, self.today)]
+
+	def create_reports(self):
+		from quality.models import InspectionReport
+
+		chunk, rows = [], 0
+		for job, part in zip(self.jobs, self.job_parts):
+			for inspection_type, fraction, date in self.plan_reports(job):
+				size = len(part.rows)
+				measured = round(fraction * size)
+				values, passed = part.measure(self.generator, measured)
+				failed = int((~passed).sum())
+				report = InspectionReport(
+					job=job, inspection_type=inspection_type, part_number=part.part_number, part_name=part.name,
+					serial_number=f"SN-{self.rng.randint(10000, 99999)}",
+					inspector_name=self.rng.choice(INSPECTORS) if measured else '',
+					inspection_date=date if measured else None,
+					characteristic_count=size, measured_count=measured,
+					passed_count=measured - failed, failed_count=failed,
+					status='FAIL' if failed else 'PASS' if measured == size else 'PENDING',
+				)
+				gauges = {kind: self.rng.choice(ids) for kind, ids in self.gauges.items()}
+				chunk.append((report, part, values, passed, gauges))
+				rows += size
+				if rows >= self.batch_size * 4:
+					self.write_reports(chunk)
+					chunk, rows = [], 0
+		if chunk:
+			self.write_reports(chunk)
+		self.log(f"Created {self.counts.get('inspection_characteristics', 0)} characteristics")
+
+	def write_reports(self, chunk):
+		from quality.models import InspectionCharacteristic, InspectionReport
+
+		self.number(
+			[report for report, *_ in chunk], InspectionReport.allocate_report_numbers, 'fai_report_number',
+			prefix=lambda report: report.job.customer.identification_prefix,
+		)
+		reports = InspectionReport.objects.bulk_create([report for report, *_ in chunk], batch_size=self.batch_size)
+		# created_at is auto_now_add: date measured reports by their inspection instead of today
+		InspectionReport.objects.filter(pk__in=[report.pk for report in reports]).update(
+			created_at=Coalesce(F('inspection_date'), F('created_at')),
+		)
+
+		fields = [
+			'report_id', 'char_number', 'description', 'requirement', 'nominal_value', 'upper_tolerance',
+			'lower_tolerance', 'actual_value', 'pass_fail', 'equipment_used_id', 'measured_at',
+		]
+		rows = []
+		for report, part, values, passed, gauges in chunk:
+			for index, (balloon, description, requirement) in enumerate(part.rows):
+				measured = index < len(values)
+				rows.append((
+					report.pk, balloon, description, requirement,
+					decimal(part.nominal[index]), decimal(part.upper[index]), decimal(part.lower[index]),
+					decimal(values[index]) if measured else None,
+					bool(passed[index]) if measured else False,
+					gauges[part.kinds[index]] if measured else None,
+					self.moment(report.inspection_date, 45 * index) if measured else None,
+				))
+		if connection.vendor == 'postgresql':
+			copy_rows(InspectionCharacteristic, fields, rows)
+		else:
+			InspectionCharacteristic.objects.bulk_create(
+				[InspectionCharacteristic(**dict(zip(fields, row))) for row in rows], batch_size=self.batch_size,
+			)
+		self.created('inspection_reports', len(reports))
+		self.created('inspection_characteristics', len(rows))
+		self.log(f"  {self.counts['inspection_characteristics']} characteristics...")
+
+def generate(scale, seed=42, batch_size=5000, log=print):
+	"""Generate a synthetic data set of the given scale; returns the row counts by kind"""
+	return DemoData(scale, seed, batch_size, log).generate()
@@ -0,0 +1,129 @@
+# production/documents.py
+"""
+Quote PDF documents.
+
+QuoteDocument hashes everything printed on the quote (header, customer, line
+items and TEMPLATE_VERSION) and stores the rendered PDF under that hash (see
+core/artifacts.py), so a quote is only rendered again after it changes.
+Bump TEMPLATE_VERSION whenever the layout changes.
+"""
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Prefetch
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from core.artifacts import artifact_exists, artifact_path, content_hash, save_artifact
+
+from .models import Quote, QuoteLineItem
+
+TEMPLATE_VERSION = 1
+
+class QuoteDocument:
+	kind = 'quotes'
+	extension = 'pdf'
+	content_type = 'application/pdf'
+
+	def __init__(self, quote):
+		self.quote = quote
+		self.lines = list(quote.line_items.all())
+		self.digest = content_hash(self.payload())
+		self.path = artifact_path(self.kind, self.digest, self.extension)
+
+	@staticmethod
+	def queryset():
+		return Quote.objects.select_related('customer').prefetch_related(
+			Prefetch('line_items', queryset=QuoteLineItem.objects.order_by('id'))
+		)
+
+	@classmethod
+	def load(cls, quote_id):
+		return cls(cls.queryset().get(pk=quote_id))
+
+	@property
+	def filename(self):
+		return f"{self.quote.quote_number}.{self.extension}"
+
+	def payload(self):
+		quote, customer = self.quote, self.quote.customer
+		return {
+			'template': TEMPLATE_VERSION,
+			'shop': getattr(settings, 'SHOP_NAME', ''),
+			'quote': [
+				quote.quote_number, quote.status, quote.created_at, quote.valid_until,
+				quote.subtotal, quote.overhead_amount, quote.profit_amount, quote.total, quote.notes,
+			],
+			'customer': [customer.name, customer.company_name, customer.billing_address, customer.email, customer.phone],
+			'lines': [
+				[line.part_number, line.description, line.quantity, line.unit_price, line.total_price]
+				for line in self.lines
+			],
+		}
+
+	def exists(self):
+		return artifact_exists(self.path)
+
+	def save(self):
+		return save_artifact(self.path, self.render)
+
+	def render(self, file):
+		quote, customer = self.quote, self.quote.customer
+		styles = getSampleStyleSheet()
+		body = styles['BodyText']
+
+		story = []
+		shop = getattr(settings, 'SHOP_NAME', '')
+		if shop:
+			story.append(Paragraph(shop, styles['Title']))
+		story.append(Paragraph(f"Quote {quote.quote_number}", styles['Heading1']))
+		story.append(Paragraph(
+			f"Date: {quote.created_at:%Y-%m-%d} &nbsp;&nbsp; Valid until: {quote.valid_until:%Y-%m-%d}", body
+		))
+		story.append(Spacer(1, 0.2 * inch))
+
+		bill_to = [customer.company_name or customer.name, *customer.billing_address.splitlines(), customer.email, customer.phone]
+		story.append(Paragraph('<br/>'.join(escape(part) for part in bill_to if part), body))
+		story.append(Spacer(1, 0.3 * inch))
+
+		rows = [['Part Number', 'Description', 'Qty', 'Unit Price', 'Total']]
+		rows += [
+			[line.part_number, Paragraph(escape(str(line.description)), body), line.quantity,
+			 money(line.unit_price), money(line.total_price)]
+			for line in self.lines
+		]
+		table = Table(rows, colWidths=[1.3 * inch, 3.1 * inch, 0.5 * inch, 0.9 * inch, 0.9 * inch], repeatRows=1)
+		table.setStyle(TableStyle([
+			('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+			('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+			('VALIGN', (0, 0), (-1, -1), 'TOP'),
+			('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+		]))
+		story.append(table)
+		story.append(Spacer(1, 0.2 * inch))
+
+		totals = [
+			['Subtotal', money(quote.subtotal)],
+			['Overhead', money(quote.overhead_amount)],
+			['Profit', money(quote.profit_amount)],
+			['Total', money(quote.total)],
+		]
+		totals_table = Table(totals, colWidths=[1.2 * inch, 1.0 * inch], hAlign='RIGHT')
+		totals_table.setStyle(TableStyle([
+			('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+			('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+			('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.black),
+		]))
+		story.append(totals_table)
+
+		if quote.notes:
+			story.append(Spacer(1, 0.3 * inch))
+			story.append(Paragraph(escape(quote.notes).replace('\n', '<br/>'), body))
+
+		SimpleDocTemplate(file, pagesize=letter, title=f"Quote {quote.quote_number}").build(story)
+
+def money(value):
+	return f"${value:,.2f}"
@@ -0,0 +1,304 @@
+# production/importers.py
+"""
+Bulk import of jobs and their operations from CSV or XLSX.
+
+One row per operation; consecutive rows with the same job_number belong to the
+same job, and the job columns are taken from its first row. A row with a blank
+job_number starts a new job whose number is allocated like Job.save() would.
+
+Columns (header names are case/space insensitive, e.g. "Job Number"):
+    job_number, customer_prefix, part_number, quantity, due_date,
+    status, priority, notes, operation_name, estimated_hours
+
+The file is read as a stream and processed in batches of jobs: customers are
+resolved with one query per batch, existing job numbers with another, and jobs
+and operations are written with bulk_create in one transaction per batch. Rows
+that fail validation are reported and skipped; the rest of the file still loads.
+"""
+import codecs
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction, DataError, IntegrityError
+from django.utils.dateparse import parse_date
+from openpyxl import load_workbook
+
+from core.caching import bump_versions
+
+from .models import Customer, Job, Operation
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Operation.estimated_hours is DecimalField(max_digits=5, decimal_places=2)
+HOURS_SCALE = Decimal('0.01')
+MAX_HOURS = Decimal('999.99')
+# Job.quantity is an IntegerField
+MAX_QUANTITY = 2147483647
+
+JOB_COLUMNS = ['job_number', 'customer_prefix', 'part_number', 'quantity', 'due_date', 'status', 'priority', 'notes']
+OPERATION_COLUMNS = ['operation_name', 'estimated_hours']
+REQUIRED_COLUMNS = ['customer_prefix', 'part_number', 'quantity', 'due_date']
+
+class ImportFileError(Exception):
+	"""The file as a whole cannot be read (bad format or missing columns)"""
+
+def normalize_header(name):
+	return str(name or '').strip().lower().replace(' ', '_')
+
+def decode_lines(file):
+	"""
+	Text lines of a binary CSV: UTF-8 (with or without a BOM), falling back to
+	Windows-1252 for lines that are not, as Excel and most ERPs export
+	"""
+	for number, line in enumerate(file):
+		if number == 0 and line.startswith(codecs.BOM_UTF8):
+			line = line[len(codecs.BOM_UTF8):]
+		try:
+			yield line.decode('utf-8')
+		except UnicodeDecodeError:
+			yield line.decode('cp1252', errors='replace')
+
+def read_rows(file, file_format):
+	"""Yield (row number, {column: value}) from an uploaded/opened binary file"""
+	if file_format == 'csv':
+		rows = csv.reader(decode_lines(file))
+	elif file_format == 'xlsx':
+		try:
+			workbook = load_workbook(file, read_only=True, data_only=True)
+		except Exception as exc:
+			raise ImportFileError(f"Could not open workbook: {exc}")
+		rows = workbook.worksheets[0].iter_rows(values_only=True)
+	else:
+		raise ImportFileError(f"Unsupported file format '{file_format}' (expected csv or xlsx)")
+
+	try:
+		header = [normalize_header(name) for name in next(rows)]
+	except StopIteration:
+		raise ImportFileError("The file is empty")
+	missing = [column for column in REQUIRED_COLUMNS if column not in header]
+	if missing:
+		raise ImportFileError(f"Missing required columns: {', '.join(missing)}")
+
+	for number, values in enumerate(rows, start=2):
+		if not any(value not in (None, '') for value in values):
+			continue
+		yield number, dict(zip(header, values))
+
+class JobImporter:
+	def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+		self.batch_size = batch_size
+		self.jobs_created = 0
+		self.operations_created = 0
+		self.error_count = 0
+		self.errors = []
+		# Job numbers from the file in batches that have been written
+		self.seen_job_numbers = set()
+		self.max_lengths = {name: Job._meta.get_field(name).max_length for name in ('job_number', 'part_number')}
+		self.status_choices = {value for value, _ in Job.STATUS_CHOICES}
+		self.priority_choices = {value for value, _ in Job.PRIORITY_CHOICES}
+
+	def run(self, rows):
+		for batch in self.batches(rows):
+			self.import_batch(batch)
+		return self
+
+	def result(self):
+		return {
+			'jobs_created': self.jobs_created,
+			'operations_created': self.operations_created,
+			'error_count': self.error_count,
+			'errors': self.errors,
+		}
+
+	def add_error(self, row_number, errors):
+		self.error_count += 1
+		if len(self.errors) < MAX_REPORTED_ERRORS:
+			self.errors.append({'row': row_number, 'errors': errors})
+
+	# -- grouping ----------------------------------------------------------
+
+	def batches(self, rows):
+		"""Group rows into jobs ([rows...]) and jobs into batches of batch_size"""
+		batch, current, current_number = [], None, None
+		for row_number, row in rows:
+			job_number = str(row.get('job_number') or '').strip()
+			if current is not None and job_number and job_number == current_number:
+				current.append((row_number, row))
+				continue
+			if current is not None:
+				batch.append(current)
+				if len(batch) >= self.batch_size:
+					yield batch
+					batch = []
+			current, current_number = [(row_number, row)], job_number
+		if current is not None:
+			batch.append(current)
+		if batch:
+			yield batch
+
+	# -- validation --------------------------------------------------------
+
+	def import_batch(self, batch):
+		prefixes = {str(rows[0][1].get('customer_prefix') or '').strip() for rows in batch}
+		customers = Customer.objects.in_bulk(prefixes - {''}, field_name='identification_prefix')
+		numbers = {str(rows[0][1].get('job_number') or '').strip() for rows in batch} - {''}
+		existing = set(Job.objects.filter(job_number__in=numbers).values_list('job_number', flat=True))
+
+		jobs, operations, pending = [], [], set()
+		for rows in batch:
+			job, job_operations = self.build_job(rows, customers, existing, pending)
+			if job is not None:
+				jobs.append(job)
+				operations.append(job_operations)
+		if jobs and self.write(jobs, operations, batch):
+			self.seen_job_numbers |= pending
+
+	def build_job(self, rows, customers, existing, pending):
+		"""Validate a job's rows; job numbers it takes are added to pending"""
+		row_number, first = rows[0]
+		errors = {}
+
+		job_number = str(first.get('job_number') or '').strip()
+		if len(job_number) > self.max_lengths['job_number']:
+			errors['job_number'] = f"At most {self.max_lengths['job_number']} characters"
+		elif job_number in existing:
+			errors['job_number'] = f"Job {job_number} already exists"
+		elif job_number in self.seen_job_numbers or job_number in pending:
+			errors['job_number'] = f"Job {job_number} appears more than once in the file"
+
+		prefix = str(first.get('customer_prefix') or '').strip()
+		customer = customers.get(prefix)
+		if customer is None:
+			errors['customer_prefix'] = f"Unknown customer prefix '{prefix}'"
+
+		part_number = str(first.get('part_number') or '').strip()
+		if not part_number:
+			errors['part_number'] = "This field is required"
+		elif len(part_number) > self.max_lengths['part_number']:
+			errors['part_number'] = f"At most {self.max_lengths['part_number']} characters"
+
+		quantity = parse_positive_int(first.get('quantity'))
+		if quantity is None or quantity > MAX_QUANTITY:
+			errors['quantity'] = f"Must be a whole number from 1 to {MAX_QUANTITY}"
+
+		due_date = parse_date_value(first.get('due_date'))
+		if due_date is None:
+			errors['due_date'] = "Must be a date (YYYY-MM-DD)"
+
+		status = str(first.get('status') or 'QUOTE').strip().upper()
+		if status not in self.status_choices:
+			errors['status'] = f"Must be one of {', '.join(sorted(self.status_choices))}"
+
+		priority = str(first.get('priority') or 'NORMAL').strip().upper()
+		if priority not in self.priority_choices:
+			errors['priority'] = f"Must be one of {', '.join(sorted(self.priority_choices))}"
+
+		operations, operation_errors = [], []
+		for op_row_number, row in rows:
+			name = str(row.get('operation_name') or '').strip()
+			if not name:
+				continue
+			hours = parse_hours(row.get('estimated_hours'))
+			if hours is None:
+				operation_errors.append((op_row_number, {'estimated_hours': f"Must be a number of hours from 0 to {MAX_HOURS}, at most 2 decimal places"}))
+				continue
+			operations.append(Operation(name=name[:100], estimated_hours=hours))
+
+		if errors:
+			self.add_error(row_number, errors)
+			return None, None
+		if operation_errors:
+			for op_row_number, op_errors in operation_errors:
+				self.add_error(op_row_number, op_errors)
+			return None, None
+
+		if job_number:
+			pending.add(job_number)
+		job = Job(
+			customer=customer,
+			job_number=job_number,
+			part_number=part_number,
+			quantity=quantity,
+			due_date=due_date,
+			status=status,
+			priority=priority,
+			notes=str(first.get('notes') or ''),
+		)
+		job._import_rows = [number for number, _ in rows]
+		return job, operations
+
+	# -- writing -----------------------------------------------------------
+
+	def write(self, jobs, operations, batch):
+		"""Create the batch's jobs and operations in one transaction; False if it rolled back"""
+		self.assign_job_numbers(jobs)
+		try:
+			with transaction.atomic():
+				Job.objects.bulk_create(jobs)
+				for job, job_operations in zip(jobs, operations):
+					for operation in job_operations:
+						operation.job = job
+				created = Operation.objects.bulk_create([op for ops in operations for op in ops])
+				bump_versions(Job, Operation)
+		except (IntegrityError, DataError) as exc:
+			# Typically a job number created concurrently by someone else, or a value out of the column's range
+			for job in jobs:
+				self.add_error(job._import_rows[0], {'non_field_errors': f"Batch rolled back: {exc}"})
+			return False
+		self.jobs_created += len(jobs)
+		self.operations_created += len(created)
+		return True
+
+	def assign_job_numbers(self, jobs):
+		"""Allocate numbers for jobs without one, one allocation call per customer"""
+		by_prefix = {}
+		for job in jobs:
+			if not job.job_number:
+				by_prefix.setdefault(job.customer.identification_prefix, []).append(job)
+		for prefix, unnumbered in by_prefix.items():
+			for job, number in zip(unnumbered, Job.allocate_job_numbers(prefix, len(unnumbered))):
+				job.job_number = number
+
+def parse_positive_int(value):
+	try:
+		number = Decimal(str(value).strip())
+		whole = int(number)
+	except (InvalidOperation, ValueError, TypeError, OverflowError):
+		return None
+	# "5.0" (or an XLSX float) is fine, "5.5" is not truncated to 5
+	if number != whole or whole <= 0:
+		return None
+	return whole
+
+def parse_decimal(value):
+	if value in (None, ''):
+		return None
+	try:
+		return Decimal(str(value).strip())
+	except InvalidOperation:
+		return None
+
+def parse_hours(value):
+	"""Hours that fit estimated_hours exactly, or None"""
+	hours = parse_decimal(value)
+	if hours is None or not hours.is_finite() or hours < 0 or hours > MAX_HOURS:
+		return None
+	if hours != hours.quantize(HOURS_SCALE):
+		return None
+	return hours.quantize(HOURS_SCALE)
+
+def parse_date_value(value):
+	if isinstance(value, datetime.datetime):
+		return value.date()
+	if isinstance(value, datetime.date):
+		return value
+	try:
+		return parse_date(str(value or '').strip())
+	except ValueError:
+		return None
+
+def import_jobs(file, file_format, batch_size=DEFAULT_BATCH_SIZE):
+	"""Import a CSV/XLSX file object; returns the summary dict"""
+	return JobImporter(batch_size).run(read_rows(file, file_format)).result()
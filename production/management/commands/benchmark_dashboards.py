@@ -0,0 +1,117 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+import io
+import json
+import pathlib
+import tempfile
+import threading
+
+class Command(BaseCommand):
+    help = (
+        'Compares how many polling dashboards the sync WSGI server and the ASGI server with the async '
+        'endpoints carry, by the latency interactive users see meanwhile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://localhost:8000', help='Server running core.wsgi (runserver, gunicorn)')
+        parser.add_argument('--asgi-url', default='http://localhost:8001', help='Server running core.asgi (uvicorn)')
+        parser.add_argument('--clients', default='50,200,500', help='Comma separated dashboard counts to try')
+        parser.add_argument('--duration', type=float, default=30, help='Measured seconds per step')
+        parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which dashboards connect per step')
+        parser.add_argument('--users', type=int, default=4, help='Interactive users measured alongside the dashboards')
+        parser.add_argument('--max-p95', type=float, default=500, help='Interactive p95 (ms) a server must stay under')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            steps = [int(count) for count in options['clients'].split(',')]
+        except ValueError:
+            raise CommandError("--clients must be comma separated integers")
+        servers = [('wsgi', options['wsgi_url']), ('asgi', options['asgi_url'])]
+
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for server, url in servers:
+                for clients in steps:
+                    self.stdout.write(f"{server}: {clients} dashboards against {url}...")
+                    results.append(self.step(server, url, clients, options, pathlib.Path(directory)))
+
+        self.report(results, options['max_p95'])
+        if options['output']:
+            pathlib.Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def step(self, server, url, clients, options, directory):
+        """Dashboards and interactive users against one server at once; their summaries"""
+        runs = {
+            'dashboards': (f"dashboards_{server}", clients),
+            'interactive': ('interactive', options['users']),
+        }
+        errors = []
+
+        def run(name, scenario, concurrency):
+            try:
+                call_command(
+                    'run_load_test', scenario, base_url=url, concurrency=concurrency,
+                    duration=options['duration'], ramp_up=options['ramp_up'],
+                    output=str(directory / f"{name}.json"), stdout=io.StringIO(), stderr=io.StringIO(),
+                )
+            except CommandError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=run, args=(name, *run_args)) for name, run_args in runs.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(str(errors[0]))
+
+        dashboards = json.loads((directory / 'dashboards.json').read_text())
+        interactive = json.loads((directory / 'interactive.json').read_text())
+        statuses = {}
+        for endpoint in dashboards['endpoints'].values():
+            for status, count in endpoint['statuses'].items():
+                statuses[status] = statuses.get(status, 0) + count
+        return {
+            'server': server,
+            'clients': clients,
+            'dashboard_rps': dashboards['rps'],
+            'dashboard_updates': statuses.get('200', 0),
+            'dashboard_not_modified': statuses.get('304', 0),
+            'dashboard_error_rate': dashboards['error_rate'],
+            'interactive_rps': interactive['rps'],
+            'interactive_p50_ms': interactive['p50_ms'],
+            'interactive_p95_ms': interactive['p95_ms'],
+            'interactive_error_rate': interactive['error_rate'],
+        }
+
+    def report(self, results, max_p95):
+        self.stdout.write(
+            f"\n{'server':<6} {'clients':>7} {'dash req/s':>10} {'200':>7} {'304':>7} {'dash err':>8} "
+            f"{'user req/s':>10} {'user p50':>9} {'user p95':>9} {'user err':>8}"
+        )
+        for row in results:
+            line = (
+                f"{row['server']:<6} {row['clients']:>7} {row['dashboard_rps']:>10.1f} {row['dashboard_updates']:>7} "
+                f"{row['dashboard_not_modified']:>7} {row['dashboard_error_rate']:>8.1%} {row['interactive_rps']:>10.1f} "
+                f"{row['interactive_p50_ms']:>9.1f} {row['interactive_p95_ms']:>9.1f} {row['interactive_error_rate']:>8.1%}"
+            )
+            healthy = self.healthy(row, max_p95)
+            self.stdout.write(line if healthy else self.style.ERROR(line))
+
+        self.stdout.write('')
+        for server in dict.fromkeys(row['server'] for row in results):
+            carried = [row['clients'] for row in results if row['server'] == server and self.healthy(row, max_p95)]
+            self.stdout.write(
+                f"{server}: most dashboards carried with interactive p95 under {max_p95:g}ms and no errors: "
+                f"{max(carried) if carried else 'none of those tried'}"
+            )
+
+    @staticmethod
+    def healthy(row, max_p95):
+        return (
+            row['interactive_p95_ms'] <= max_p95
+            and not row['dashboard_error_rate']
+            and not row['interactive_error_rate']
+        )
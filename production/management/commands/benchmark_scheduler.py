@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from decimal import Decimal
+from production.models import Customer, Job, Operation, WorkCenter
+from production.scheduling import CapacityCalendar, Scheduler, plan
+import datetime
+import random
+import time
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmarks the finite-capacity scheduler on generated jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=5000)
+        parser.add_argument('--operations', type=int, default=4, help='Operations per job')
+        parser.add_argument('--work-centers', type=int, default=24)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--database', action='store_true',
+            help='Also time a full database run (load, plan, write) and a '
+                 'reschedule after one job changes; rolled back afterwards',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        start = timezone.localdate()
+
+        jobs, capacity = self.generate()
+        calendars = {
+            work_center: CapacityCalendar(start, hours, works_weekends=False)
+            for work_center, hours in capacity.items()
+        }
+        began = time.perf_counter()
+        result = plan(jobs, calendars, start)
+        elapsed = time.perf_counter() - began
+
+        last_end = max(end for _, end in result['operations'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Engine: {len(jobs)} jobs, {len(result['operations'])} operations on "
+            f"{options['work_centers']} work centers in {elapsed:.2f}s "
+            f"({len(result['late_jobs'])} late, schedule ends {last_end})"
+        ))
+
+        if options['database']:
+            try:
+                with transaction.atomic():
+                    self.database_run(jobs, capacity, start)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def generate(self):
+        """Plan input for plan(): (job id, priority, due date, [(op id, work center, hours)])"""
+        options = self.options
+        today = timezone.localdate()
+        capacity = {None: 8.0}
+        capacity.update({index: self.random.choice([8.0, 16.0, 20.0]) for index in range(options['work_centers'])})
+        priorities = ['LOW', 'NORMAL', 'NORMAL', 'NORMAL', 'HIGH', 'URGENT']
+
+        jobs, operation_id = [], 0
+        for job_id in range(options['jobs']):
+            operations = []
+            for _ in range(options['operations']):
+                operation_id += 1
+                hours = round(self.random.uniform(0.5, 6), 2)
+                operations.append((operation_id, self.random.randrange(options['work_centers']), hours))
+            due_date = today + datetime.timedelta(days=self.random.randint(5, 180))
+            jobs.append((job_id, self.random.choice(priorities), due_date, operations))
+        return jobs, capacity
+
+    def database_run(self, jobs, capacity, start):
+        customer = Customer.objects.create(
+            name='Scheduler benchmark', email='bench@example.com', identification_prefix='SCHBENCH',
+        )
+        work_centers = {
+            index: WorkCenter.objects.create(name=f"Bench WC {index}", hours_per_day=Decimal(str(hours)))
+            for index, hours in capacity.items() if index is not None
+        }
+        Operation.objects.filter(job__in=Job.objects.open()).update(start_date=None, end_date=None)
+
+        created = Job.objects.bulk_create([
+            Job(
+                customer=customer, job_number=f"SCHBENCH-{job_id}", part_number='BENCH',
+                quantity=1, due_date=due_date, status='SCHEDULED', priority=priority,
+            )
+            for job_id, priority, due_date, _ in jobs
+        ])
+        Operation.objects.bulk_create([
+            Operation(job=job, work_center=work_centers[work_center], name=f"Op {operation_id}",
+                      estimated_hours=Decimal(str(hours)))
+            for job, (_, _, _, operations) in zip(created, jobs)
+            for operation_id, work_center, hours in operations
+        ], batch_size=5000)
+
+        scheduler = Scheduler(start)
+        self.timed('Database: first run', scheduler.run)
+
+        # One job jumps the queue: only it and the jobs behind it may move
+        changed = created[len(created) // 2]
+        Job.objects.filter(pk=changed.pk).update(priority='URGENT')
+        self.timed('Database: reschedule after one job changed', scheduler.run)
+        self.timed('Database: rerun with nothing changed', scheduler.run)
+
+    def timed(self, label, function):
+        began = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - began
+        self.stdout.write(
+            f"{label:<44} {elapsed:6.2f}s  {result['operations']} operations, "
+            f"{result['operations_updated']} updated, {len(result['late_jobs'])} late"
+        )
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from production.models import DocumentSequence
+from production.sequences import SequenceAllocator
+import threading
+import time
+import uuid
+
+class Command(BaseCommand):
+    help = 'Benchmarks document number allocation under parallel writers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Parallel writer threads')
+        parser.add_argument('--transactions', type=int, default=5, help='Transactions per writer')
+        parser.add_argument('--per-transaction', type=int, default=10, help='Documents numbered per transaction')
+        parser.add_argument('--work-ms', type=float, default=5.0, help='Simulated insert work per document')
+        parser.add_argument('--backend', choices=['auto', 'postgres', 'block'], default='auto')
+        parser.add_argument('--block-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(f"Database: {connection.vendor}")
+
+        results = [
+            self.run('row lock (legacy QuoteCounter)', self.row_lock_writer),
+            self.run(
+                f"allocator ({options['backend']})",
+                self.allocator_writer(SequenceAllocator(options['backend'], options['block_size'])),
+            ),
+        ]
+
+        ideal = options['transactions'] * options['per_transaction'] * options['work_ms'] / 1000
+        self.stdout.write(f"\nIdeal fully parallel time: {ideal:.2f}s")
+        for label, elapsed, numbers, errors in results:
+            duplicates = len(numbers) - len(set(numbers))
+            # 1.0 = writers never waited on each other, writers = fully serialized
+            serialization = elapsed / ideal if ideal else 0
+            line = (
+                f"{label:<36} {elapsed:6.2f}s  {len(numbers):6d} numbers  "
+                f"{duplicates} duplicates  {errors} errors  serialization x{serialization:.1f}"
+            )
+            style = self.style.SUCCESS if not duplicates and not errors else self.style.ERROR
+            self.stdout.write(style(line))
+
+    def run(self, label, writer):
+        key = f"bench:{uuid.uuid4().hex[:12]}"
+        numbers, errors = [], []
+        lock = threading.Lock()
+
+        def target():
+            try:
+                produced = writer(key)
+                with lock:
+                    numbers.extend(produced)
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=target) for _ in range(self.options['writers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        for exc in errors[:3]:
+            self.stderr.write(f"{label}: {exc!r}")
+        self.cleanup(key)
+        return label, elapsed, numbers, len(errors)
+
+    def row_lock_writer(self, key):
+        """The previous scheme: lock a counter row inside the writer's transaction"""
+        DocumentSequence.objects.get_or_create(key=key)
+        numbers = []
+        for _ in range(self.options['transactions']):
+            with transaction.atomic():
+                for _ in range(self.options['per_transaction']):
+                    counter = DocumentSequence.objects.select_for_update().get(key=key)
+                    numbers.append(counter.next_value)
+                    counter.next_value += 1
+                    counter.save(update_fields=['next_value'])
+                    time.sleep(self.options['work_ms'] / 1000)
+        return numbers
+
+    def allocator_writer(self, allocator):
+        def writer(key):
+            numbers = []
+            for _ in range(self.options['transactions']):
+                with transaction.atomic():
+                    for _ in range(self.options['per_transaction']):
+                        numbers.append(allocator.next_value(key))
+                        time.sleep(self.options['work_ms'] / 1000)
+            return numbers
+        return writer
+
+    def cleanup(self, key):
+        DocumentSequence.objects.filter(key=key).delete()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SEQUENCE IF EXISTS {SequenceAllocator.sequence_name(key)}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from production.importers import import_jobs, ImportFileError, DEFAULT_BATCH_SIZE
+from pathlib import Path
+
+class Command(BaseCommand):
+    help = 'Bulk imports jobs and operations from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file, one row per operation')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Jobs per transaction')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'xlsx'], help='Defaults to the file extension')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['file_format'] or path.suffix.lstrip('.').lower()
+
+        try:
+            with path.open('rb') as file:
+                result = import_jobs(file, file_format, batch_size=options['batch_size'])
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result['error_count'] > len(result['errors']):
+            self.stderr.write(f"... {result['error_count'] - len(result['errors'])} more rows with errors")
+
+        summary = (
+            f"Created {result['jobs_created']} jobs and {result['operations_created']} operations, "
+            f"{result['error_count']} rows rejected"
+        )
+        style = self.style.SUCCESS if not result['error_count'] else self.style.WARNING
+        self.stdout.write(style(summary))
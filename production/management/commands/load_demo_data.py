@@ -1,24 +1,33 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from production import demo
 from production.models import Customer, Contact, Job, Operation, Quote, QuoteLineItem
 from quality.models import Equipment, InspectionReport, InspectionCharacteristic
 from django.utils import timezone
 import random
+import time
 from datetime import timedelta, date
 
 class Command(BaseCommand):
-    help = 'Loads realistic aerospace demo data'
+    help = 'Loads realistic aerospace demo data, plus a synthetic data set of any size with --scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=float, default=0,
+            help='Add synthetic data; one unit is ~55 jobs and ~10,000 characteristics (100 = a million)',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--reset-only', action='store_true', help='Only empty the production and quality tables')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 0:
+            raise CommandError("--scale cannot be negative")
 
-    def handle(self, *args, **kwargs):
         self.stdout.write("--- Cleaning Old Data ---")
-        InspectionCharacteristic.objects.all().delete()
-        InspectionReport.objects.all().delete()
-        Equipment.objects.all().delete()
-        Operation.objects.all().delete()
-        Job.objects.all().delete()
-        QuoteLineItem.objects.all().delete()
-        Quote.objects.all().delete()
-        Contact.objects.all().delete()
-        Customer.objects.all().delete()
+        demo.reset()
+        if options['reset_only']:
+            self.stdout.write(self.style.SUCCESS("Emptied production and quality data"))
+            return
 
         self.stdout.write("--- Creating Customers & Contacts ---")
         # 1. Boeing
@@ -106,4 +115,12 @@ class Command(BaseCommand):
             actual_value=1.504, equipment_used=caliper # This should auto-fail
         )
 
-        self.stdout.write(self.style.SUCCESS("Successfully populated demo data!"))
\ No newline at end of file
+        if options['scale']:
+            self.stdout.write(f"--- Generating Synthetic Data (scale {options['scale']:g}, seed {options['seed']}) ---")
+            started = time.perf_counter()
+            counts = demo.generate(options['scale'], options['seed'], options['batch_size'], log=self.stdout.write)
+            for name, count in counts.items():
+                self.stdout.write(f"{name:<28} {count:>10}")
+            self.stdout.write(f"Generated in {time.perf_counter() - started:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS("Successfully populated demo data!"))
@@ -0,0 +1,359 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.crypto import get_random_string
+from production.models import Customer, Job, Quote
+from quality.models import CharacteristicStatistics, Equipment, InspectionCharacteristic, InspectionReport
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+import http.client
+import json
+import pathlib
+import random
+import threading
+import time
+
+SCENARIO_DIR = pathlib.Path(settings.BASE_DIR) / 'loadtest' / 'scenarios'
+
+# {name} placeholders in scenario paths/params draw a random id from these (most recent rows first)
+POOLS = {
+    'customer': lambda: Customer.objects.order_by('-pk').values_list('pk', flat=True),
+    'job': lambda: Job.objects.order_by('-pk').values_list('pk', flat=True),
+    'quote': lambda: Quote.objects.order_by('-pk').values_list('pk', flat=True),
+    'report': lambda: InspectionReport.objects.order_by('-pk').values_list('pk', flat=True),
+    'equipment': lambda: Equipment.objects.order_by('-pk').values_list('pk', flat=True),
+    'spc': lambda: CharacteristicStatistics.objects.order_by('-count').values_list('pk', flat=True),
+    # Open balloons for measurement entry: (id, nominal, upper tolerance, lower tolerance)
+    'characteristic': lambda: InspectionCharacteristic.objects.filter(actual_value__isnull=True)
+        .order_by('-pk').values_list('pk', 'nominal_value', 'upper_tolerance', 'lower_tolerance'),
+}
+POOL_SIZE = 5000
+
+class Pools(dict):
+    """format_map() source that picks a random member of the named pool for every placeholder"""
+
+    def __init__(self, pools, rng):
+        super().__init__()
+        self.pools = pools
+        self.rng = rng
+
+    def __missing__(self, name):
+        if name not in self.pools:
+            raise KeyError(f"Unknown pool '{name}' (one of {', '.join(POOLS)})")
+        if not self.pools[name]:
+            raise LookupError(f"No {name} rows to choose from; load data first (load_demo_data --scale N)")
+        member = self.rng.choice(self.pools[name])
+        return member[0] if isinstance(member, tuple) else member
+
+class Worker:
+    """One simulated user: a keep-alive connection, a logged-in session and its own statistics"""
+
+    def __init__(self, command, index):
+        self.command = command
+        self.rng = random.Random(command.seed * 1000 + index)
+        self.pools = Pools(command.pools, self.rng)
+        self.connection = None
+        self.stats = {}
+        self.etags = {}
+
+    def connect(self):
+        url = self.command.base_url
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=self.command.timeout)
+
+    def request(self, name, method, path, params=None, body=None, headers=None):
+        """Send one request, record it under name, and return (status, response)"""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {
+            'Accept': 'application/json',
+            'Cookie': self.command.cookie,
+            'X-CSRFToken': self.command.csrf_token,
+            'Referer': self.command.base_url.geturl(),
+            **(headers or {}),
+        }
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        stats = self.stats.setdefault(name, {'latencies': [], 'statuses': Counter()})
+        measured = time.monotonic() >= self.command.measure_from
+        began = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connect()
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as exc:
+            self.connection.close()
+            self.connection = None
+            if measured:
+                stats['latencies'].append(time.perf_counter() - began)
+                stats['statuses'][type(exc).__name__] += 1
+            return None, None
+        if measured:
+            stats['latencies'].append(time.perf_counter() - began)
+            stats['statuses'][status] += 1
+        response.content = content
+        return status, response
+
+    def run(self, tasks, weights, stop_at):
+        think_time = self.command.scenario.get('think_time', [0.5, 2.0])
+        while time.monotonic() < stop_at:
+            task = self.rng.choices(tasks, weights=weights)[0]
+            flow = task.get('flow')
+            if flow:
+                getattr(self, f"flow_{flow}")(task)
+            elif task.get('poll'):
+                self.poll(task)
+            else:
+                self.request(
+                    task['name'], task.get('method', 'GET'), task['path'].format_map(self.pools),
+                    {key: self.param(value) for key, value in task.get('params', {}).items()},
+                    task.get('body'),
+                )
+            time.sleep(self.rng.uniform(*think_time))
+        if self.connection is not None:
+            self.connection.close()
+
+    def param(self, value):
+        """A query value: lists are choices, {pool} placeholders become ids"""
+        if isinstance(value, list):
+            value = self.rng.choice(value)
+        return str(value).format_map(self.pools)
+
+    def poll(self, task):
+        """A dashboard refresh: a conditional GET with the ETag of the last 200 (a long poll with ?wait=)"""
+        etag = self.etags.get(task['name'])
+        status, response = self.request(
+            task['name'], 'GET', task['path'],
+            {key: self.param(value) for key, value in task.get('params', {}).items()},
+            headers={'If-None-Match': etag} if etag else None,
+        )
+        if status == 200 and response.getheader('ETag'):
+            self.etags[task['name']] = response.getheader('ETag')
+
+    # -- multi-request flows ---------------------------------------------
+
+    def flow_create_quote(self, task):
+        """An estimator creates a quote, then adds its line items in one bulk request"""
+        rng = self.rng
+        status, response = self.request(f"{task['name']}: create", 'POST', '/api/production/quotes/', body={
+            'customer': self.pools['customer'],
+            'valid_until': (date.today() + timedelta(days=30)).isoformat(),
+            'overhead_amount': f"{rng.uniform(50, 500):.2f}",
+            'profit_amount': f"{rng.uniform(100, 1500):.2f}",
+        })
+        if status != 201:
+            return
+        quote = json.loads(response.content)
+        low, high = task.get('line_items', [1, 8])
+        lines = [
+            {
+                'part_number': f"LT-{rng.randint(1000, 9999)}",
+                'description': rng.choice(['Bracket', 'Spacer', 'Manifold', 'Housing', 'Fitting']),
+                'quantity': rng.choice([1, 5, 10, 25, 100]),
+                'unit_price': f"{rng.lognormvariate(4.8, 0.8):.2f}",
+            }
+            for _ in range(rng.randint(low, high))
+        ]
+        self.request(
+            f"{task['name']}: line items", 'POST', f"/api/production/quotes/{quote['id']}/line-items/bulk/",
+            body={'create': lines},
+        )
+
+    def flow_enter_measurement(self, task):
+        """An inspector records the measured value of an open balloon"""
+        if not self.command.pools.get('characteristic'):
+            raise LookupError("No unmeasured characteristics; load data first (load_demo_data --scale N)")
+        pk, nominal, upper, lower = self.rng.choice(self.command.pools['characteristic'])
+        spread = float(upper + lower) / 6 or 0.0005
+        value = float(nominal) + float(upper - lower) / 2 + self.rng.gauss(0, spread / 1.3)
+        body = {'actual_value': f"{max(value, 0):.4f}"}
+        if self.command.pools.get('equipment'):
+            body['equipment_used'] = self.pools['equipment']
+        self.request(task['name'], 'PATCH', f"/api/quality/characteristics/{pk}/", body=body)
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+class Command(BaseCommand):
+    help = 'Replays a scenario of shop traffic against a running server and reports throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='?', default='shop_day', help='Scenario name in loadtest/scenarios or a JSON file path')
+        parser.add_argument('--base-url', default='http://localhost:8000', help='Server to load')
+        parser.add_argument('--concurrency', type=int, help='Simulated users (overrides the scenario)')
+        parser.add_argument('--duration', type=float, help='Seconds to run after ramp-up (overrides the scenario)')
+        parser.add_argument('--ramp-up', type=float, help='Seconds over which users start; not measured (overrides the scenario)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+        parser.add_argument('--user', default='loadtest', help='User the simulated sessions log in as (created if missing)')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+        parser.add_argument('--list', action='store_true', help='List the scenarios in loadtest/scenarios')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for path in sorted(SCENARIO_DIR.glob('*.json')):
+                self.stdout.write(f"{path.stem:<24} {json.loads(path.read_text()).get('description', '')}")
+            return
+
+        self.scenario = self.load_scenario(options['scenario'])
+        self.base_url = urlsplit(options['base_url'])
+        if self.base_url.scheme not in ('http', 'https') or not self.base_url.hostname:
+            raise CommandError("--base-url must be an http(s) URL")
+        self.seed = options['seed']
+        self.timeout = options['timeout']
+        concurrency = options['concurrency'] or self.scenario.get('concurrency', 10)
+        duration = options['duration'] or self.scenario.get('duration', 60)
+        ramp_up = options['ramp_up'] if options['ramp_up'] is not None else self.scenario.get('ramp_up', 5)
+
+        tasks = self.scenario['tasks']
+        self.pools = self.load_pools(tasks)
+        self.login(options['user'])
+
+        self.stdout.write(
+            f"Scenario {options['scenario']}: {concurrency} users, {ramp_up:g}s ramp-up, {duration:g}s measured, {self.base_url.geturl()}"
+        )
+        start = time.monotonic()
+        self.measure_from = start + ramp_up
+        stop_at = self.measure_from + duration
+        workers = [Worker(self, index) for index in range(concurrency)]
+        weights = [task['weight'] for task in tasks]
+        errors = []
+
+        def target(worker, delay):
+            time.sleep(delay)
+            try:
+                worker.run(tasks, weights, stop_at)
+            except (LookupError, KeyError) as exc:
+                errors.append(exc)
+
+        threads = [
+            threading.Thread(target=target, args=(worker, ramp_up * index / concurrency), daemon=True)
+            for index, worker in enumerate(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+            if errors:
+                raise CommandError(str(errors[0]))
+        if errors:
+            raise CommandError(str(errors[0]))
+
+        results = self.summarize(workers, duration)
+        self.report(results)
+        if options['output']:
+            pathlib.Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def load_scenario(self, name):
+        path = pathlib.Path(name)
+        if not path.exists():
+            path = SCENARIO_DIR / f"{name}.json"
+        if not path.exists():
+            raise CommandError(f"No scenario '{name}' (see --list)")
+        try:
+            scenario = json.loads(path.read_text())
+        except ValueError as exc:
+            raise CommandError(f"{path}: {exc}")
+        for task in scenario.get('tasks', []):
+            if 'name' not in task or 'weight' not in task or not ('path' in task or 'flow' in task):
+                raise CommandError(f"{path}: every task needs a name, a weight and a path or flow")
+            if 'flow' in task and not hasattr(Worker, f"flow_{task['flow']}"):
+                raise CommandError(f"{path}: unknown flow '{task['flow']}'")
+        if not scenario.get('tasks'):
+            raise CommandError(f"{path}: no tasks")
+        return scenario
+
+    def load_pools(self, tasks):
+        """Ids for the placeholders the scenario uses, and the rows its flows need"""
+        text = json.dumps(tasks)
+        needed = {name for name in POOLS if f"{{{name}}}" in text}
+        flows = {task.get('flow') for task in tasks}
+        if 'create_quote' in flows:
+            needed.add('customer')
+        if 'enter_measurement' in flows:
+            needed |= {'characteristic', 'equipment'}
+        return {name: list(POOLS[name]()[:POOL_SIZE]) for name in needed}
+
+    def login(self, username):
+        """A session cookie and CSRF token for username, as a browser would hold after logging in"""
+        User = get_user_model()
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            user = User(username=username)
+            user.set_unusable_password()
+            user.save()
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        self.csrf_token = get_random_string(32)
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={self.csrf_token}"
+
+    def summarize(self, workers, duration):
+        merged = {}
+        for worker in workers:
+            for name, stats in worker.stats.items():
+                into = merged.setdefault(name, {'latencies': [], 'statuses': Counter()})
+                into['latencies'].extend(stats['latencies'])
+                into['statuses'].update(stats['statuses'])
+
+        endpoints = {}
+        for name, stats in sorted(merged.items()):
+            latencies = sorted(stats['latencies'])
+            errors = sum(count for status, count in stats['statuses'].items() if not isinstance(status, int) or status >= 400)
+            endpoints[name] = {
+                'requests': len(latencies),
+                'rps': round(len(latencies) / duration, 2),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                'max_ms': round((latencies[-1] if latencies else 0) * 1000, 1),
+                'errors': errors,
+                'error_rate': round(errors / len(latencies), 4) if latencies else 0.0,
+                'statuses': {str(status): count for status, count in sorted(stats['statuses'].items(), key=str)},
+            }
+        latencies = sorted(latency for stats in merged.values() for latency in stats['latencies'])
+        requests = len(latencies)
+        errors = sum(endpoint['errors'] for endpoint in endpoints.values())
+        return {
+            'duration': duration,
+            'requests': requests,
+            'rps': round(requests / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'errors': errors,
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"\n{'endpoint':<32} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}"
+        )
+        rows = [*results['endpoints'].items(), ('total', {**results, 'max_ms': max(
+            (endpoint['max_ms'] for endpoint in results['endpoints'].values()), default=0,
+        )})]
+        for name, row in rows:
+            line = (
+                f"{name[:32]:<32} {row['requests']:>8} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {row['error_rate']:>7.1%}"
+            )
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+        for name, row in results['endpoints'].items():
+            failures = {status: count for status, count in row['statuses'].items() if not status.isdigit() or int(status) >= 400}
+            if failures:
+                self.stderr.write(f"{name}: {failures}")
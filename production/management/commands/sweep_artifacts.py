@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from core.artifacts import sweep_artifacts
+
+class Command(BaseCommand):
+    help = 'Deletes generated documents (quote PDFs, AS9102 forms) older than ARTIFACTS["MAX_AGE_DAYS"]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, help='Overrides ARTIFACTS["MAX_AGE_DAYS"]')
+
+    def handle(self, *args, **options):
+        removed = sweep_artifacts(options['max_age_days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} artifacts"))
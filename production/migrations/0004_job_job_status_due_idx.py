@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0003_rename_create_at_contact_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'due_date'], name='job_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+def copy_quote_counters(apps, schema_editor):
+    QuoteCounter = apps.get_model('production', 'QuoteCounter')
+    DocumentSequence = apps.get_model('production', 'DocumentSequence')
+    DocumentSequence.objects.bulk_create([
+        DocumentSequence(
+            key=f"quote:{counter.customer.identification_prefix}:{counter.year}Q{counter.quarter}",
+            next_value=counter.count + 1,
+        )
+        for counter in QuoteCounter.objects.select_related('customer')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0004_job_job_status_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='e.g., quote:SPX:26Q1', max_length=100, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(copy_quote_counters, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='job',
+            name='job_number',
+            field=models.CharField(blank=True, help_text='Generated from the customer prefix when left blank', max_length=50, unique=True),
+        ),
+        migrations.DeleteModel(
+            name='QuoteCounter',
+        ),
+    ]
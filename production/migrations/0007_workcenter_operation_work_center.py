@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:18
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0006_contact_contact_ordering_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkCenter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='e.g., 5-Axis Mill', max_length=100, unique=True)),
+                ('hours_per_day', models.DecimalField(decimal_places=2, default=Decimal('8.00'), help_text='Available hours on a working day (machines x shift hours)', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.25'))])),
+                ('works_weekends', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='work_center',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operations', to='production.workcenter'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# (index name, table, column): pg_trgm GIN indexes on UPPER(column::text), the
+# expression Django generates for icontains (see core/search.py)
+INDEXES = [
+    ('customer_name_trgm', 'production_customer', 'name'),
+    ('customer_company_trgm', 'production_customer', 'company_name'),
+    ('customer_prefix_trgm', 'production_customer', 'identification_prefix'),
+    ('job_number_trgm', 'production_job', 'job_number'),
+    ('job_part_number_trgm', 'production_job', 'part_number'),
+    ('quote_number_trgm', 'production_quote', 'quote_number'),
+    ('quote_item_part_trgm', 'production_quotelineitem', 'part_number'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # PostgreSQL only. Without pg_trgm search still works, unindexed; migrate
+    # back one step and forward again once the extension is available.
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError as exc:
+        logger.warning("pg_trgm is not available, search will not be indexed: %s", exc)
+        return
+    with connection.cursor() as cursor:
+        for name, table, column in INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+                f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, _, _ in INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0007_workcenter_operation_work_center'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes, elidable=False),
+    ]
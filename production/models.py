@@ -1,7 +1,12 @@
 #production/models.py
 from django.db import models
+from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from decimal import Decimal
 
+from core.caching import bump_versions
+
 class Customer(models.Model):
 	name = models.CharField(max_length=100)
 	email = models.EmailField()
@@ -19,6 +24,11 @@ class Customer(models.Model):
 	updated_at = models.DateTimeField(auto_now=True)
 	is_active = models.BooleanField(default=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['name', 'id'], name='customer_name_idx'),
+		]
+
 	def __str__(self):
 		return self.name
 	
@@ -39,13 +49,31 @@ class Contact(models.Model):
 
 	class Meta:
 		ordering = ['-is_key_contact', 'last_name']
+		indexes = [
+			models.Index(fields=['-is_key_contact', 'last_name', 'id'], name='contact_ordering_idx'),
+		]
 	
 	def __str__(self):
 		return f"{self.first_name} {self.last_name} ({self.customer.name})" 
+
+class JobQuerySet(models.QuerySet):
+	def open(self):
+		# An IN filter (rather than exclude) lets the (status, due_date) index drive the scan
+		return self.filter(status__in=[s for s, _ in self.model.STATUS_CHOICES if s != 'COMPLETE'])
+
+	def overdue(self):
+		"""Jobs past their due date that are not complete (mirrors Job.is_overdue)"""
+		from django.utils import timezone
+		return self.open().filter(due_date__lt=timezone.now().date())
 	
 class Job(models.Model):
 	customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-	job_number = models.CharField(max_length=50, unique=True)
+	job_number = models.CharField(
+		max_length=50,
+		unique=True,
+		blank=True,
+		help_text="Generated from the customer prefix when left blank"
+	)
 	part_number = models.CharField(max_length=50)
 	quantity = models.IntegerField()
 	due_date = models.DateField()
@@ -68,6 +96,7 @@ class Job(models.Model):
 	priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='NORMAL')
 
 	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
 	started_at = models.DateTimeField(null=True, blank=True)
 	completed_at = models.DateTimeField(null=True, blank=True)
 
@@ -81,6 +110,34 @@ class Job(models.Model):
 		related_name='job',
 	)
 
+	objects = JobQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'due_date'], name='job_status_due_idx'),
+			models.Index(fields=['due_date', 'id'], name='job_due_date_idx'),
+		]
+
+	def save(self, *args, **kwargs):
+		if not self.job_number:
+			self.job_number = self.generate_job_number()
+		super().save(*args, **kwargs)
+
+	def generate_job_number(self):
+		return Job.allocate_job_numbers(self.customer.identification_prefix, 1)[0]
+
+	@staticmethod
+	def allocate_job_numbers(prefix, count):
+		"""count new job numbers for a customer prefix in the current quarter"""
+		from .sequences import allocate_numbers, current_period
+
+		year, quarter = current_period()
+		return allocate_numbers(
+			f"job:{prefix}:{year}-{quarter}", count,
+			lambda number: f"{prefix}-{year}-{quarter}-{number:03d}",
+			Job.objects, 'job_number',
+		)
+
 	@property
 	def is_overdue(self):
 		from django.utils import timezone
@@ -90,8 +147,27 @@ class Job(models.Model):
 		return f"{self.job_number} - {self.customer.name}"
 	
 
+class WorkCenter(models.Model):
+	"""A machine or cell that operations are scheduled against (see production/scheduling.py)"""
+	name = models.CharField(max_length=100, unique=True, help_text="e.g., 5-Axis Mill")
+	hours_per_day = models.DecimalField(
+		max_digits=5,
+		decimal_places=2,
+		default=Decimal('8.00'),
+		validators=[MinValueValidator(Decimal('0.25'))],
+		help_text="Available hours on a working day (machines x shift hours)",
+	)
+	works_weekends = models.BooleanField(default=False)
+
+	class Meta:
+		ordering = ['name']
+
+	def __str__(self):
+		return self.name
+
 class Operation(models.Model):
 	job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="operations")
+	work_center = models.ForeignKey(WorkCenter, on_delete=models.SET_NULL, null=True, blank=True, related_name="operations")
 	name = models.CharField(max_length=100, help_text="e.g., CNC Mill Op 1")
 	estimated_hours = models.DecimalField(max_digits=5, decimal_places=2)
 	start_date = models.DateField(null=True, blank=True)
@@ -100,18 +176,35 @@ class Operation(models.Model):
 	class Meta:
 		ordering=['start_date']
 
-class QuoteCounter(models.Model):
-    """Tracks sequential numbering per customer/year/quarter"""
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    year = models.IntegerField()
-    quarter = models.IntegerField()
-    count = models.IntegerField(default=0)
-    
-    class Meta:
-        unique_together = ['customer', 'year', 'quarter']
-    
-    def __str__(self):
-        return f"{self.customer.identification_prefix} {self.year}Q{self.quarter}: {self.count}"
+class DocumentSequence(models.Model):
+	"""Stored counter for a document number sequence (see production/sequences.py)"""
+	key = models.CharField(max_length=100, unique=True, help_text="e.g., quote:SPX:26Q1")
+	next_value = models.BigIntegerField(default=1)
+
+	def __str__(self):
+		return f"{self.key}: {self.next_value}"
+
+class QuoteQuerySet(models.QuerySet):
+	def recalculate_totals(self):
+		"""Recompute subtotal/total for every quote in the queryset with one aggregate UPDATE"""
+		money = models.DecimalField(max_digits=10, decimal_places=2)
+		line_sum = models.Subquery(
+			QuoteLineItem.objects.filter(quote=models.OuterRef('pk'))
+			.values('quote')
+			.annotate(sum=models.Sum('total_price'))
+			.values('sum'),
+			output_field=money,
+		)
+		subtotal = Coalesce(line_sum, models.Value(Decimal('0')), output_field=money)
+		bump_versions(self.model)
+		return self.update(
+			updated_at=timezone.now(),
+			subtotal=subtotal,
+			total=models.ExpressionWrapper(
+				subtotal + models.F('overhead_amount') + models.F('profit_amount'),
+				output_field=money,
+			),
+		)
 
 class Quote(models.Model):
 	STATUS_CHOICES = [
@@ -128,6 +221,7 @@ class Quote(models.Model):
 	
 	# Dates
 	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
 	sent_at = models.DateTimeField(null=True, blank=True)
 	valid_until = models.DateField(help_text="Quote expiration date")
 	
@@ -140,40 +234,108 @@ class Quote(models.Model):
 	# Notes
 	notes = models.TextField(blank=True)
 
+	objects = QuoteQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['created_at', 'id'], name='quote_created_idx'),
+		]
+
 	def calculate_totals(self):
-		lines = self.line_items.all()
-		self.subtotal = sum(line.total_price for line in lines)
-		
-		overhead = Decimal(str(self.overhead_amount))
-		profit = Decimal(str(self.profit_amount))
-		self.total = self.subtotal + overhead + profit
-		
-		self.save(update_fields=['subtotal', 'total'])
+		"""Re-sum the line items in the database and refresh subtotal/total on this instance"""
+		Quote.objects.filter(pk=self.pk).recalculate_totals()
+		self.refresh_from_db(fields=['subtotal', 'total', 'updated_at'])
+
+	def apply_totals_delta(self, delta):
+		"""Shift subtotal/total by delta with a single UPDATE (no re-summing of line items)"""
+		delta = Decimal(str(delta))
+		if not delta:
+			return
+		now = timezone.now()
+		Quote.objects.filter(pk=self.pk).update(
+			updated_at=now,
+			subtotal=models.F('subtotal') + delta,
+			total=models.F('total') + delta,
+		)
+		bump_versions(Quote)
+		self.subtotal = Decimal(str(self.subtotal)) + delta
+		self.total = Decimal(str(self.total)) + delta
+		self.updated_at = now
+
+	def apply_line_item_changes(self, create=(), update=(), delete=()):
+		"""
+		Create, update and delete many line items at once.
+
+		create: list of field dicts for new lines
+		update: list of field dicts, each with the 'id' of an existing line
+		delete: list of line ids
+
+		Writes go through bulk_create/bulk_update, so QuoteLineItem.save() is
+		bypassed and totals are recomputed exactly once at the end.
+		"""
+		from django.db import transaction
+
+		def check_owned(ids, found):
+			missing = set(ids) - set(found)
+			if missing:
+				raise QuoteLineItem.DoesNotExist(
+					f"Line items {sorted(missing)} do not belong to quote {self.quote_number}"
+				)
+
+		with transaction.atomic():
+			if delete:
+				removed = self.line_items.filter(pk__in=delete)
+				check_owned(delete, removed.values_list('pk', flat=True))
+				removed.delete()
+
+			if update:
+				changes = {row['id']: row for row in update}
+				lines = self.line_items.in_bulk(list(changes))
+				check_owned(changes, lines)
+				fields = {'total_price'}
+				for pk, line in lines.items():
+					for name, value in changes[pk].items():
+						if name != 'id':
+							setattr(line, name, value)
+							fields.add(name)
+					line.total_price = line.unit_price * line.quantity
+				QuoteLineItem.objects.bulk_update(lines.values(), sorted(fields))
+
+			if create:
+				new_lines = [QuoteLineItem(quote=self, **row) for row in create]
+				for line in new_lines:
+					line.total_price = line.unit_price * line.quantity
+				QuoteLineItem.objects.bulk_create(new_lines)
+
+			if update or create:
+				bump_versions(QuoteLineItem)
+
+			self.calculate_totals()
 
 	def save(self, *args, **kwargs):
 		if not self.quote_number:
 			self.quote_number = self.generate_quote_number()
+		# Line item deltas only adjust subtotal/total, so total must start out consistent
+		self.total = Decimal(str(self.subtotal)) + Decimal(str(self.overhead_amount)) + Decimal(str(self.profit_amount))
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None and {'subtotal', 'overhead_amount', 'profit_amount'} & set(update_fields):
+			kwargs['update_fields'] = {*update_fields, 'total'}
 		super().save(*args, **kwargs)
 	
 	def generate_quote_number(self):
-		from django.db import transaction
-		from datetime import datetime 
+		return Quote.allocate_quote_numbers(self.customer.identification_prefix, 1)[0]
 
-		now = datetime.now()
-		year = now.year % 100 # gets the last 2 digits
-		quarter = (now.month - 1) // 3 + 1
+	@staticmethod
+	def allocate_quote_numbers(prefix, count):
+		"""count new quote numbers for a customer prefix in the current quarter"""
+		from .sequences import allocate_numbers, current_period
 
-		with transaction.atomic():
-			counter, created = QuoteCounter.objects.select_for_update().get_or_create(
-				customer = self.customer,
-				year = year,
-				quarter = quarter,
-				defaults = {'count': 0}
-			)
-			counter.count += 1
-			counter.save()
-
-		return f"{self.customer.identification_prefix}{year}Q{quarter}-{counter.count:03d}"
+		year, quarter = current_period()
+		return allocate_numbers(
+			f"quote:{prefix}:{year}Q{quarter}", count,
+			lambda number: f"{prefix}{year}Q{quarter}-{number:03d}",
+			Quote.objects, 'quote_number',
+		)
 	
 class QuoteLineItem(models.Model):
     """Individual parts/items on a quote"""
@@ -192,11 +354,41 @@ class QuoteLineItem(models.Model):
     machining_hours = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     programming_hours = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what is stored so save()/delete() can apply a delta to the quote
+        if 'quote_id' in instance.__dict__ and 'total_price' in instance.__dict__:
+            instance._stored_line = (instance.quote_id, instance.total_price)
+        return instance
+
     def save(self, *args, **kwargs):
         self.total_price = self.unit_price * self.quantity
+
+        stored = None
+        if not self._state.adding:
+            stored = getattr(self, '_stored_line', None) or (
+                QuoteLineItem.objects.filter(pk=self.pk).values_list('quote_id', 'total_price').first()
+            )
         super().save(*args, **kwargs)
-        # Recalculate quote totals
-        self.quote.calculate_totals()
-    
+
+        # Update quote totals incrementally instead of re-summing every line
+        if stored is None:
+            self.quote.apply_totals_delta(self.total_price)
+        elif stored[0] != self.quote_id:
+            Quote(pk=stored[0]).apply_totals_delta(-stored[1])
+            self.quote.apply_totals_delta(self.total_price)
+        else:
+            self.quote.apply_totals_delta(self.total_price - stored[1])
+        self._stored_line = (self.quote_id, self.total_price)
+
+    def delete(self, *args, **kwargs):
+        quote = self.quote
+        stored = getattr(self, '_stored_line', None)
+        total_price = stored[1] if stored and stored[0] == self.quote_id else self.total_price
+        result = super().delete(*args, **kwargs)
+        quote.apply_totals_delta(-total_price)
+        return result
+
     def __str__(self):
         return f"{self.part_number} (Qty: {self.quantity})"	
\ No newline at end of file
@@ -0,0 +1,153 @@
+# production/sequences.py
+"""
+Document number allocation for quotes, jobs and inspection reports.
+
+Numbers are handed out per key (e.g. "quote:SPX:26Q4") by one of two backends:
+
+- "postgres": one native sequence per key. nextval() never blocks and is not
+  rolled back, so parallel writers never wait on each other (a rolled back
+  insert leaves a gap).
+- "block": a DocumentSequence row per key, advanced by block_size with a single
+  UPDATE ... RETURNING. Each process then serves numbers from its reserved
+  block in memory, so the row is touched once per block instead of once per
+  document. Unused numbers in a block are lost when the process exits. Inside
+  a transaction only the numbers needed are reserved, since a rollback would
+  hand the rest of the block out again.
+
+Configure with settings.DOCUMENT_SEQUENCES = {'BACKEND': ..., 'BLOCK_SIZE': ...};
+the default BACKEND 'auto' picks "postgres" on PostgreSQL and "block" elsewhere.
+
+Sequences start at 1, so allocate_numbers() skips numbers that are already in
+use (e.g. typed in by hand before numbering was automatic).
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError, ProgrammingError
+from django.utils import timezone
+
+from .models import DocumentSequence
+
+def current_period(today=None):
+	"""(two digit year, quarter) used to scope quote and job numbers"""
+	today = today or timezone.localdate()
+	return today.year % 100, (today.month - 1) // 3 + 1
+
+class SequenceAllocator:
+	def __init__(self, backend=None, block_size=None):
+		config = getattr(settings, 'DOCUMENT_SEQUENCES', {})
+		self.backend = backend or config.get('BACKEND', 'auto')
+		self.block_size = block_size or config.get('BLOCK_SIZE', 20)
+		self._blocks = {}
+		self._known_sequences = set()
+		self._lock = threading.Lock()
+
+	def get_backend(self):
+		if self.backend == 'auto':
+			return 'postgres' if connection.vendor == 'postgresql' else 'block'
+		return self.backend
+
+	def next_value(self, key):
+		return self.next_values(key, 1)[0]
+
+	def next_values(self, key, count):
+		"""Allocate count unique numbers for key (used by bulk creation paths)"""
+		if count <= 0:
+			return []
+		if self.get_backend() == 'postgres':
+			return self._nextval(key, count)
+		return self._from_block(key, count)
+
+	# -- block backend -----------------------------------------------------
+
+	def _from_block(self, key, count):
+		values = self._take_cached(key, count)
+		if len(values) < count:
+			# Reserve without holding the process lock: inside a transaction the UPDATE
+			# can wait on another writer's row lock.
+			needed = count - len(values)
+			start, end = self._reserve(key, self._block_for(needed))
+			values.extend(range(start, start + needed))
+			with self._lock:
+				cached_start, cached_end = self._blocks.get(key, (0, 0))
+				if cached_start >= cached_end:
+					self._blocks[key] = (start + needed, end)
+		return values
+
+	def _take_cached(self, key, count):
+		with self._lock:
+			start, end = self._blocks.get(key, (0, 0))
+			take = max(0, min(end - start, count))
+			self._blocks[key] = (start + take, end)
+		return list(range(start, start + take))
+
+	def _block_for(self, needed):
+		# Inside a transaction the reservation would be undone by a rollback while the
+		# surplus stayed cached here, so only reserve what is used right away.
+		if connection.in_atomic_block:
+			return needed
+		return max(self.block_size, needed)
+
+	def _reserve(self, key, size):
+		"""Advance the stored counter by size and return the reserved [start, end)"""
+		DocumentSequence.objects.bulk_create([DocumentSequence(key=key)], ignore_conflicts=True)
+		table = connection.ops.quote_name(DocumentSequence._meta.db_table)
+		key_column = connection.ops.quote_name('key')
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f"UPDATE {table} SET next_value = next_value + %s WHERE {key_column} = %s RETURNING next_value",
+				[size, key],
+			)
+			end = cursor.fetchone()[0]
+		return end - size, end
+
+	# -- postgres backend --------------------------------------------------
+
+	@staticmethod
+	def sequence_name(key):
+		return 'docseq_' + hashlib.sha1(key.encode()).hexdigest()[:20]
+
+	def _nextval(self, key, count):
+		name = self.sequence_name(key)
+		if name not in self._known_sequences:
+			self._create_sequence(key, name)
+		try:
+			with transaction.atomic(), connection.cursor() as cursor:
+				cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [name, count])
+				values = [row[0] for row in cursor.fetchall()]
+		except ProgrammingError:
+			# The sequence was created inside a transaction that later rolled back
+			self._known_sequences.discard(name)
+			self._create_sequence(key, name)
+			with connection.cursor() as cursor:
+				cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [name, count])
+				values = [row[0] for row in cursor.fetchall()]
+		return values
+
+	def _create_sequence(self, key, name):
+		# Continue from any counter carried over from the block backend / QuoteCounter
+		stored = DocumentSequence.objects.filter(key=key).values_list('next_value', flat=True).first()
+		try:
+			with transaction.atomic(), connection.cursor() as cursor:
+				cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {name} START WITH {int(stored or 1)}")
+		except IntegrityError:
+			pass  # created concurrently by another writer
+		self._known_sequences.add(name)
+
+allocator = SequenceAllocator()
+
+def allocate(key):
+	return allocator.next_value(key)
+
+def allocate_many(key, count):
+	return allocator.next_values(key, count)
+
+def allocate_numbers(key, count, format, queryset, field):
+	"""count formatted numbers for key, skipping any already stored in queryset's field"""
+	numbers = []
+	while len(numbers) < count:
+		candidates = [format(value) for value in allocate_many(key, count - len(numbers))]
+		taken = set(queryset.filter(**{f'{field}__in': candidates}).values_list(field, flat=True))
+		numbers.extend(number for number in candidates if number not in taken)
+	return numbers
@@ -1,46 +1,93 @@
 # production/serializer.py
 from rest_framework import serializers
-from .models import Customer, Contact, Quote, QuoteLineItem, Job, Operation
+from core.caching import FragmentCacheListSerializer
+from core.serializers import DynamicFieldsMixin
+from .models import Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	class Meta:
 		model = Customer
 		fields = '__all__'
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	customer_name = serializers.CharField(source='customer.name', read_only=True)
 
 	class Meta:
 		model = Contact
 		fields = '__all__'
 
-class OperationSerializer(serializers.ModelSerializer):
+class WorkCenterSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+	class Meta:
+		model = WorkCenter
+		fields = '__all__'
+
+class OperationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	class Meta:
 		model = Operation
 		fields = '__all__'
 
-class JobDetailSerializer(serializers.ModelSerializer):
+class JobDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	operations = OperationSerializer(many=True, read_only=True)
 
 	customer_name = serializers.CharField(source='customer.name', read_only=True)
 
+	expandable_fields = {
+		'inspections': ('quality.serializers.InspectionReportListSerializer', {'many': True, 'read_only': True}),
+	}
+
 	class Meta:
 		model = Job
 		fields = '__all__'
 
-class JobListSerializer(serializers.ModelSerializer):
+class JobListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	customer_name = serializers.CharField(source='customer.name', read_only=True)
 
+	expandable_fields = {
+		'operations': (OperationSerializer, {'many': True, 'read_only': True}),
+		'inspections': ('quality.serializers.InspectionReportListSerializer', {'many': True, 'read_only': True}),
+	}
+
 	class Meta:
 		model = Job
 		fields = '__all__'
+		list_serializer_class = FragmentCacheListSerializer
 
-class QuoteLineItemSerializer(serializers.ModelSerializer):
+class QuoteLineItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	class Meta:
 		model = QuoteLineItem
 		fields = '__all__'
 
-class QuoteDetailSerializer(serializers.ModelSerializer):
+class QuoteLineItemWriteSerializer(serializers.ModelSerializer):
+	"""A line item as submitted to the bulk endpoint; the quote comes from the URL"""
+	class Meta:
+		model = QuoteLineItem
+		exclude = ['quote']
+
+class QuoteLineItemUpdateSerializer(QuoteLineItemWriteSerializer):
+	id = serializers.IntegerField()
+
+	class Meta(QuoteLineItemWriteSerializer.Meta):
+		extra_kwargs = {
+			'part_number': {'required': False},
+			'description': {'required': False},
+			'quantity': {'required': False},
+			'unit_price': {'required': False},
+		}
+
+class QuoteLineItemBulkSerializer(serializers.Serializer):
+	create = QuoteLineItemWriteSerializer(many=True, required=False)
+	update = QuoteLineItemUpdateSerializer(many=True, required=False)
+	delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+	def validate(self, attrs):
+		updated = [row['id'] for row in attrs.get('update', [])]
+		if len(updated) != len(set(updated)):
+			raise serializers.ValidationError("A line item can only be updated once per request")
+		if set(updated) & set(attrs.get('delete', [])):
+			raise serializers.ValidationError("A line item cannot be both updated and deleted")
+		return attrs
+
+class QuoteDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	line_items = QuoteLineItemSerializer(many=True, read_only=True)
 	customer_name = serializers.CharField(source='customer.name', read_only=True)
 
@@ -48,11 +95,16 @@ class QuoteDetailSerializer(serializers.ModelSerializer):
 		model = Quote
 		fields = '__all__'
 
-class QuoteListSerializer(serializers.ModelSerializer):
+class QuoteListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	customer_name = serializers.CharField(source='customer.name', read_only=True)
 
+	expandable_fields = {
+		'line_items': (QuoteLineItemSerializer, {'many': True, 'read_only': True}),
+	}
+
 	class Meta:
 		model = Quote
 		fields = ['id', 'quote_number', 'customer', 'customer_name', 
                   'status', 'total', 'created_at', 'valid_until']
+		list_serializer_class = FragmentCacheListSerializer
 
@@ -0,0 +1,38 @@
+# production/tasks.py
+from celery import shared_task
+from django.urls import reverse
+
+from core.artifacts import release_render
+
+from .documents import QuoteDocument
+
+def customer_quotes_key(customer_id):
+	return f"customer-quotes:{customer_id}"
+
+@shared_task
+def render_quote_pdf(quote_id):
+	document = QuoteDocument.load(quote_id)
+	try:
+		document.save()
+	finally:
+		release_render(document.path)
+	return {'quote_id': quote_id, 'download_url': reverse('quote-pdf', kwargs={'pk': quote_id})}
+
+@shared_task
+def render_customer_quote_pdfs(customer_id):
+	"""Render every quote of a customer that has no up-to-date PDF yet"""
+	quotes, rendered = [], 0
+	try:
+		for quote in QuoteDocument.queryset().filter(customer_id=customer_id).iterator(chunk_size=100):
+			document = QuoteDocument(quote)
+			if not document.exists():
+				document.save()
+				rendered += 1
+			quotes.append({
+				'quote_id': quote.pk,
+				'quote_number': quote.quote_number,
+				'download_url': reverse('quote-pdf', kwargs={'pk': quote.pk}),
+			})
+	finally:
+		release_render(customer_quotes_key(customer_id))
+	return {'customer_id': customer_id, 'rendered': rendered, 'quotes': quotes}
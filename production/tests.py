@@ -1,3 +1,777 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, IntegrityError
+from django.db.models import Sum
+from django.test import AsyncClient, LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook, load_workbook
+from rest_framework.test import APIClient
+
+from core import artifacts
+from core.caching import bump_versions
+from core.metrics import registry
+from quality.models import COUNTER_FIELDS, CharacteristicStatistics, InspectionCharacteristic, InspectionReport
+
+from . import importers, scheduling, sequences
+from .models import Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter
+from .documents import QuoteDocument
+from .serializers import JobListSerializer
+
+class ListQueryCountTests(TestCase):
+	"""Each list endpoint must issue the same number of queries for 2 rows as for 12"""
+
+	endpoints = [
+		'/api/production/customers/',
+		'/api/production/contacts/',
+		'/api/production/jobs/',
+		'/api/production/jobs/?expand=operations,inspections',
+		'/api/production/jobs/overdue/',
+		'/api/production/async/jobs/?expand=operations,inspections',
+		'/api/production/async/jobs/overdue/',
+		'/api/production/quotes/',
+		'/api/production/quotes/?expand=line_items',
+		'/api/production/operations/',
+	]
+
+	def setUp(self):
+		self.client = APIClient()
+		self.created = 0
+
+	def create_rows(self, count):
+		for _ in range(count):
+			self.created += 1
+			n = self.created
+			customer = Customer.objects.create(name=f"Customer {n}", email=f"c{n}@example.com", identification_prefix=f"C{n}")
+			Contact.objects.create(customer=customer, first_name="Pat", last_name=f"Buyer {n}", email=f"p{n}@example.com")
+			quote = Quote.objects.create(customer=customer, valid_until=date.today() + timedelta(days=30))
+			QuoteLineItem.objects.create(quote=quote, part_number=f"P-{n}", description="Bracket", quantity=2, unit_price=10)
+			job = Job.objects.create(
+				customer=customer, part_number=f"P-{n}", quantity=2,
+				due_date=date.today() - timedelta(days=1), status='SCHEDULED'
+			)
+			Operation.objects.create(job=job, name="Mill", estimated_hours=2)
+
+	def count_queries(self, url):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200, url)
+		return len(queries)
+
+	def test_query_count_does_not_grow_with_rows(self):
+		self.create_rows(2)
+		small = {url: self.count_queries(url) for url in self.endpoints}
+		self.create_rows(10)
+		for url in self.endpoints:
+			with self.subTest(url=url):
+				self.assertEqual(self.count_queries(url), small[url])
+
+class DynamicFieldsTests(TestCase):
+	url = '/api/production/jobs/'
+
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		for n in range(3):
+			job = Job.objects.create(customer=customer, part_number=f"P-{n}", quantity=1, due_date=date.today(), notes="Rush")
+			Operation.objects.create(job=job, name="Mill", estimated_hours=2)
+			InspectionReport.objects.create(job=job, part_number=f"P-{n}", part_name="Bracket")
+
+	def get(self, **params):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(self.url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.data['results'], [query['sql'] for query in queries]
+
+	def test_fields_selects_columns_and_ignores_unknown_names(self):
+		rows, queries = self.get(fields='id,job_number,customer_name,nope')
+		self.assertEqual([set(row) for row in rows], [{'id', 'job_number', 'customer_name'}] * 3)
+		self.assertEqual(rows[0]['customer_name'], "Acme")
+		# customer_name comes from a join; columns nobody asked for are not read
+		job_query = next(sql for sql in queries if 'FROM "production_job"' in sql and 'COUNT(' not in sql)
+		self.assertIn('"production_customer"', job_query)
+		self.assertNotIn('"production_job"."notes"', job_query)
+
+	def test_expand_adds_nested_rows_with_one_query_per_relation(self):
+		plain, plain_queries = self.get()
+		self.assertNotIn('operations', plain[0])
+		self.assertFalse(any('production_operation' in sql for sql in plain_queries))
+
+		cache.clear()
+		rows, queries = self.get(expand='operations,inspections,nope')
+		self.assertEqual(rows[0]['operations'][0]['name'], "Mill")
+		self.assertEqual(rows[0]['inspections'][0]['part_name'], "Bracket")
+		self.assertNotIn('nope', rows[0])
+		self.assertEqual(sum('FROM "production_operation"' in sql for sql in queries), 1)
+		self.assertEqual(sum('FROM "quality_inspectionreport"' in sql for sql in queries), 1)
+
+	def test_fields_prunes_only_the_top_level(self):
+		rows, _ = self.get(fields='id', expand='operations')
+		self.assertEqual(set(rows[0]), {'id', 'operations'})
+		self.assertIn('estimated_hours', rows[0]['operations'][0])
+
+class ExportTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="@Acme", email="acme@example.com", identification_prefix="ACM")
+		Job.objects.create(
+			customer=customer, job_number="J-1", part_number='=HYPERLINK("http://example.com","P-1")', quantity=4,
+			due_date=date(2030, 1, 15), notes="-2+3",
+		)
+		Job.objects.create(customer=customer, job_number="J-2", part_number="P-2", quantity=1, due_date=date(2030, 1, 16))
+
+	def test_csv(self):
+		response = self.client.get('/api/production/jobs/export/', {'file_format': 'csv'})
+		self.assertEqual(response['Content-Type'], 'text/csv')
+		rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+		self.assertEqual([row['Job Number'] for row in rows], ['J-1', 'J-2'])
+		self.assertEqual(rows[0]['Part Number'], '\'=HYPERLINK("http://example.com","P-1")')
+		self.assertEqual((rows[0]['Customer'], rows[0]['Notes']), ("'@Acme", "'-2+3"))
+		self.assertEqual((rows[0]['Quantity'], rows[0]['Due Date']), ('4', '2030-01-15'))
+		self.assertEqual(rows[1]['Part Number'], 'P-2')
+
+	def test_xlsx(self):
+		response = self.client.get('/api/production/jobs/export/', {'file_format': 'xlsx', 'status': 'QUOTE'})
+		sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+		header, *rows = sheet.iter_rows(values_only=True)
+		rows = [dict(zip(header, row)) for row in rows]
+		self.assertEqual(len(rows), 2)
+		self.assertEqual(rows[0]['Part Number'], '=HYPERLINK("http://example.com","P-1")')
+		self.assertEqual(sheet['C2'].data_type, 's')
+		self.assertEqual(rows[0]['Notes'], "-2+3")
+		self.assertEqual(rows[0]['Quantity'], 4)
+		self.assertEqual(rows[0]['Due Date'].date(), date(2030, 1, 15))
+
+class KeysetPaginationTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		# Ties on due_date are broken by the id
+		for n in range(8):
+			Job.objects.create(customer=customer, part_number=f"P-{n}", quantity=1, due_date=date.today() + timedelta(days=n // 3))
+
+	def walk(self, url, link='next'):
+		pages = []
+		while url:
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			pages.append([row['id'] for row in response.data['results']])
+			url = response.data[link]
+		return pages
+
+	def test_pages_follow_the_ordering_both_ways(self):
+		for ordering in ('due_date', '-due_date', 'priority'):
+			with self.subTest(ordering=ordering):
+				expected = [row['id'] for row in self.client.get('/api/production/jobs/', {'ordering': ordering}).data['results']]
+				pages = self.walk(f'/api/production/jobs/?pagination=cursor&page_size=3&ordering={ordering}')
+				self.assertEqual([len(page) for page in pages], [3, 3, 2])
+				self.assertEqual(sum(pages, []), expected)
+
+				last = self.client.get(f'/api/production/jobs/?pagination=cursor&page_size=3&ordering={ordering}')
+				while last.data['next']:
+					last = self.client.get(last.data['next'])
+				self.assertEqual(self.walk(last.data['previous'], link='previous'), pages[1::-1])
+
+	def test_keyset_pages_skip_the_count(self):
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get('/api/production/jobs/', {'pagination': 'cursor', 'page_size': 3})
+		self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+	def test_invalid_cursor(self):
+		self.assertEqual(self.client.get('/api/production/jobs/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+class ConditionalGetTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.job = Job.objects.create(customer=customer, part_number="P-1", quantity=1, due_date=date.today())
+		self.url = '/api/production/jobs/'
+
+	def test_unchanged_list_returns_304_without_queries(self):
+		etag = self.client.get(self.url)['ETag']
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(len(queries), 0)
+
+	def test_write_to_a_dependency_changes_etag(self):
+		etag = self.client.get(self.url)['ETag']
+		Operation.objects.create(job=self.job, name="Mill", estimated_hours=1)
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+
+	def test_bulk_line_item_changes_invalidate_quotes(self):
+		quote = Quote.objects.create(customer=self.job.customer, valid_until=date.today())
+		url = f'/api/production/quotes/{quote.pk}/'
+		etag = self.client.get(url)['ETag']
+		quote.apply_line_item_changes(create=[
+			{'part_number': 'P-1', 'description': 'Bracket', 'quantity': 2, 'unit_price': 10},
+		])
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['total'], '20.00')
+
+class QuoteLineItemTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user('estimator', password='x'))
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.quote = Quote.objects.create(
+			customer=customer, valid_until=date.today(), overhead_amount=Decimal('50.00'), profit_amount=Decimal('25.00'),
+		)
+		self.url = f'/api/production/quotes/{self.quote.pk}/line-items/bulk/'
+
+	def line(self, n, quantity=1, unit_price='10.00'):
+		return {'part_number': f"P-{n}", 'description': "Bracket", 'quantity': quantity, 'unit_price': Decimal(unit_price)}
+
+	def assertTotalsMatchLines(self):
+		self.quote.refresh_from_db()
+		lines = self.quote.line_items.aggregate(total=Sum('total_price'))['total'] or 0
+		self.assertEqual(self.quote.subtotal, lines)
+		self.assertEqual(self.quote.total, lines + Decimal('75.00'))
+
+	def test_saving_and_deleting_a_line_applies_its_delta(self):
+		line = QuoteLineItem.objects.create(quote=self.quote, **self.line(1, quantity=3))
+		QuoteLineItem.objects.create(quote=self.quote, **self.line(2, quantity=2, unit_price='7.50'))
+		self.assertTotalsMatchLines()
+		self.assertEqual(self.quote.subtotal, Decimal('45.00'))
+		line.quantity = 10
+		line.save()
+		self.assertTotalsMatchLines()
+		line.delete()
+		self.assertTotalsMatchLines()
+		self.assertEqual(self.quote.subtotal, Decimal('15.00'))
+
+	def test_bulk_create_update_and_delete(self):
+		kept, changed, removed = [QuoteLineItem.objects.create(quote=self.quote, **self.line(n)) for n in range(3)]
+		response = self.client.post(self.url, {
+			'create': [self.line(10, quantity=4, unit_price='2.50'), self.line(11, quantity=1, unit_price='99.99')],
+			'update': [{'id': changed.pk, 'quantity': 5}],
+			'delete': [removed.pk],
+		}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(response.data['line_items']), 4)
+		self.assertEqual(response.data['subtotal'], '169.99')
+		self.assertEqual(response.data['total'], '244.99')
+		self.assertTotalsMatchLines()
+		self.assertFalse(QuoteLineItem.objects.filter(pk=removed.pk).exists())
+
+	def test_invalid_bulk_changes_are_rejected_whole(self):
+		line = QuoteLineItem.objects.create(quote=self.quote, **self.line(1))
+		other = Quote.objects.create(customer=self.quote.customer, valid_until=date.today())
+		foreign = QuoteLineItem.objects.create(quote=other, **self.line(2))
+		response = self.client.post(self.url, {'create': [self.line(3)], 'update': [{'id': foreign.pk, 'quantity': 2}]}, format='json')
+		self.assertEqual(response.status_code, 400)
+		response = self.client.post(self.url, {'update': [{'id': line.pk, 'quantity': 2}], 'delete': [line.pk]}, format='json')
+		self.assertEqual(response.status_code, 400)
+		response = self.client.post(self.url, {'delete': [line.pk, foreign.pk, 999999]}, format='json')
+		self.assertEqual(response.status_code, 400)
+		self.assertIn(f"[{foreign.pk}, 999999]", response.data['error'])
+		self.assertTrue(QuoteLineItem.objects.filter(pk=foreign.pk).exists())
+		self.assertEqual(self.quote.line_items.count(), 1)
+		self.assertTotalsMatchLines()
+
+	def test_query_count_does_not_grow_with_lines(self):
+		def bulk_queries(count):
+			existing = [QuoteLineItem.objects.create(quote=self.quote, **self.line(n)) for n in range(2 * count)]
+			with CaptureQueriesContext(connection) as queries:
+				response = self.client.post(self.url, {
+					'create': [self.line(n) for n in range(count)],
+					'update': [{'id': line.pk, 'quantity': 3} for line in existing[:count]],
+					'delete': [line.pk for line in existing[count:]],
+				}, format='json')
+			self.assertEqual(response.status_code, 200)
+			return len(queries)
+
+		self.assertEqual(bulk_queries(20), bulk_queries(2))
+		self.assertTotalsMatchLines()
+
+class SearchTests(TestCase):
+	url = '/api/search/'
+
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme Aerospace", email="acme@example.com", identification_prefix="ACM")
+		for part_number in ("X-BRK", "BRK-2", "BRK"):
+			Job.objects.create(customer=customer, part_number=part_number, quantity=1, due_date=date.today())
+		quote = Quote.objects.create(customer=customer, valid_until=date.today())
+		QuoteLineItem.objects.create(quote=quote, part_number="brk", description="Bracket", quantity=1, unit_price=10)
+		self.report = InspectionReport.objects.create(part_number="BRK", part_name="Bracket")
+
+	def search(self, **params):
+		response = self.client.get(self.url, params)
+		self.assertEqual(response.status_code, 200)
+		return [(result['type'], result['description'].split(' ')[0], result['rank']) for result in response.data['results']]
+
+	def test_results_are_ranked_exact_prefix_substring(self):
+		self.assertEqual(self.search(q='brk', types='job'), [('job', 'BRK', 3), ('job', 'BRK-2', 2), ('job', 'X-BRK', 1)])
+		results = self.search(q='BRK')
+		self.assertEqual({kind for kind, _, rank in results if rank == 3}, {'job', 'quote_part', 'inspection'})
+		self.assertEqual([rank for _, _, rank in results], sorted((rank for _, _, rank in results), reverse=True))
+
+	def test_results_link_to_their_detail_endpoint(self):
+		response = self.client.get(self.url, {'q': 'brk', 'types': 'inspection,customer'})
+		[result] = response.data['results']
+		self.assertEqual(result['url'], f'http://testserver/api/quality/inspections/{self.report.pk}/')
+		self.assertEqual(self.search(q='aero'), [('customer', 'ACM', 1)])
+
+	def test_limit_and_bad_queries(self):
+		self.assertEqual(len(self.search(q='brk', types='job', limit=2)), 2)
+		self.assertEqual(self.client.get(self.url, {'q': 'b'}).status_code, 400)
+		self.assertEqual(self.client.get(self.url, {'q': 'brk', 'limit': 'all'}).status_code, 400)
+
+class SchedulingTests(TestCase):
+	friday = date(2030, 1, 4)
+	monday = date(2030, 1, 7)
+
+	def calendars(self, **work_centers):
+		calendars = {None: scheduling.CapacityCalendar(self.friday, 8)}
+		for name, (hours, weekends) in work_centers.items():
+			calendars[name] = scheduling.CapacityCalendar(self.friday, hours, weekends, horizon=10)
+		return calendars
+
+	def test_weekends_are_skipped_unless_worked(self):
+		jobs = [(1, 'NORMAL', None, [(10, 'mill', 12)]), (2, 'NORMAL', None, [(20, 'cell', 12)])]
+		result = scheduling.plan(jobs, self.calendars(mill=(8, False), cell=(8, True)), self.friday)
+		self.assertEqual(result['operations'][10], (self.friday, self.monday))
+		self.assertEqual(result['operations'][20], (self.friday, date(2030, 1, 5)))
+
+	def test_full_work_center_pushes_lower_priority_jobs_out(self):
+		jobs = [
+			(1, 'NORMAL', self.friday, [(10, 'mill', 8)]),
+			(2, 'URGENT', self.monday, [(20, 'mill', 8)]),
+			(3, 'LOW', self.friday, [(30, 'lathe', 4)]),
+		]
+		result = scheduling.plan(jobs, self.calendars(mill=(8, False), lathe=(8, False)), self.friday)
+		self.assertEqual(result['operations'][20], (self.friday, self.friday))
+		self.assertEqual(result['operations'][10], (self.monday, self.monday))
+		self.assertEqual(result['operations'][30], (self.friday, self.friday))
+		self.assertEqual(result['late_jobs'], [1])
+
+		# Longer than the horizon: the calendar grows instead of failing
+		result = scheduling.plan([(4, 'NORMAL', None, [(40, 'mill', 200)])], self.calendars(mill=(8, False)), self.friday)
+		# 25 working days: Friday plus five weeks less a day
+		self.assertEqual(result['operations'][40], (self.friday, date(2030, 2, 7)))
+
+	def test_operations_wait_for_the_one_before(self):
+		# Saw (mill, 4h) -> weld (cell, 10h, into Monday) -> finish (mill, 2h)
+		jobs = [(1, 'NORMAL', self.friday, [(10, 'mill', 4), (11, 'cell', 10), (12, 'mill', 2)])]
+		result = scheduling.plan(jobs, self.calendars(mill=(8, False), cell=(8, False)), self.friday)
+		self.assertEqual(result['operations'], {
+			10: (self.friday, self.friday),
+			11: (self.friday, self.monday),
+			12: (self.monday, self.monday),
+		})
+		self.assertEqual(result['late_jobs'], [1])
+
+	def test_schedule_writes_only_changed_dates(self):
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		mill = WorkCenter.objects.create(name="Mill", hours_per_day=8)
+		job = Job.objects.create(customer=customer, part_number="P-1", quantity=1, due_date=self.monday, status='SCHEDULED')
+		first = Operation.objects.create(job=job, name="Rough", work_center=mill, estimated_hours=6)
+		second = Operation.objects.create(job=job, name="Finish", work_center=mill, estimated_hours=4)
+
+		self.assertEqual(scheduling.schedule(self.friday)['operations_updated'], 2)
+		second.refresh_from_db()
+		self.assertEqual((second.start_date, second.end_date), (self.friday, self.monday))
+		self.assertEqual(scheduling.schedule(self.friday)['operations_updated'], 0)
+
+		first.estimated_hours = 2
+		first.save()
+		self.assertEqual(scheduling.schedule(self.friday)['operations_updated'], 2)
+		second.refresh_from_db()
+		self.assertEqual(second.end_date, self.friday)
+
+@override_settings(LONG_POLL={'MAX_WAIT': 5, 'INTERVAL': 0.05})
+class AsyncListTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client = APIClient()
+		self.customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		for n in range(3):
+			Job.objects.create(
+				customer=self.customer, part_number=f"P-{n}", quantity=1,
+				due_date=date.today() - timedelta(days=n), status='SCHEDULED',
+			)
+
+	def test_matches_the_sync_endpoint(self):
+		for query in ('', '?fields=id,job_number,customer_name&ordering=-due_date', '?expand=operations&page=1', '?pagination=cursor'):
+			with self.subTest(query=query):
+				sync = self.client.get(f'/api/production/jobs/{query}').json()
+				response = self.client.get(f'/api/production/async/jobs/{query}')
+				self.assertEqual(response.status_code, 200)
+				self.assertEqual(json.loads(response.content.decode().replace('/async', '')), sync)
+		self.assertEqual(
+			self.client.get('/api/production/async/jobs/overdue/').json(),
+			self.client.get('/api/production/jobs/overdue/').json(),
+		)
+		self.assertEqual(self.client.get('/api/production/async/jobs/?status=NOPE').status_code, 400)
+		self.assertEqual(self.client.get('/api/production/async/jobs/?page=9').status_code, 404)
+
+	def test_uses_the_viewset_authentication(self):
+		User.objects.create_user('planner', password='secret')
+		url = '/api/production/async/jobs/'
+		anonymous = self.client.get(url)['ETag']
+		credentials = 'Basic ' + base64.b64encode(b'planner:secret').decode()
+		response = self.client.get(url, HTTP_AUTHORIZATION=credentials)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], anonymous)
+
+		# Rejected like the sync endpoint does (403: SessionAuthentication comes first and sends no challenge)
+		wrong = 'Basic ' + base64.b64encode(b'planner:nope').decode()
+		sync = self.client.get('/api/production/jobs/', HTTP_AUTHORIZATION=wrong)
+		response = self.client.get(url, HTTP_AUTHORIZATION=wrong)
+		self.assertEqual((response.status_code, response.json()), (sync.status_code, sync.json()))
+		self.assertEqual(response.status_code, 403)
+
+	def test_wait_holds_the_request_until_a_change(self):
+		url = '/api/production/async/jobs/'
+		etag = self.client.get(url)['ETag']
+
+		began = time.monotonic()
+		response = self.client.get(url, {'wait': 0.2}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertGreaterEqual(time.monotonic() - began, 0.2)
+
+		async def poll_while_changing():
+			poll = asyncio.ensure_future(AsyncClient().get(url, {'wait': 5}, headers={'If-None-Match': etag}))
+			await asyncio.sleep(0.1)
+			await sync_to_async(bump_versions)('production.Job')
+			return await poll
+		began = time.monotonic()
+		response = async_to_sync(poll_while_changing)()
+		self.assertEqual(response.status_code, 200)
+		self.assertLess(time.monotonic() - began, 2)
+		self.assertNotEqual(response['ETag'], etag)
+		self.assertEqual(len(response.json()['results']), 3)
+
+class FragmentCacheTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.jobs = [
+			Job.objects.create(customer=customer, part_number=f"P-{n}", quantity=1, due_date=date.today())
+			for n in range(5)
+		]
+
+	def serialized_rows(self, url):
+		rows = []
+		original = JobListSerializer.to_representation
+
+		def spy(serializer, instance):
+			rows.append(instance.pk)
+			return original(serializer, instance)
+
+		with mock.patch.object(JobListSerializer, 'to_representation', spy):
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		return rows
+
+	def test_only_changed_rows_are_serialized_again(self):
+		self.assertEqual(len(self.serialized_rows('/api/production/jobs/')), 5)
+		changed = self.jobs[2]
+		changed.notes = "Hold for material"
+		changed.save()
+		self.assertEqual(self.serialized_rows('/api/production/jobs/'), [changed.pk])
+
+	def test_related_change_invalidates_rows(self):
+		self.serialized_rows('/api/production/jobs/')
+		customer = self.jobs[0].customer
+		customer.name = "Acme Aerospace"
+		customer.save()
+		self.assertEqual(len(self.serialized_rows('/api/production/jobs/')), 5)
+
+class JobImportTests(TestCase):
+	url = '/api/production/jobs/import/'
+	header = 'Job Number,Customer Prefix,Part Number,Quantity,Due Date,Operation Name,Estimated Hours\r\n'
+
+	def setUp(self):
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user('planner', password='x'))
+		self.customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+
+	def upload(self, content, name='jobs.csv'):
+		file = io.BytesIO(content if isinstance(content, bytes) else content.encode())
+		file.name = name
+		return self.client.post(self.url, {'file': file}, format='multipart')
+
+	def test_csv_rows_become_jobs_and_operations(self):
+		response = self.upload(self.header + (
+			'J-100,ACM,P-1,5,2030-01-15,Mill,2.5\r\n'
+			'J-100,ACM,P-1,5,2030-01-15,Deburr,0.25\r\n'
+			',ACM,P-2,1,2030-02-01,Lathe,1\r\n'
+		))
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.data, {'jobs_created': 2, 'operations_created': 3, 'error_count': 0, 'errors': []})
+		job = Job.objects.get(job_number='J-100')
+		self.assertEqual(job.quantity, 5)
+		self.assertEqual(sorted(job.operations.values_list('name', 'estimated_hours')), [('Deburr', Decimal('0.25')), ('Mill', Decimal('2.50'))])
+		self.assertTrue(Job.objects.get(part_number='P-2').job_number)
+
+	def test_xlsx_rows_become_jobs(self):
+		workbook = Workbook()
+		sheet = workbook.active
+		sheet.append(['job_number', 'customer_prefix', 'part_number', 'quantity', 'due_date', 'operation_name', 'estimated_hours'])
+		sheet.append(['J-200', 'ACM', 'P-1', 3, date(2030, 1, 15), 'Mill', 1.5])
+		sheet.append(['J-200', 'ACM', 'P-1', 3, date(2030, 1, 15), 'Inspect', 0.5])
+		content = io.BytesIO()
+		workbook.save(content)
+		response = self.upload(content.getvalue(), name='jobs.xlsx')
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual((response.data['jobs_created'], response.data['operations_created']), (1, 2))
+		self.assertEqual(Job.objects.get(job_number='J-200').due_date, date(2030, 1, 15))
+
+	def test_invalid_rows_are_reported_and_skipped(self):
+		response = self.upload(self.header + (
+			'J-1,ACM,P-1,5,2030-01-15,Mill,1\r\n'
+			'J-2,NOPE,P-2,5.5,someday,Mill,1\r\n'
+			'J-3,ACM,P-3,1,2030-01-15,Mill,999.999\r\n'
+			'J-4,ACM,P-4,1,2030-01-15,Mill,1000\r\n'
+			'J-5,ACM,P-5,1,2030-01-15,Mill,999.99\r\n'
+		))
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.data['jobs_created'], 2)
+		self.assertEqual(response.data['error_count'], 3)
+		errors = {error['row']: error['errors'] for error in response.data['errors']}
+		self.assertEqual(set(errors[3]), {'customer_prefix', 'quantity', 'due_date'})
+		self.assertEqual(set(errors[4]), {'estimated_hours'})
+		self.assertEqual(set(errors[5]), {'estimated_hours'})
+		self.assertEqual(sorted(Job.objects.values_list('job_number', flat=True)), ['J-1', 'J-5'])
+
+	def test_whole_number_quantities_only(self):
+		response = self.upload(self.header + 'J-1,ACM,P-1,5.5,2030-01-15,,\r\nJ-2,ACM,P-2,4.0,2030-01-15,,\r\n')
+		self.assertEqual([error['row'] for error in response.data['errors']], [2])
+		self.assertEqual(Job.objects.get().quantity, 4)
+
+	def test_duplicate_job_numbers_are_rejected(self):
+		Job.objects.create(customer=self.customer, job_number='J-1', part_number="P-1", quantity=1, due_date=date.today())
+		response = self.upload(self.header + (
+			'J-1,ACM,P-1,1,2030-01-15,Mill,1\r\n'
+			'J-2,ACM,P-2,1,2030-01-15,Mill,1\r\n'
+			'J-3,ACM,P-3,1,2030-01-15,Mill,1\r\n'
+			'J-2,ACM,P-2,1,2030-01-15,Mill,1\r\n'
+		))
+		errors = {error['row']: error['errors']['job_number'] for error in response.data['errors']}
+		self.assertEqual(errors, {2: "Job J-1 already exists", 5: "Job J-2 appears more than once in the file"})
+		self.assertEqual(Job.objects.count(), 3)
+
+	def test_values_must_fit_their_columns(self):
+		response = self.upload(self.header + (
+			f'{"J" * 51},ACM,P-1,1,2030-01-15,,\r\n'
+			f'J-2,ACM,{"P" * 51},1,2030-01-15,,\r\n'
+			'J-3,ACM,P-3,2147483648,2030-01-15,,\r\n'
+			f'{"J" * 50},ACM,{"P" * 50},2147483647,2030-01-15,,\r\n'
+		))
+		errors = {error['row']: set(error['errors']) for error in response.data['errors']}
+		self.assertEqual(errors, {2: {'job_number'}, 3: {'part_number'}, 4: {'quantity'}})
+		self.assertEqual(response.data['jobs_created'], 1)
+
+	def test_numbers_from_a_rolled_back_batch_can_be_imported_again(self):
+		bulk_create = Job.objects.bulk_create
+		calls = []
+		def fail_first(jobs, *args, **kwargs):
+			calls.append(jobs)
+			if len(calls) == 1:
+				raise IntegrityError("duplicate key")
+			return bulk_create(jobs, *args, **kwargs)
+
+		rows = importers.read_rows(io.BytesIO((self.header + (
+			'J-1,ACM,P-1,1,2030-01-15,,\r\n'
+			'J-2,ACM,P-2,1,2030-01-15,,\r\n'
+			'J-1,ACM,P-1,1,2030-01-15,,\r\n'
+			'J-2,ACM,P-2,1,2030-01-15,,\r\n'
+		)).encode()), 'csv')
+		with mock.patch.object(Job.objects, 'bulk_create', side_effect=fail_first):
+			result = importers.JobImporter(batch_size=1).run(rows).result()
+		self.assertEqual(result['jobs_created'], 2)
+		self.assertEqual([error['row'] for error in result['errors']], [2, 5])
+		self.assertEqual(sorted(Job.objects.values_list('job_number', flat=True)), ['J-1', 'J-2'])
+
+	def test_windows_1252_csv_is_decoded(self):
+		response = self.upload((self.header + 'J-1,ACM,P-1,1,2030-01-15,Bore \u00d8 12,1\r\n').encode('cp1252'))
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(Operation.objects.get().name, 'Bore \u00d8 12')
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CELERY_TASK_ALWAYS_EAGER=True)
+class QuotePdfTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.quote = Quote.objects.create(customer=customer, valid_until=date.today())
+		QuoteLineItem.objects.create(quote=self.quote, part_number="P-1", description="Bracket", quantity=2, unit_price=10)
+		self.url = f'/api/production/quotes/{self.quote.pk}/pdf/'
+
+	def test_pdf_is_rendered_once_per_content(self):
+		with mock.patch.object(QuoteDocument, 'render', autospec=True, side_effect=lambda document, file: file.write(b'%PDF')) as render:
+			first = self.client.get(self.url)
+			second = self.client.get(self.url)
+			self.assertEqual(render.call_count, 1)
+			self.assertEqual(first['ETag'], second['ETag'])
+
+			self.quote.notes = "Price includes anodize"
+			self.quote.save()
+			third = self.client.get(self.url)
+			self.assertEqual(render.call_count, 2)
+			self.assertNotEqual(third['ETag'], first['ETag'])
+		self.assertEqual(first['Content-Type'], 'application/pdf')
+
+	def test_old_artifacts_are_swept(self):
+		with mock.patch.object(QuoteDocument, 'render', autospec=True, side_effect=lambda document, file: file.write(b'%PDF')) as render:
+			self.client.get(self.url)
+			stored = list(artifacts.stored_artifacts())
+			call_command('sweep_artifacts', stdout=io.StringIO())
+			self.assertEqual(list(artifacts.stored_artifacts()), stored)
+
+			old = time.time() - 31 * 24 * 3600
+			for path in stored:
+				os.utime(default_storage.path(path), (old, old))
+			call_command('sweep_artifacts', stdout=io.StringIO())
+			self.assertEqual(list(artifacts.stored_artifacts()), [])
+			self.assertEqual(self.client.get(self.url).status_code, 200)
+			self.assertEqual(render.call_count, 2)
+
+	def test_task_status_requires_a_login(self):
+		url = '/api/tasks/0f8e6a9c/'
+		self.assertEqual(self.client.get(url).status_code, 403)
+		self.client.force_login(User.objects.create_user('estimator', password='x'))
+		with mock.patch('core.views.AsyncResult') as result:
+			result.return_value.status = 'SUCCESS'
+			result.return_value.result = {'quote_id': self.quote.pk}
+			response = self.client.get(url)
+		self.assertEqual(response.data, {'task_id': '0f8e6a9c', 'status': 'SUCCESS', 'result': {'quote_id': self.quote.pk}})
+
+class MetricsTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		cache.clear()
+		registry.clear()
+
+	def test_requests_are_recorded_per_view(self):
+		self.client.get('/api/production/jobs/')
+		self.client.force_login(User.objects.create_user('ops', password='x', is_staff=True))
+		body = self.client.get('/metrics').content.decode()
+		self.assertIn('http_request_duration_seconds_count{view="job-list",method="GET",status="200"} 1', body)
+		self.assertIn('http_request_db_queries_count{view="job-list",method="GET"} 1', body)
+		self.assertIn('http_request_serializer_seconds_count{view="job-list",method="GET"} 1', body)
+
+	def test_staff_only_without_a_token(self):
+		self.assertEqual(self.client.get('/metrics').status_code, 403)
+		self.client.force_login(User.objects.create_user('clerk', password='x'))
+		self.assertEqual(self.client.get('/metrics').status_code, 403)
+		self.client.force_login(User.objects.create_user('ops', password='x', is_staff=True))
+		self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+	@override_settings(METRICS={'TOKEN': 'secret'})
+	def test_token_is_required_when_configured(self):
+		self.assertEqual(self.client.get('/metrics').status_code, 403)
+		response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+		self.assertEqual(response.status_code, 200)
+
+@override_settings(PROFILING={'DIRECTORY': tempfile.mkdtemp()})
+class ProfilingTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.quote = Quote.objects.create(customer=customer, valid_until=date.today())
+		QuoteLineItem.objects.create(quote=self.quote, part_number="P-1", description="Bracket", quantity=2, unit_price=10)
+		self.url = f'/api/production/quotes/{self.quote.pk}/'
+
+	def test_superuser_can_profile_a_request(self):
+		self.client.force_login(User.objects.create_superuser('admin', password='x'))
+		response = self.client.get(self.url, {'profile': '1'})
+		self.assertEqual(response.status_code, 200)
+		profile_id = response['X-Profile-Id']
+
+		detail = self.client.get(f'/admin/profiles/{profile_id}/')
+		self.assertEqual(detail.status_code, 200)
+		self.assertContains(detail, 'production_quotelineitem')
+		self.assertEqual(detail.context['profile']['view'], 'quote-detail')
+		self.assertTrue(detail.context['functions'])
+		flame = self.client.get(f'/admin/profiles/{profile_id}/flame.svg')
+		self.assertEqual(flame['Content-Type'], 'image/svg+xml')
+		self.assertContains(self.client.get('/admin/profiles/'), profile_id)
+
+	def test_flag_is_ignored_for_other_users(self):
+		self.client.force_login(User.objects.create_user('clerk', password='x', is_staff=True))
+		self.assertNotIn('X-Profile-Id', self.client.get(self.url, {'profile': '1'}))
+		self.assertEqual(self.client.get('/admin/profiles/').status_code, 403)
+
+class DocumentNumberTests(TestCase):
+	def setUp(self):
+		self.customer = Customer.objects.create(name="Handwritten", identification_prefix="HND")
+
+	def test_numbers_typed_in_by_hand_are_skipped(self):
+		year, quarter = sequences.current_period()
+		typed = [f"HND-{year}-{quarter}-{n:03d}" for n in (1, 2)]
+		for number in typed:
+			Job.objects.create(customer=self.customer, job_number=number, part_number="P-1", quantity=1, due_date=date(2030, 1, 1))
+		job = Job.objects.create(customer=self.customer, part_number="P-2", quantity=1, due_date=date(2030, 1, 1))
+		self.assertNotIn(job.job_number, typed)
+
+		InspectionReport.objects.create(job=job, part_number="P-2", fai_report_number="FAI-HND-001")
+		report = InspectionReport.objects.create(job=job, part_number="P-2")
+		self.assertNotEqual(report.fai_report_number, "FAI-HND-001")
+		self.assertEqual(str(report), f"{report.fai_report_number} (P-2)")
+
+class DemoDataTests(TestCase):
+	def load(self, seed):
+		call_command('load_demo_data', scale=0.2, seed=seed, stdout=io.StringIO())
+		return list(InspectionCharacteristic.objects.order_by('id').values_list('report__part_number', 'char_number', 'actual_value'))
+
+	def test_generated_data_is_consistent_and_repeatable(self):
+		first = self.load(seed=3)
+		self.assertGreater(len(first), 500)
+		self.assertGreater(Job.objects.count(), 10)
+
+		counters = lambda: list(InspectionReport.objects.order_by('id').values_list(*COUNTER_FIELDS, 'status'))
+		generated = counters()
+		InspectionReport.recount()
+		self.assertEqual(counters(), generated)
+		for quote in Quote.objects.annotate(lines=Sum('line_items__total_price')):
+			self.assertEqual(quote.subtotal, quote.lines or 0)
+			self.assertEqual(quote.total, quote.subtotal + quote.overhead_amount + quote.profit_amount)
+		self.assertTrue(CharacteristicStatistics.objects.exists())
+
+		self.assertEqual(self.load(seed=3), first)
+		self.assertNotEqual(self.load(seed=4), first)
+
+class LoadTestCommandTests(LiveServerTestCase):
+	def test_replays_scenario_and_reports_each_task(self):
+		customer = Customer.objects.create(name='Load Co')
+		Job.objects.create(customer=customer, part_number="P-1", quantity=1, due_date=date.today())
+		scenario = {'think_time': [0, 0.05], 'tasks': [
+			{'name': 'job list', 'weight': 1, 'path': '/api/production/jobs/'},
+			{'name': 'job detail', 'weight': 1, 'path': '/api/production/jobs/{job}/'},
+			{'name': 'create quote', 'weight': 1, 'flow': 'create_quote', 'line_items': [1, 2]},
+		]}
+		with tempfile.TemporaryDirectory() as directory:
+			with open(f"{directory}/scenario.json", 'w') as scenario_file:
+				json.dump(scenario, scenario_file)
+			# One user: concurrent writers make SQLite's live server fail transactions at random
+			call_command(
+				'run_load_test', f"{directory}/scenario.json", base_url=self.live_server_url, duration=1, ramp_up=0,
+				concurrency=1, output=f"{directory}/results.json", stdout=io.StringIO(), stderr=io.StringIO(),
+			)
+			with open(f"{directory}/results.json") as results_file:
+				results = json.load(results_file)
+
+		self.assertEqual(set(results['endpoints']), {'job list', 'job detail', 'create quote: create', 'create quote: line items'})
+		for name, endpoint in results['endpoints'].items():
+			self.assertEqual(endpoint['errors'], 0, f"{name}: {endpoint['statuses']}")
+		self.assertTrue(QuoteLineItem.objects.filter(quote__customer=customer).exists())
@@ -8,7 +8,11 @@ router.register(r'contacts', views.ContactViewSet, basename='contact')
 router.register(r'jobs', views.JobViewSet, basename='job')
 router.register(r'quotes', views.QuoteViewSet, basename='quote')
 router.register(r'operations', views.OperationViewSet, basename='operation')
+router.register(r'work-centers', views.WorkCenterViewSet, basename='work-center')
 
 urlpatterns = [
+	# Async variants of dashboard lists, with ?wait= long polling under ASGI (core/asyncviews.py)
+	path('async/jobs/', views.JobListAsyncView.as_view(), name='job-list-async'),
+	path('async/jobs/overdue/', views.OverdueJobsAsyncView.as_view(), name='job-overdue-async'),
 	path('', include(router.urls)),
 ]
\ No newline at end of file
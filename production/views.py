@@ -1,78 +1,219 @@
 # production/views.py
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Customer, Contact, Quote, Job, Operation
+from core.artifacts import artifact_response, enqueue_render, pending_response
+from core.asyncviews import AsyncListView
+from core.caching import CachedResponseMixin
+from core.exports import ExportMixin
+from core.mixins import OptimizedQuerysetMixin
+from core.pagination import StableOrderingFilter
+
+from .importers import import_jobs, ImportFileError
+from .models import Customer, Contact, Quote, QuoteLineItem, Job, Operation, WorkCenter
+from . import scheduling, tasks
+from .documents import QuoteDocument
 from .serializers import (
 	CustomerSerializer,
 	ContactSerializer,
 	QuoteListSerializer,
 	QuoteDetailSerializer,
+	QuoteLineItemBulkSerializer,
 	JobListSerializer,
 	JobDetailSerializer,
-	OperationSerializer
+	OperationSerializer,
+	WorkCenterSerializer
 )
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
 	queryset = Customer.objects.all()
+	cache_models = ['production.Customer']
 	serializer_class = CustomerSerializer
 
-	filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+	filter_backends = [filters.SearchFilter, StableOrderingFilter]
 	search_fields = ['name', 'email', 'identification_prefix']
 	ordering_fields = ['name', 'created_at']
 	ordering = ['name']
 
-class ContactViewSet(viewsets.ModelViewSet):
+	@action(detail=True, methods=['post'], url_path='quote-pdfs')
+	def quote_pdfs(self, request, pk=None):
+		"""Render PDFs for all of this customer's quotes in the background"""
+		customer = self.get_object()
+		result = enqueue_render(
+			tasks.render_customer_quote_pdfs, tasks.customer_quotes_key(customer.pk), customer.pk
+		)
+		if settings.CELERY_TASK_ALWAYS_EAGER:
+			return Response(result.get())
+		return pending_response(request, result)
+
+class ContactViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
 	queryset = Contact.objects.all()
+	cache_models = ['production.Contact', 'production.Customer']
 	serializer_class = ContactSerializer
 
 	filter_backends = [filters.SearchFilter, DjangoFilterBackend]
 	search_fields = ['first_name', 'last_name', 'email']
 	filterset_fields = ['customer', 'is_key_contact']
 
-class JobViewSet(viewsets.ModelViewSet):
-	queryset = Job.objects.select_related('customer').prefetch_related('operations')
-	filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+class JobViewSet(CachedResponseMixin, ExportMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
+	queryset = Job.objects.all()
+	cache_models = ['production.Job', 'production.Customer', 'production.Operation', 'quality.InspectionReport']
+	filter_backends = [filters.SearchFilter, StableOrderingFilter, DjangoFilterBackend]
 	search_fields = ['job_number', 'part_number']
 	filterset_fields = ['status', 'priority', 'customer']
 	ordering_fields = ['due_date', 'created_at', 'priority']
 	ordering = ['due_date']
 
+	export_filename = 'jobs'
+	export_columns = [
+		('Job Number', 'job_number'),
+		('Customer', 'customer__name'),
+		('Part Number', 'part_number'),
+		('Quantity', 'quantity'),
+		('Due Date', 'due_date'),
+		('Status', 'status'),
+		('Priority', 'priority'),
+		('Source Quote', 'source_quote__quote_number'),
+		('Created', 'created_at'),
+		('Started', 'started_at'),
+		('Completed', 'completed_at'),
+		('Notes', 'notes'),
+	]
+
 	def get_serializer_class(self):
-		if self.action == 'list':
+		if self.action in ('list', 'overdue', 'by_status'):
 			return JobListSerializer
 		return JobDetailSerializer
 	
 	@action(detail=False, methods=['get'])
 	def overdue(self, request):
-		overdue_jobs = [job for job in self.get_queryset() if job.is_overdue]
-		serializer = JobListSerializer(overdue_jobs, many=True)
+		overdue_jobs = self.filter_queryset(self.get_queryset().overdue())
+		page = self.paginate_queryset(overdue_jobs)
+		if page is not None:
+			serializer = self.get_serializer(page, many=True)
+			return self.get_paginated_response(serializer.data)
+		serializer = self.get_serializer(overdue_jobs, many=True)
 		return Response(serializer.data)
 	
+	@action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+	def import_file(self, request):
+		"""Bulk-create jobs and operations from an uploaded CSV/XLSX (see production/importers.py)"""
+		upload = request.FILES.get('file')
+		if upload is None:
+			return Response({"error": "Upload the spreadsheet as 'file'"}, status=400)
+		file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+		try:
+			result = import_jobs(upload, file_format)
+		except ImportFileError as exc:
+			return Response({"error": str(exc)}, status=400)
+		return Response(result, status=201 if result['jobs_created'] else 200)
+
+	@action(detail=False, methods=['post'])
+	def schedule(self, request):
+		"""Reschedule operations of all open jobs against work center capacity"""
+		result = scheduling.schedule()
+		return Response(result)
+
 	@action(detail=False, methods=['get'])
 	def by_status(self, request):
 		status = request.query_params.get('status', None)
 		if status:
 			jobs = self.get_queryset().filter(status=status)
-			serializer = JobListSerializer(jobs, many=True)
+			serializer = self.get_serializer(jobs, many=True)
 			return Response(serializer.data)
 		return Response({"error": "Status parameter required"}, status=400)
 	
-class QuoteViewSet(viewsets.ModelViewSet):
-	queryset = Quote.objects.select_related('customer').prefetch_related('line_items')
-	filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+class JobListAsyncView(AsyncListView):
+	viewset = JobViewSet
+
+class OverdueJobsAsyncView(AsyncListView):
+	viewset = JobViewSet
+	action = 'overdue'
+
+	def get_queryset(self, viewset):
+		return viewset.get_queryset().overdue()
+
+class QuoteViewSet(CachedResponseMixin, ExportMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
+	queryset = Quote.objects.all()
+	cache_models = ['production.Quote', 'production.Customer', 'production.QuoteLineItem']
+	filter_backends = [filters.SearchFilter, StableOrderingFilter, DjangoFilterBackend]
 	search_fields = ['quote_number']
 	filterset_fields = ['status', 'customer']
 	ordering = ['-created_at']
 
+	# One row per line item, quote columns repeated (quotes without lines get one row)
+	export_filename = 'quotes'
+	export_columns = [
+		('Quote Number', 'quote_number'),
+		('Customer', 'customer__name'),
+		('Status', 'status'),
+		('Created', 'created_at'),
+		('Sent', 'sent_at'),
+		('Valid Until', 'valid_until'),
+		('Subtotal', 'subtotal'),
+		('Overhead', 'overhead_amount'),
+		('Profit', 'profit_amount'),
+		('Total', 'total'),
+		('Line Part Number', 'line_items__part_number'),
+		('Line Description', 'line_items__description'),
+		('Line Quantity', 'line_items__quantity'),
+		('Unit Price', 'line_items__unit_price'),
+		('Line Total', 'line_items__total_price'),
+		('Setup Hours', 'line_items__setup_hours'),
+		('Machining Hours', 'line_items__machining_hours'),
+		('Programming Hours', 'line_items__programming_hours'),
+	]
+
+	def get_export_queryset(self, queryset):
+		# Keep each quote's lines together even when created_at ties
+		return queryset.order_by(*queryset.query.order_by, 'pk', 'line_items__id')
+
 	def get_serializer_class(self):
 		if self.action == 'list':
 			return QuoteListSerializer
+		if self.action == 'bulk_line_items':
+			return QuoteLineItemBulkSerializer
 		return QuoteDetailSerializer
+
+	@action(detail=True, methods=['get'])
+	def pdf(self, request, pk=None):
+		"""The quote as a PDF; 202 with a task status URL while it is being rendered"""
+		quote = get_object_or_404(QuoteDocument.queryset(), pk=pk)
+		self.check_object_permissions(request, quote)
+		document = QuoteDocument(quote)
+
+		if not document.exists():
+			result = enqueue_render(tasks.render_quote_pdf, document.path, quote.pk)
+			if not document.exists():
+				return pending_response(request, result, download_url=request.build_absolute_uri())
+		return artifact_response(request, document.path, document.filename, document.content_type)
+
+	@action(detail=True, methods=['post'], url_path='line-items/bulk')
+	def bulk_line_items(self, request, pk=None):
+		"""Create, update and delete many line items with a single totals recalculation"""
+		quote = self.get_object()
+		serializer = self.get_serializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		try:
+			quote.apply_line_item_changes(**serializer.validated_data)
+		except QuoteLineItem.DoesNotExist as exc:
+			return Response({"error": str(exc)}, status=400)
+
+		quote = self.get_queryset().get(pk=quote.pk)
+		return Response(QuoteDetailSerializer(quote).data)
 	
-class OperationViewSet(viewsets.ReadOnlyModelViewSet):
+class OperationViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
 	queryset = Operation.objects.all()
+	cache_models = ['production.Operation']
 	serializer_class = OperationSerializer
 	filterset_fields =  ['job']
+
+class WorkCenterViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
+	queryset = WorkCenter.objects.all()
+	cache_models = ['production.WorkCenter']
+	serializer_class = WorkCenterSerializer
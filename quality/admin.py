@@ -1,7 +1,9 @@
 #quality/admin.py
 from django.contrib import admin
 
-from .models import Equipment, InspectionReport, InspectionCharacteristic
+from .models import (
+    Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics, DrawingRevision,
+)
 
 admin.site.register(Equipment)
 
@@ -13,4 +15,19 @@ class CharacteristicInline(admin.TabularInline):
 @admin.register(InspectionReport)
 class ReportAdmin(admin.ModelAdmin):
     inlines = [CharacteristicInline]
-    list_display = ('fai_report_number', 'part_number', 'status', 'created_at')
\ No newline at end of file
+    list_display = ('fai_report_number', 'part_number', 'status', 'created_at')
+
+@admin.register(CharacteristicStatistics)
+class CharacteristicStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('part_number', 'char_number', 'description', 'count', 'mean', 'updated_at')
+    search_fields = ('part_number',)
+
+@admin.register(DrawingRevision)
+class DrawingRevisionAdmin(admin.ModelAdmin):
+    list_display = ('part_number', 'revision', 'updated_count', 'entered_by', 'created_at')
+    search_fields = ('part_number',)
+    readonly_fields = ('updated_count', 'created_at')
+
+    def has_add_permission(self, request):
+        # Revisions are applied through the API, which updates the characteristics
+        return False
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class QualityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quality'
+
+    def ready(self):
+        from django.db.models.signals import pre_delete
+        from core.caching import track_versions
+        from . import spc
+        from .models import Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics, DrawingRevision
+
+        track_versions(Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics, DrawingRevision)
+        # Deleting a report (or its job) cascades past InspectionCharacteristic.delete()
+        pre_delete.connect(spc.report_deleted, sender=InspectionReport, dispatch_uid='spc-report-deleted')
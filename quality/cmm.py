@@ -0,0 +1,221 @@
+# quality/cmm.py
+"""
+Import of CMM measurement results into an inspection report.
+
+Two formats are read, both matched to characteristics by balloon number:
+
+csv     A header row with a balloon column (char_number, char, balloon or
+        feature) and a measured value column (actual, actual_value, measured
+        or meas). Other columns are ignored.
+
+pcdmis  PC-DMIS style text output. Each dimension starts with a line like
+        "DIM 12= LOCATION OF CIRCLE CIR1" where 12 is the balloon number,
+        followed by an "AX NOMINAL +TOL -TOL MEAS ..." header and one line
+        per axis. The MEAS value of the dimension's first axis is used.
+
+The whole file is evaluated at once: the report's tolerances are loaded in
+one query into numpy arrays of integer ten-thousandths (the fields' scale,
+so limits compare exactly), measurements are matched with searchsorted,
+and actual_value/pass_fail/measured_at are written with a single
+bulk_update (the SPC statistics are updated for the batch too, see
+quality/spc.py). The report counters and status are then recounted in SQL
+(InspectionReport.recount).
+"""
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from core.caching import bump_versions
+
+from . import spc
+from .models import COUNTER_FIELDS, InspectionReport, InspectionCharacteristic
+
+FORMATS = ['csv', 'pcdmis']
+EXTENSIONS = {'csv': 'csv', 'txt': 'pcdmis', 'pcdmis': 'pcdmis'}
+MAX_REPORTED_ERRORS = 1000
+
+# DecimalField(max_digits=10, decimal_places=4) on every value column
+SCALE = Decimal('0.0001')
+MAX_VALUE = Decimal('999999.9999')
+
+NUMBER_COLUMNS = ['char_number', 'char', 'char_no', 'balloon', 'feature']
+VALUE_COLUMNS = ['actual', 'actual_value', 'measured', 'meas']
+
+DIM_LINE = re.compile(r'^\s*DIM\s+(\S+?)\s*=', re.IGNORECASE)
+
+class CMMFileError(Exception):
+	"""The file as a whole cannot be read (bad format or missing columns)"""
+
+def format_for(filename):
+	return EXTENSIONS.get(filename.rsplit('.', 1)[-1].lower(), '')
+
+def read_csv(file):
+	"""Yield (line number, balloon, value) from a CSV with a header row"""
+	# Comments and feature names from CMM software are often Latin-1 (e.g. "Ø"); only the numbers matter
+	rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace', newline=''))
+	try:
+		header = [str(name).strip().lower().replace(' ', '_') for name in next(rows)]
+	except StopIteration:
+		raise CMMFileError("The file is empty")
+	number_column = next((header.index(name) for name in NUMBER_COLUMNS if name in header), None)
+	value_column = next((header.index(name) for name in VALUE_COLUMNS if name in header), None)
+	if number_column is None or value_column is None:
+		raise CMMFileError(
+			f"Need a balloon column ({', '.join(NUMBER_COLUMNS)}) and a value column ({', '.join(VALUE_COLUMNS)})"
+		)
+	for number, values in enumerate(rows, start=2):
+		if not any(value.strip() for value in values):
+			continue
+		get = lambda index: values[index] if index < len(values) else ''
+		yield number, get(number_column), get(value_column)
+
+def read_pcdmis(file):
+	"""Yield (line number, balloon, value) for the first axis of each DIM block"""
+	balloon, dim_line, meas_column = None, None, None
+	for number, line in enumerate(io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace'), start=1):
+		match = DIM_LINE.match(line)
+		if match:
+			if balloon is not None:
+				yield dim_line, balloon, ''
+			balloon, dim_line, meas_column = match.group(1), number, None
+			continue
+		if balloon is None:
+			continue
+		fields = line.split()
+		if not fields:
+			continue
+		if fields[0].upper() == 'AX':
+			headers = [field.upper() for field in fields]
+			meas_column = headers.index('MEAS') if 'MEAS' in headers else None
+		elif meas_column is not None:
+			yield number, balloon, fields[meas_column] if meas_column < len(fields) else ''
+			balloon = None
+	if balloon is not None:
+		yield dim_line, balloon, ''
+
+READERS = {'csv': read_csv, 'pcdmis': read_pcdmis}
+
+def read_measurements(file, file_format):
+	if file_format not in READERS:
+		raise CMMFileError(f"Unsupported file format '{file_format}' (expected {' or '.join(FORMATS)})")
+	return READERS[file_format](file)
+
+def scaled(value):
+	"""Decimal in ten-thousandths as an int, as the database would store it"""
+	return int(value.quantize(SCALE) / SCALE)
+
+class CMMImporter:
+	def __init__(self, report, equipment=None):
+		self.report = report
+		self.equipment = equipment
+		self.error_count = 0
+		self.errors = []
+
+	def add_error(self, line, errors):
+		self.error_count += 1
+		if len(self.errors) < MAX_REPORTED_ERRORS:
+			self.errors.append({'line': line, 'errors': errors})
+
+	def parse(self, rows):
+		"""Validate rows into parallel arrays of balloon numbers and scaled values"""
+		numbers, values, seen = [], [], set()
+		for line, balloon, value in rows:
+			try:
+				number = int(str(balloon).strip())
+			except ValueError:
+				self.add_error(line, {'char_number': f"'{balloon}' is not a balloon number"})
+				continue
+			try:
+				measured = Decimal(str(value).strip())
+			except InvalidOperation:
+				measured = None
+			if measured is None or not measured.is_finite():
+				self.add_error(line, {'actual_value': f"'{value}' is not a number"})
+				continue
+			if abs(measured) > MAX_VALUE:
+				self.add_error(line, {'actual_value': f"'{value}' is outside +/-{MAX_VALUE}"})
+				continue
+			if number in seen:
+				self.add_error(line, {'char_number': f"Balloon {number} appears more than once in the file"})
+				continue
+			seen.add(number)
+			numbers.append(number)
+			values.append(scaled(measured))
+		return np.array(numbers, dtype=np.int64), np.array(values, dtype=np.int64)
+
+	def run(self, rows):
+		numbers, measured = self.parse(rows)
+
+		characteristics = list(
+			InspectionCharacteristic.objects.filter(report=self.report)
+			.order_by('char_number', 'id')
+			.values_list('id', 'char_number', 'nominal_value', 'upper_tolerance', 'lower_tolerance', 'actual_value', 'description')
+		)
+		ids = np.array([row[0] for row in characteristics], dtype=np.int64)
+		balloons = np.array([row[1] for row in characteristics], dtype=np.int64)
+		nominal = np.array([scaled(row[2]) for row in characteristics], dtype=np.int64)
+		lower = nominal - np.array([scaled(row[4]) for row in characteristics], dtype=np.int64)
+		upper = nominal + np.array([scaled(row[3]) for row in characteristics], dtype=np.int64)
+
+		# Balloons that appear once on the report; duplicates cannot be matched by number
+		unique, counts = np.unique(balloons, return_counts=True)
+		ambiguous = set(unique[counts > 1].tolist())
+		if len(balloons):
+			position = np.minimum(np.searchsorted(balloons, numbers), len(balloons) - 1)
+			found = balloons[position] == numbers
+		else:
+			position, found = np.zeros(len(numbers), dtype=np.int64), np.zeros(len(numbers), dtype=bool)
+		if ambiguous:
+			found &= ~np.isin(numbers, list(ambiguous))
+		index = position[found]
+		values = measured[found]
+		passed = (lower[index] <= values) & (values <= upper[index])
+
+		now = timezone.now()
+		updates = [
+			InspectionCharacteristic(
+				id=int(pk), actual_value=Decimal(int(value)) * SCALE, pass_fail=bool(ok),
+				equipment_used=self.equipment, measured_at=now,
+			)
+			for pk, value, ok in zip(ids[index], values, passed)
+		]
+		fields = ['actual_value', 'pass_fail', 'measured_at'] + (['equipment_used'] if self.equipment else [])
+		changes = []
+		for row, update in zip(index, updates):
+			_, balloon, _, _, _, previous, description = characteristics[row]
+			changes.append(spc.Change(
+				self.report.part_number, balloon, previous, update.actual_value,
+				Decimal(int(upper[row])) * SCALE, Decimal(int(lower[row])) * SCALE, description,
+			))
+		with transaction.atomic():
+			InspectionCharacteristic.objects.bulk_update(updates, fields)
+			spc.record(changes)
+			status = self.roll_up()
+
+		unmatched = numbers[~found]
+		return {
+			'matched': len(updates),
+			'passed': int(passed.sum()),
+			'failed': int(len(passed) - passed.sum()),
+			'unmatched': sorted(int(number) for number in unmatched if number not in ambiguous),
+			'ambiguous': sorted(int(number) for number in unmatched if number in ambiguous),
+			'status': status,
+			'error_count': self.error_count,
+			'errors': self.errors,
+		}
+
+	def roll_up(self):
+		"""Recount the report's characteristics (which rolls up its status) and return the status"""
+		InspectionReport.recount(pk=self.report.pk)
+		bump_versions(InspectionCharacteristic)
+		self.report.refresh_from_db(fields=['status', 'updated_at', *COUNTER_FIELDS])
+		return self.report.status
+
+def import_measurements(report, file, file_format, equipment=None):
+	"""Import a CMM results file object into report; returns the summary dict"""
+	return CMMImporter(report, equipment).run(read_measurements(file, file_format))
@@ -0,0 +1,239 @@
+# quality/documents.py
+"""
+AS9102 First Article Inspection forms (1: part number accountability,
+2: product accountability, 3: characteristic accountability) as PDF or XLSX.
+
+Form 3 can run to thousands of balloons, so characteristics are read with a
+chunked iterator (values_list with equipment_used joined, no model instances)
+and written out as they arrive: each PDF page is flushed to the file as soon
+as it fills (core/pdf.py) and the XLSX goes through a write-only workbook.
+Neither holds the full characteristic list in memory.
+
+Documents are stored through core/artifacts.py under a hash of the report's
+header, updated_at and characteristic count. Saving or deleting a
+characteristic (or renaming equipment it used) moves the report's
+updated_at, so the next request renders a fresh document.
+"""
+from django.conf import settings
+from openpyxl import Workbook
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from core.artifacts import artifact_exists, artifact_path, content_hash, save_artifact
+from core.pdf import StreamingPDF
+
+from .models import InspectionReport, InspectionCharacteristic
+
+TEMPLATE_VERSION = 1
+CHUNK_SIZE = 500
+
+FORMATS = {
+	'pdf': 'application/pdf',
+	'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (header, width in inches) for Form 3; values come from characteristic_rows()
+FORM3_COLUMNS = [
+	('Char No.', 0.6),
+	('Characteristic', 2.2),
+	('Requirement', 1.6),
+	('Nominal', 0.8),
+	('Tol +', 0.6),
+	('Tol -', 0.6),
+	('Result', 0.8),
+	('Pass', 0.5),
+	('Designed / Qualified Tooling', 2.3),
+]
+
+FORM2_HEADERS = [
+	'Material or Process Name', 'Specification Number', 'Code',
+	'Special Process Supplier Code', 'Customer Approval Verification', 'Certificate of Conformance Number',
+]
+
+def characteristic_rows(report, chunk_size=CHUNK_SIZE):
+	"""Form 3 rows in balloon order, fetched chunk_size at a time"""
+	rows = (
+		InspectionCharacteristic.objects.filter(report=report)
+		.order_by('char_number', 'id')
+		.values_list(
+			'char_number', 'description', 'requirement', 'nominal_value', 'upper_tolerance',
+			'lower_tolerance', 'actual_value', 'pass_fail', 'equipment_used__name', 'equipment_used__serial_number',
+		)
+		.iterator(chunk_size=chunk_size)
+	)
+	for number, description, requirement, nominal, upper, lower, actual, passed, equipment, serial in rows:
+		tooling = f"{equipment} ({serial})" if equipment else ''
+		result = '' if actual is None else actual
+		yield [number, description, requirement, nominal, upper, lower, result, 'Yes' if passed else 'No', tooling]
+
+class AS9102Document:
+	kind = 'as9102'
+
+	def __init__(self, report, file_format):
+		if file_format not in FORMATS:
+			raise ValueError(f"file_format must be one of {', '.join(FORMATS)}")
+		self.report = report
+		self.file_format = file_format
+		self.content_type = FORMATS[file_format]
+		self.characteristic_count = report.characteristics.count()
+		self.digest = content_hash(self.payload())
+		self.path = artifact_path(self.kind, self.digest, file_format)
+
+	@staticmethod
+	def queryset():
+		return InspectionReport.objects.select_related('job__customer')
+
+	@classmethod
+	def load(cls, report_id, file_format):
+		return cls(cls.queryset().get(pk=report_id), file_format)
+
+	@property
+	def filename(self):
+		return f"{self.report.fai_report_number}-AS9102.{self.file_format}"
+
+	def payload(self):
+		return {
+			'template': TEMPLATE_VERSION,
+			'format': self.file_format,
+			'report': self.report.pk,
+			'updated_at': self.report.updated_at,
+			'header': self.form1_fields(),
+			'characteristics': self.characteristic_count,
+		}
+
+	def form1_fields(self):
+		report, job = self.report, self.report.job
+		return [
+			('Part Number', report.part_number),
+			('Part Name', report.part_name),
+			('Serial Number', report.serial_number),
+			('FAI Report Number', report.fai_report_number),
+			('Organization Name', getattr(settings, 'SHOP_NAME', '')),
+			('Customer', job.customer.name if job else ''),
+			('Job Number', job.job_number if job else ''),
+			('Inspection Type', report.get_inspection_type_display()),
+			('Inspector', report.inspector_name),
+			('Inspection Date', report.inspection_date.isoformat() if report.inspection_date else ''),
+			('Status', report.get_status_display()),
+			('Characteristics', str(self.characteristic_count)),
+		]
+
+	def exists(self):
+		return artifact_exists(self.path)
+
+	def save(self):
+		return save_artifact(self.path, self.render)
+
+	def render(self, file):
+		if self.file_format == 'xlsx':
+			self.render_xlsx(file)
+		else:
+			self.render_pdf(file)
+
+	# -- XLSX --------------------------------------------------------------
+
+	def render_xlsx(self, file):
+		workbook = Workbook(write_only=True)
+
+		form1 = workbook.create_sheet('Form 1')
+		form1.append(['AS9102 Form 1 - Part Number Accountability'])
+		for label, value in self.form1_fields():
+			form1.append([label, value])
+
+		form2 = workbook.create_sheet('Form 2')
+		form2.append(['AS9102 Form 2 - Product Accountability'])
+		form2.append(FORM2_HEADERS)
+
+		form3 = workbook.create_sheet('Form 3')
+		form3.append(['AS9102 Form 3 - Characteristic Accountability', self.report.fai_report_number])
+		form3.append([header for header, _ in FORM3_COLUMNS])
+		for row in characteristic_rows(self.report):
+			form3.append(row)
+
+		workbook.save(file)
+
+	# -- PDF ---------------------------------------------------------------
+
+	def render_pdf(self, file):
+		pdf = FormCanvas(file, self)
+		pdf.form1()
+		pdf.form2()
+		pdf.form3(characteristic_rows(self.report))
+		pdf.save()
+
+class FormCanvas:
+	"""Lays the forms out on a StreamingPDF, writing each page as it fills"""
+	pagesize = landscape(letter)
+	margin = 0.5 * inch
+	row_height = 0.22 * inch
+	font = 'Helvetica'
+	font_size = 8
+
+	def __init__(self, file, document):
+		self.document = document
+		self.report = document.report
+		self.pdf = StreamingPDF(file, self.pagesize, title=document.filename)
+		self.width, self.height = self.pagesize
+		self.page = 0
+
+	def start_page(self, title):
+		self.pdf.begin_page()
+		self.page += 1
+		self.pdf.text(self.margin, self.height - self.margin, title, 'Helvetica-Bold', 12)
+		footer = f"{self.report.fai_report_number}   Part {self.report.part_number}   Page {self.page}"
+		self.pdf.text(
+			self.width - self.margin - stringWidth(footer, self.font, self.font_size),
+			self.height - self.margin, footer, self.font, self.font_size,
+		)
+		return self.height - self.margin - 0.4 * inch
+
+	def form1(self):
+		y = self.start_page('AS9102 Form 1 - Part Number Accountability')
+		for label, value in self.document.form1_fields():
+			self.pdf.text(self.margin, y, label, 'Helvetica-Bold', 9)
+			self.pdf.text(self.margin + 2 * inch, y, str(value), self.font, 9)
+			y -= 0.3 * inch
+
+	def form2(self):
+		y = self.start_page('AS9102 Form 2 - Product Accountability')
+		width = (self.width - 2 * self.margin) / len(FORM2_HEADERS)
+		self.draw_row(y, FORM2_HEADERS, [width / inch] * len(FORM2_HEADERS), bold=True)
+		self.pdf.text(self.margin, y - 2 * self.row_height, "No raw material or special process records.", self.font, self.font_size)
+
+	def form3(self, rows):
+		headers = [header for header, _ in FORM3_COLUMNS]
+		widths = [width for _, width in FORM3_COLUMNS]
+		bottom = self.margin + self.row_height
+
+		y = None
+		for row in rows:
+			if y is None or y < bottom:
+				y = self.start_page('AS9102 Form 3 - Characteristic Accountability')
+				self.draw_row(y, headers, widths, bold=True)
+				y -= self.row_height
+			self.draw_row(y, row, widths)
+			y -= self.row_height
+		if y is None:
+			y = self.start_page('AS9102 Form 3 - Characteristic Accountability')
+			self.draw_row(y, headers, widths, bold=True)
+
+	def draw_row(self, y, values, widths, bold=False):
+		font = 'Helvetica-Bold' if bold else self.font
+		x = self.margin
+		for value, width in zip(values, widths):
+			width *= inch
+			self.pdf.text(x + 2, y + 4, fit('' if value is None else str(value), width - 4, font, self.font_size), font, self.font_size)
+			self.pdf.rect(x, y, width, self.row_height)
+			x += width
+
+	def save(self):
+		self.pdf.close()
+
+def fit(text, width, font, size):
+	"""Truncate text to fit width points"""
+	if stringWidth(text, font, size) <= width:
+		return text
+	while text and stringWidth(text + '...', font, size) > width:
+		text = text[:-1]
+	return text + '...'
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from decimal import Decimal
+from quality.documents import AS9102Document
+from quality.models import Equipment, InspectionReport, InspectionCharacteristic
+import datetime
+import random
+import tempfile
+import time
+import tracemalloc
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmarks AS9102 PDF/XLSX generation time and peak memory against characteristic count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1500,5000,15000', help='Comma separated characteristic counts')
+        parser.add_argument('--formats', default='pdf,xlsx')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        formats = options['formats'].split(',')
+
+        self.stdout.write(f"{'characteristics':>15} {'format':>6} {'seconds':>8} {'peak MB':>8} {'file KB':>8}")
+        try:
+            with transaction.atomic():
+                equipment = [
+                    Equipment.objects.create(
+                        name=f"Bench gauge {n}", serial_number=f"BG-{n}",
+                        last_calibration_date=datetime.date.today(),
+                    )
+                    for n in range(5)
+                ]
+                for size in sizes:
+                    report = self.create_report(size, equipment)
+                    for file_format in formats:
+                        self.measure(report, size, file_format)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_report(self, size, equipment):
+        report = InspectionReport.objects.create(
+            part_number=f"BENCH-{size}", part_name='Benchmark housing', inspector_name='Bench',
+        )
+        rows = []
+        for number in range(1, size + 1):
+            nominal = Decimal(random.randint(100, 5000)) / 1000
+            rows.append(InspectionCharacteristic(
+                report=report, char_number=number,
+                description=f"Feature {number} diameter", requirement=f"{nominal} +/- 0.005",
+                nominal_value=nominal, upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+                actual_value=nominal + Decimal(random.randint(-6, 6)) / 1000,
+                pass_fail=True, equipment_used=random.choice(equipment),
+            ))
+        InspectionCharacteristic.objects.bulk_create(rows, batch_size=2000)
+        return AS9102Document.queryset().get(pk=report.pk)
+
+    def measure(self, report, size, file_format):
+        document = AS9102Document(report, file_format)
+        with tempfile.TemporaryFile() as file:
+            tracemalloc.start()
+            began = time.perf_counter()
+            document.render(file)
+            elapsed = time.perf_counter() - began
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            file_size = file.tell()
+        self.stdout.write(f"{size:>15} {file_format:>6} {elapsed:>8.2f} {peak / 2**20:>8.1f} {file_size / 1024:>8.0f}")
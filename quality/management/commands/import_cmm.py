@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from quality.cmm import import_measurements, format_for, CMMFileError, FORMATS
+from quality.models import Equipment, InspectionReport
+from pathlib import Path
+
+class Command(BaseCommand):
+    help = 'Records actual values and pass/fail for an inspection report from a CMM results file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('report', help='FAI report number')
+        parser.add_argument('path', help='CSV or PC-DMIS text results file')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--equipment', type=int, help='Equipment id to record as the gauge used')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['file_format'] or format_for(path.name)
+
+        try:
+            report = InspectionReport.objects.get(fai_report_number=options['report'])
+            equipment = Equipment.objects.get(pk=options['equipment']) if options['equipment'] else None
+        except (InspectionReport.DoesNotExist, Equipment.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        try:
+            with path.open('rb') as file:
+                result = import_measurements(report, file, file_format, equipment=equipment)
+        except (OSError, CMMFileError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        if result['unmatched']:
+            self.stderr.write(f"No characteristic for balloons {', '.join(map(str, result['unmatched']))}")
+        if result['ambiguous']:
+            self.stderr.write(f"Balloons used more than once on the report: {', '.join(map(str, result['ambiguous']))}")
+
+        summary = (
+            f"{result['matched']} characteristics measured ({result['passed']} pass, {result['failed']} fail), "
+            f"report {report.fai_report_number} is {result['status']}"
+        )
+        style = self.style.SUCCESS if result['status'] != 'FAIL' else self.style.WARNING
+        self.stdout.write(style(summary))
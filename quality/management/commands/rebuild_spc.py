@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from quality.spc import rebuild
+
+class Command(BaseCommand):
+    help = 'Recomputes the SPC statistics of every characteristic from the recorded actual values'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {count} characteristics"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:00
+
+import datetime
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('last_calibration_date'), '+', models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(models.F('calibration_interval_days'), '*', models.Value(datetime.timedelta(days=1))), output_field=models.DurationField())), models.DateField()), name='equipment_next_cal_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0002_equipment_equipment_next_cal_due_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inspectionreport',
+            name='fai_report_number',
+            field=models.CharField(blank=True, help_text="Generated from the job's customer prefix when left blank", max_length=50, unique=True),
+        ),
+    ]
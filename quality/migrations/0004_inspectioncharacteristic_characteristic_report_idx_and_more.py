@@ -0,0 +1,22 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0006_contact_contact_ordering_idx_and_more'),
+        ('quality', '0003_alter_inspectionreport_fai_report_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inspectioncharacteristic',
+            index=models.Index(fields=['report', 'id'], name='characteristic_report_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inspectionreport',
+            index=models.Index(fields=['created_at', 'id'], name='inspection_created_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# (index name, table, column): pg_trgm GIN indexes on UPPER(column::text), the
+# expression Django generates for icontains (see core/search.py)
+INDEXES = [
+    ('inspection_fai_number_trgm', 'quality_inspectionreport', 'fai_report_number'),
+    ('inspection_part_number_trgm', 'quality_inspectionreport', 'part_number'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # PostgreSQL only. Without pg_trgm search still works, unindexed; migrate
+    # back one step and forward again once the extension is available.
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError as exc:
+        logger.warning("pg_trgm is not available, search will not be indexed: %s", exc)
+        return
+    with connection.cursor() as cursor:
+        for name, table, column in INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+                f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, _, _ in INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0004_inspectioncharacteristic_characteristic_report_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes, elidable=False),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:38
+
+import itertools
+
+from django.db import migrations, models
+
+
+def backfill_statistics(apps, schema_editor):
+    # quality.spc.rebuild() against the historical models: existing measurements start out counted
+    InspectionCharacteristic = apps.get_model('quality', 'InspectionCharacteristic')
+    CharacteristicStatistics = apps.get_model('quality', 'CharacteristicStatistics')
+    values = (
+        InspectionCharacteristic.objects.filter(actual_value__isnull=False)
+        .order_by('report__part_number', 'char_number', 'report__created_at', 'report_id', 'id')
+        .values_list(
+            'report__part_number', 'char_number', 'actual_value',
+            'nominal_value', 'upper_tolerance', 'lower_tolerance', 'description',
+        )
+        .iterator(chunk_size=5000)
+    )
+    rows = []
+    for (part, number), group in itertools.groupby(values, key=lambda row: row[:2]):
+        group = list(group)
+        measured = [float(row[2]) for row in group]
+        mean = sum(measured) / len(measured)
+        *_, nominal, upper, lower, description = group[-1]
+        rows.append(CharacteristicStatistics(
+            part_number=part, char_number=number, description=description[:200],
+            count=len(measured), mean=mean, m2=sum((value - mean) ** 2 for value in measured),
+            upper_limit=nominal + upper, lower_limit=nominal - lower,
+        ))
+    CharacteristicStatistics.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0006_inspectionreport_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharacteristicStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('part_number', models.CharField(max_length=50)),
+                ('char_number', models.IntegerField()),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0, help_text='Sum of squared deviations from the mean (Welford)')),
+                ('upper_limit', models.DecimalField(blank=True, decimal_places=4, max_digits=11, null=True)),
+                ('lower_limit', models.DecimalField(blank=True, decimal_places=4, max_digits=11, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'characteristic statistics',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inspectioncharacteristic',
+            index=models.Index(fields=['char_number', 'report'], name='characteristic_number_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='characteristicstatistics',
+            constraint=models.UniqueConstraint(fields=('part_number', 'char_number'), name='characteristic_statistics_unique'),
+        ),
+        migrations.RunPython(backfill_statistics, migrations.RunPython.noop),
+    ]
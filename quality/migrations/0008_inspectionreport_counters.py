@@ -0,0 +1,56 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_characteristics(apps, schema_editor):
+    # Counters only; existing statuses are left as they were set
+    InspectionReport = apps.get_model('quality', 'InspectionReport')
+    InspectionCharacteristic = apps.get_model('quality', 'InspectionCharacteristic')
+
+    def count(**conditions):
+        rows = (
+            InspectionCharacteristic.objects.filter(report=OuterRef('pk'), **conditions)
+            .order_by().values('report').annotate(count=Count('id')).values('count')
+        )
+        return Coalesce(Subquery(rows), 0)
+
+    InspectionReport.objects.update(
+        characteristic_count=count(),
+        measured_count=count(actual_value__isnull=False),
+        passed_count=count(actual_value__isnull=False, pass_fail=True),
+        failed_count=count(actual_value__isnull=False, pass_fail=False),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0007_characteristicstatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspectionreport',
+            name='characteristic_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inspectionreport',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inspectionreport',
+            name='measured_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inspectionreport',
+            name='passed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_characteristics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_measured_at(apps, schema_editor):
+    # Values recorded before measured_at existed count from their report's inspection date
+    InspectionReport = apps.get_model('quality', 'InspectionReport')
+    InspectionCharacteristic = apps.get_model('quality', 'InspectionCharacteristic')
+    inspected = InspectionReport.objects.filter(pk=OuterRef('report_id')).values(
+        day=Coalesce('inspection_date', 'created_at')
+    )[:1]
+    InspectionCharacteristic.objects.filter(actual_value__isnull=False, measured_at__isnull=True).update(
+        measured_at=Cast(Subquery(inspected), models.DateTimeField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0008_inspectionreport_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspectioncharacteristic',
+            name='measured_at',
+            field=models.DateTimeField(blank=True, help_text='Set when actual_value is recorded', null=True),
+        ),
+        migrations.RunPython(backfill_measured_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='inspectioncharacteristic',
+            name='equipment_used',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='quality.equipment'),
+        ),
+        migrations.AddIndex(
+            model_name='inspectioncharacteristic',
+            index=models.Index(fields=['equipment_used', 'measured_at'], name='characteristic_equipment_idx'),
+        ),
+    ]
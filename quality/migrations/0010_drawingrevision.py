@@ -0,0 +1,46 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quality', '0009_inspectioncharacteristic_measured_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrawingRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('part_number', models.CharField(max_length=50)),
+                ('revision', models.CharField(help_text='e.g., C', max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('entered_by', models.CharField(blank=True, max_length=100)),
+                ('characteristics', models.JSONField(help_text='New char_number, requirement, nominal_value, upper_tolerance and lower_tolerance per balloon')),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['part_number', 'created_at'], name='drawing_revision_part_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DrawingRevisionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('char_number', models.IntegerField()),
+                ('old_requirement', models.CharField(max_length=100)),
+                ('old_nominal_value', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('old_upper_tolerance', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('old_lower_tolerance', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('old_pass_fail', models.BooleanField()),
+                ('new_pass_fail', models.BooleanField()),
+                ('characteristic', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='quality.inspectioncharacteristic')),
+                ('report', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='quality.inspectionreport')),
+                ('revision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='quality.drawingrevision')),
+            ],
+        ),
+    ]
@@ -1,13 +1,50 @@
 # quality/models.py
 from django.db import models
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import Exact, GreaterThan
 from django.utils import timezone
 
+from core.caching import bump_versions
+
+def next_calibration_due_expression():
+	"""last_calibration_date + calibration_interval_days, evaluated in the database"""
+	interval = models.ExpressionWrapper(
+		models.F('calibration_interval_days') * timezone.timedelta(days=1),
+		output_field=models.DurationField(),
+	)
+	return Cast(models.F('last_calibration_date') + interval, models.DateField())
+
+class EquipmentQuerySet(models.QuerySet):
+	def with_next_calibration_due(self):
+		return self.annotate(next_calibration_due=next_calibration_due_expression())
+
+	def calibration_due(self, as_of=None):
+		"""Equipment whose next calibration falls on or before as_of (default today)"""
+		as_of = as_of or timezone.now().date()
+		return self.with_next_calibration_due().filter(next_calibration_due__lte=as_of)
+
 class Equipment(models.Model):
 	name = models.CharField(max_length=100)
 	serial_number = models.CharField(max_length=50)
 	last_calibration_date = models.DateField()
 	calibration_interval_days = models.IntegerField(default=365)
 
+	objects = EquipmentQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			models.Index(next_calibration_due_expression(), name='equipment_next_cal_due_idx'),
+		]
+
+	def save(self, *args, **kwargs):
+		stored = None
+		if not self._state.adding:
+			stored = Equipment.objects.filter(pk=self.pk).values_list('name', 'serial_number').first()
+		super().save(*args, **kwargs)
+		if stored is not None and stored != (self.name, self.serial_number):
+			# Name and serial are printed on Form 3 of every report that used it
+			InspectionReport.touch(characteristics__equipment_used=self)
+
 	def is_calibration_due(self):
 		next_due = self.last_calibration_date + timezone.timedelta(days=self.calibration_interval_days)
 		return next_due <= timezone.now().date()
@@ -15,6 +52,22 @@ class Equipment(models.Model):
 	def __str__(self):
 		return f"{self.name} - {self.serial_number}"
 	
+# Maintained on InspectionReport, in the order characteristic_counts() returns them
+COUNTER_FIELDS = ['characteristic_count', 'measured_count', 'passed_count', 'failed_count']
+
+def characteristic_counts(actual_value, pass_fail):
+	"""What one characteristic contributes to its report's counters"""
+	measured = actual_value is not None
+	return (1, int(measured), int(measured and pass_fail), int(measured and not pass_fail))
+
+def rolled_up_status(total, measured, failed):
+	"""FAIL on any failure, PASS once everything is measured; values or expressions"""
+	return models.Case(
+		models.When(GreaterThan(failed, 0), then=models.Value('FAIL')),
+		models.When(models.Q(GreaterThan(total, 0), Exact(measured, total)), then=models.Value('PASS')),
+		default=models.Value('PENDING'),
+	)
+
 class InspectionReport(models.Model):
 	job = models.ForeignKey(
 		'production.Job', 
@@ -34,8 +87,14 @@ class InspectionReport(models.Model):
 	part_number = models.CharField(max_length=50)
 	part_name = models.CharField(max_length=100)
 	serial_number = models.CharField(max_length=50, blank=True)
-	fai_report_number = models.CharField(max_length=50, unique=True)
+	fai_report_number = models.CharField(
+		max_length=50,
+		unique=True,
+		blank=True,
+		help_text="Generated from the job's customer prefix when left blank"
+	)
 	created_at = models.DateField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
 	inspector_name = models.CharField(max_length=100, blank=True)
 	inspection_date = models.DateField(null=True, blank=True)
 
@@ -47,8 +106,89 @@ class InspectionReport(models.Model):
 
 	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
 
+	# Rolled up from the characteristics (see apply_counts/recount); status follows them
+	characteristic_count = models.PositiveIntegerField(default=0, editable=False)
+	measured_count = models.PositiveIntegerField(default=0, editable=False)
+	passed_count = models.PositiveIntegerField(default=0, editable=False)
+	failed_count = models.PositiveIntegerField(default=0, editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['created_at', 'id'], name='inspection_created_idx'),
+		]
+
+	def save(self, *args, **kwargs):
+		from . import spc
+
+		if not self.fai_report_number:
+			self.fai_report_number = self.generate_fai_report_number()
+		# A new part number moves the measured values to that part's statistics
+		moved = []
+		update_fields = kwargs.get('update_fields')
+		if not self._state.adding and (update_fields is None or 'part_number' in update_fields):
+			stored = InspectionReport.objects.filter(pk=self.pk).values_list('part_number', flat=True).first()
+			if stored is not None and stored != self.part_number:
+				moved = spc.report_changes(self.pk, self.part_number)
+		super().save(*args, **kwargs)
+		if moved:
+			spc.record(moved)
+
+	@classmethod
+	def touch(cls, **filters):
+		"""Move updated_at of matching reports after writes to their characteristics"""
+		cls.objects.filter(**filters).update(updated_at=timezone.now())
+		bump_versions(cls)
+
+	@classmethod
+	def apply_counts(cls, report_id, deltas):
+		"""Add (total, measured, passed, failed) deltas to one report's counters in a single UPDATE"""
+		counts = {field: models.F(field) + delta for field, delta in zip(COUNTER_FIELDS, deltas)}
+		cls.objects.filter(pk=report_id).update(
+			**counts,
+			status=rolled_up_status(counts['characteristic_count'], counts['measured_count'], counts['failed_count']),
+			updated_at=timezone.now(),
+		)
+		bump_versions(cls)
+
+	@classmethod
+	def recount(cls, **filters):
+		"""Recompute the counters of matching reports from their characteristics, for bulk writes"""
+		def count(**conditions):
+			rows = (
+				InspectionCharacteristic.objects.filter(report=models.OuterRef('pk'), **conditions)
+				.order_by().values('report').annotate(count=models.Count('id')).values('count')
+			)
+			return Coalesce(models.Subquery(rows), 0)
+
+		reports = cls.objects.filter(**filters)
+		reports.update(
+			characteristic_count=count(),
+			measured_count=count(actual_value__isnull=False),
+			passed_count=count(actual_value__isnull=False, pass_fail=True),
+			failed_count=count(actual_value__isnull=False, pass_fail=False),
+			updated_at=timezone.now(),
+		)
+		reports.update(status=rolled_up_status(
+			models.F('characteristic_count'), models.F('measured_count'), models.F('failed_count'),
+		))
+		bump_versions(cls)
+
+	def generate_fai_report_number(self):
+		prefix = self.job.customer.identification_prefix if self.job_id else None
+		return InspectionReport.allocate_report_numbers(prefix, 1)[0]
+
+	@staticmethod
+	def allocate_report_numbers(prefix, count):
+		"""count new report numbers for a customer prefix, or for reports without a job when prefix is None"""
+		from production.sequences import allocate_numbers
+
+		reports = InspectionReport.objects
+		if prefix:
+			return allocate_numbers(f'fai:{prefix}', count, lambda number: f"FAI-{prefix}-{number:03d}", reports, 'fai_report_number')
+		return allocate_numbers('fai', count, lambda number: f"FAI-{number:05d}", reports, 'fai_report_number')
+
 	def __str__(self):
-		return f"FAI-{self.fai_report_number} ({self.part_number})"
+		return f"{self.fai_report_number} ({self.part_number})"
 	
 class InspectionCharacteristic(models.Model):
     # This represents ONE line on AS9102 Form 3
@@ -67,12 +207,132 @@ class InspectionCharacteristic(models.Model):
     actual_value = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     pass_fail = models.BooleanField(default=False)
     
-    equipment_used = models.ForeignKey(Equipment, on_delete=models.SET_NULL, null=True, blank=True)
+    # Indexed by characteristic_equipment_idx below, which leads with this column
+    equipment_used = models.ForeignKey(Equipment, on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
+    measured_at = models.DateTimeField(null=True, blank=True, help_text="Set when actual_value is recorded")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['report', 'id'], name='characteristic_report_idx'),
+            # SPC: one balloon across all reports of a part
+            models.Index(fields=['char_number', 'report'], name='characteristic_number_idx'),
+            # Gauge recall: everything measured with one gauge within a date range
+            models.Index(fields=['equipment_used', 'measured_at'], name='characteristic_equipment_idx'),
+        ]
 
     def save(self, *args, **kwargs):
+        from . import spc
+
+        stored = None
+        if not self._state.adding:
+            stored = InspectionCharacteristic.objects.filter(pk=self.pk).values(
+                'report__part_number', 'pass_fail', 'measured_at', *spc.TRACKED_FIELDS
+            ).first()
         # Auto-calculate Pass/Fail before saving
         if self.actual_value is not None:
             upper_limit = self.nominal_value + self.upper_tolerance
             lower_limit = self.nominal_value - self.lower_tolerance
             self.pass_fail = lower_limit <= self.actual_value <= upper_limit
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Timestamp a newly recorded value unless the caller supplied one
+        if self.actual_value is None:
+            self.measured_at = None
+        elif stored is None or stored['actual_value'] != self.actual_value:
+            if self.measured_at == (stored['measured_at'] if stored else None):
+                self.measured_at = timezone.now()
+        super().save(*args, **kwargs)
+
+        # Counter deltas also move the report's updated_at, which generated AS9102 documents are keyed on
+        counts = characteristic_counts(self.actual_value, self.pass_fail)
+        if stored is None:
+            InspectionReport.apply_counts(self.report_id, counts)
+        else:
+            previous = characteristic_counts(stored['actual_value'], stored['pass_fail'])
+            if stored['report_id'] != self.report_id:
+                InspectionReport.apply_counts(stored['report_id'], [-n for n in previous])
+                InspectionReport.apply_counts(self.report_id, counts)
+            else:
+                InspectionReport.apply_counts(self.report_id, [new - old for new, old in zip(counts, previous)])
+
+        if stored is None:
+            spc.record([spc.Change.of(self, None)])
+        elif any(stored[field] != getattr(self, field) for field in spc.TRACKED_FIELDS):
+            # The old value leaves the statistics it was recorded under, before a renumber or move
+            old_key = (stored['report__part_number'], stored['char_number'])
+            spc.record([spc.Change.of(self, stored['actual_value'], old_key=old_key)])
+
+    def delete(self, *args, **kwargs):
+        from . import spc
+
+        stored = InspectionCharacteristic.objects.filter(pk=self.pk).values(
+            'report_id', 'report__part_number', 'char_number', 'actual_value', 'pass_fail'
+        ).first()
+        result = super().delete(*args, **kwargs)
+        if stored is not None:
+            removed = characteristic_counts(stored['actual_value'], stored['pass_fail'])
+            InspectionReport.apply_counts(stored['report_id'], [-n for n in removed])
+            if stored['actual_value'] is not None:
+                old_key = (stored['report__part_number'], stored['char_number'])
+                spc.record([spc.Change.of(self, stored['actual_value'], removed=True, old_key=old_key)])
+        return result
+
+class DrawingRevision(models.Model):
+	"""
+	A customer drawing revision applied to the open characteristics of a part
+	(see quality/revisions.py). The values before the change are kept per
+	characteristic in DrawingRevisionChange.
+	"""
+	part_number = models.CharField(max_length=50)
+	revision = models.CharField(max_length=20, help_text="e.g., C")
+	notes = models.TextField(blank=True)
+	entered_by = models.CharField(max_length=100, blank=True)
+	characteristics = models.JSONField(
+		help_text="New char_number, requirement, nominal_value, upper_tolerance and lower_tolerance per balloon"
+	)
+	updated_count = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['part_number', 'created_at'], name='drawing_revision_part_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.part_number} rev {self.revision}"
+
+class DrawingRevisionChange(models.Model):
+	"""One characteristic as it was before a DrawingRevision was applied"""
+	revision = models.ForeignKey(DrawingRevision, on_delete=models.CASCADE, related_name='changes')
+	characteristic = models.ForeignKey(InspectionCharacteristic, on_delete=models.SET_NULL, null=True, related_name='+')
+	report = models.ForeignKey(InspectionReport, on_delete=models.SET_NULL, null=True, related_name='+')
+	char_number = models.IntegerField()
+	old_requirement = models.CharField(max_length=100)
+	old_nominal_value = models.DecimalField(max_digits=10, decimal_places=4)
+	old_upper_tolerance = models.DecimalField(max_digits=10, decimal_places=4)
+	old_lower_tolerance = models.DecimalField(max_digits=10, decimal_places=4)
+	old_pass_fail = models.BooleanField()
+	new_pass_fail = models.BooleanField()
+
+class CharacteristicStatistics(models.Model):
+	"""
+	Running statistics of the actual values recorded for one balloon of a part
+	across all its reports, kept up to date by quality/spc.py.
+	"""
+	part_number = models.CharField(max_length=50)
+	char_number = models.IntegerField()
+	description = models.CharField(max_length=200, blank=True)
+	count = models.PositiveIntegerField(default=0)
+	mean = models.FloatField(default=0)
+	m2 = models.FloatField(default=0, help_text="Sum of squared deviations from the mean (Welford)")
+	# Specification limits of the most recently recorded characteristic
+	upper_limit = models.DecimalField(max_digits=11, decimal_places=4, null=True, blank=True)
+	lower_limit = models.DecimalField(max_digits=11, decimal_places=4, null=True, blank=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name_plural = 'characteristic statistics'
+		constraints = [
+			models.UniqueConstraint(fields=['part_number', 'char_number'], name='characteristic_statistics_unique'),
+		]
+
+	def __str__(self):
+		return f"{self.part_number} #{self.char_number} (n={self.count})"
@@ -0,0 +1,75 @@
+# quality/recall.py
+"""
+Gauge recall impact: what was measured with a piece of equipment since it
+was last known good.
+
+Every query starts from InspectionCharacteristic filtered on equipment_used
+and a measured_at range, which the (equipment_used, measured_at) index
+answers with a range scan over the affected rows only, however many
+characteristics the table holds. Reports, jobs and customers are joined on
+from there; nothing walks the characteristics of unaffected reports.
+"""
+import datetime
+
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import InspectionCharacteristic
+
+# Streaming export, one row per affected characteristic (core/exports.py)
+EXPORT_COLUMNS = [
+	('Measured At', 'measured_at'),
+	('Customer', 'report__job__customer__name'),
+	('Job Number', 'report__job__job_number'),
+	('FAI Report Number', 'report__fai_report_number'),
+	('Part Number', 'report__part_number'),
+	('Serial Number', 'report__serial_number'),
+	('Char No.', 'char_number'),
+	('Characteristic', 'description'),
+	('Requirement', 'requirement'),
+	('Actual', 'actual_value'),
+	('Pass', 'pass_fail'),
+]
+
+def start_of_day(date):
+	return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+def affected_characteristics(equipment, since, until=None):
+	"""Characteristics measured with equipment from the start of since up to (not including) until"""
+	characteristics = InspectionCharacteristic.objects.filter(
+		equipment_used=equipment, measured_at__gte=start_of_day(since),
+	)
+	if until is not None:
+		characteristics = characteristics.filter(measured_at__lt=start_of_day(until))
+	return characteristics
+
+def impact_totals(characteristics):
+	return characteristics.aggregate(
+		characteristics=Count('id'),
+		reports=Count('report', distinct=True),
+		jobs=Count('report__job', distinct=True),
+		customers=Count('report__job__customer', distinct=True),
+		failed=Count('id', filter=Q(pass_fail=False)),
+		first_measured_at=Min('measured_at'),
+		last_measured_at=Max('measured_at'),
+	)
+
+def affected_reports(characteristics):
+	"""One row per affected report with its job and customer, oldest measurement first"""
+	return (
+		characteristics.order_by()
+		.values(
+			'report_id',
+			fai_report_number=F('report__fai_report_number'),
+			part_number=F('report__part_number'),
+			report_status=F('report__status'),
+			job_number=F('report__job__job_number'),
+			customer=F('report__job__customer__name'),
+		)
+		.annotate(
+			characteristic_count=Count('id'),
+			first_measured_at=Min('measured_at'),
+			last_measured_at=Max('measured_at'),
+		)
+		.order_by('first_measured_at', 'report_id')
+	)
@@ -0,0 +1,120 @@
+# quality/revisions.py
+"""
+Drawing revisions: new requirements and tolerances for balloons of a part,
+applied to every open characteristic with that part number and balloon.
+
+"Open" means the characteristic's report has no job or its job is not
+COMPLETE (JobQuerySet.open()); signed-off work keeps the tolerances it
+was inspected to.
+
+apply_revision() is set-based from start to finish:
+
+1. INSERT ... SELECT copies the affected rows' current values into
+   DrawingRevisionChange (the "before").
+2. One UPDATE sets requirement/nominal/upper/lower with CASE char_number
+   WHEN ... and recomputes pass_fail in the same statement against the new
+   limits, leaving unmeasured rows alone.
+3. The new pass_fail is copied onto the change rows (the "after"), the
+   affected reports are recounted, which rolls their status up, and the
+   SPC limits for the part's balloons follow the drawing.
+
+Nothing loops over characteristics in Python, so a revision costs the same
+handful of statements for ten rows or a hundred thousand.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Value, When
+
+from core.caching import bump_versions
+
+from .models import (
+	CharacteristicStatistics,
+	DrawingRevision,
+	DrawingRevisionChange,
+	InspectionCharacteristic,
+	InspectionReport,
+)
+
+def open_characteristics(part_number, char_numbers):
+	return InspectionCharacteristic.objects.filter(
+		Q(report__job__isnull=True) | ~Q(report__job__status='COMPLETE'),
+		report__part_number=part_number,
+		char_number__in=char_numbers,
+	)
+
+def decimal(value):
+	return Value(value, output_field=DecimalField(max_digits=10, decimal_places=4))
+
+def by_balloon(values, default):
+	"""CASE WHEN char_number = n THEN values[n] ... ELSE default END"""
+	whens = [When(char_number=number, then=value) for number, value in values.items()]
+	return Case(*whens, default=default) if whens else default
+
+def record_before(revision, characteristics):
+	"""Copy the current values of characteristics into revision's change rows with one INSERT ... SELECT"""
+	change_table = DrawingRevisionChange._meta.db_table
+	characteristic_table = InspectionCharacteristic._meta.db_table
+	ids, params = characteristics.values('id').query.sql_with_params()
+	with connection.cursor() as cursor:
+		cursor.execute(
+			f"INSERT INTO {change_table} (revision_id, characteristic_id, report_id, char_number, old_requirement, "
+			f"old_nominal_value, old_upper_tolerance, old_lower_tolerance, old_pass_fail, new_pass_fail) "
+			f"SELECT %s, id, report_id, char_number, requirement, nominal_value, upper_tolerance, "
+			f"lower_tolerance, pass_fail, pass_fail FROM {characteristic_table} WHERE id IN ({ids})",
+			[revision.pk, *params],
+		)
+		return cursor.rowcount
+
+def apply_revision(part_number, revision, characteristics, notes='', entered_by=''):
+	"""
+	characteristics: [{'char_number', 'nominal_value', 'upper_tolerance',
+	'lower_tolerance', optional 'requirement'}] with Decimal values.
+	Returns the saved DrawingRevision.
+	"""
+	with transaction.atomic():
+		record = DrawingRevision.objects.create(
+			part_number=part_number, revision=revision, notes=notes, entered_by=entered_by,
+			characteristics=[
+				{key: value if key == 'char_number' else str(value) for key, value in change.items()}
+				for change in characteristics
+			],
+		)
+		affected = open_characteristics(part_number, [change['char_number'] for change in characteristics])
+		record.updated_count = record_before(record, affected)
+		if record.updated_count:
+			record.save(update_fields=['updated_count'])
+			update_characteristics(record, characteristics)
+	bump_versions(InspectionCharacteristic, CharacteristicStatistics, DrawingRevision)
+	return record
+
+def update_characteristics(record, characteristics):
+	"""Apply the new values to the characteristics recorded in record.changes"""
+	new = {change['char_number']: change for change in characteristics}
+	lower = {number: change['nominal_value'] - change['lower_tolerance'] for number, change in new.items()}
+	upper = {number: change['nominal_value'] + change['upper_tolerance'] for number, change in new.items()}
+
+	InspectionCharacteristic.objects.filter(pk__in=Subquery(record.changes.values('characteristic_id'))).update(
+		requirement=by_balloon(
+			{number: Value(change['requirement']) for number, change in new.items() if change.get('requirement')},
+			F('requirement'),
+		),
+		nominal_value=by_balloon({number: decimal(change['nominal_value']) for number, change in new.items()}, F('nominal_value')),
+		upper_tolerance=by_balloon({number: decimal(change['upper_tolerance']) for number, change in new.items()}, F('upper_tolerance')),
+		lower_tolerance=by_balloon({number: decimal(change['lower_tolerance']) for number, change in new.items()}, F('lower_tolerance')),
+		pass_fail=Case(
+			When(actual_value__isnull=True, then=F('pass_fail')),
+			*[
+				When(char_number=number, actual_value__gte=decimal(lower[number]), actual_value__lte=decimal(upper[number]), then=Value(True))
+				for number in new
+			],
+			default=Value(False),
+		),
+	)
+	record.changes.update(new_pass_fail=Subquery(
+		InspectionCharacteristic.objects.filter(pk=OuterRef('characteristic_id')).values('pass_fail')[:1]
+	))
+
+	InspectionReport.recount(pk__in=record.changes.values('report_id'))
+	CharacteristicStatistics.objects.filter(part_number=record.part_number, char_number__in=list(new)).update(
+		lower_limit=by_balloon({number: decimal(limit) for number, limit in lower.items()}, F('lower_limit')),
+		upper_limit=by_balloon({number: decimal(limit) for number, limit in upper.items()}, F('upper_limit')),
+	)
@@ -1,8 +1,15 @@
 # quality/serializers.py
 from rest_framework import serializers
-from .models import Equipment, InspectionReport, InspectionCharacteristic
+from core.caching import FragmentCacheListSerializer
+from core.serializers import DynamicFieldsMixin
+from .models import (
+	Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics,
+	DrawingRevision, DrawingRevisionChange,
+)
+from .revisions import apply_revision
+from .spc import RunningStats, capability
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
 	calibration_status = serializers.SerializerMethodField()
 
@@ -13,7 +20,7 @@ class EquipmentSerializer(serializers.ModelSerializer):
 	def get_calibration_status(self, obj):
 		return "DUE" if obj.is_calibration_due() else "CURRENT"
 	
-class InspectionCharacteristicSerializer(serializers.ModelSerializer):
+class InspectionCharacteristicSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	equipment_name = serializers.CharField(
 		source='equipment_used.name',
 		read_only=True,
@@ -31,15 +38,63 @@ class InspectionReportDetailSerializer(serializers.ModelSerializer):
 		model = InspectionCharacteristic
 		fields = '__all__'
 
-class InspectionReportDetailSerializer(serializers.ModelSerializer):
+class InspectionReportDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 	characteristics = InspectionCharacteristicSerializer(many=True, read_only=True)
 
 	class Meta:
 		model = InspectionReport
 		fields = '__all__'
 
-class InspectionReportListSerializer(serializers.ModelSerializer):
+class InspectionReportListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+	expandable_fields = {
+		'characteristics': (InspectionCharacteristicSerializer, {'many': True, 'read_only': True}),
+	}
+
 	class Meta:
 		model = InspectionReport
 		fields = ['id', 'fai_report_number', 'part_number', 'part_name', 
-                  'inspection_type', 'status', 'created_at', 'inspection_date']
\ No newline at end of file
+                  'inspection_type', 'status', 'created_at', 'inspection_date',
+                  'characteristic_count', 'measured_count', 'passed_count', 'failed_count']
+		list_serializer_class = FragmentCacheListSerializer
+
+class CharacteristicStatisticsSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = CharacteristicStatistics
+		fields = ['id', 'part_number', 'char_number', 'description', 'count', 'mean',
+				  'upper_limit', 'lower_limit', 'updated_at']
+
+	def to_representation(self, instance):
+		data = super().to_representation(instance)
+		sigma = RunningStats(instance.count, instance.mean, instance.m2).sigma
+		data['sigma'] = sigma
+		data['cp'], data['cpk'] = capability(instance.mean, sigma, instance.upper_limit, instance.lower_limit)
+		return data
+
+class RevisedCharacteristicSerializer(serializers.Serializer):
+	char_number = serializers.IntegerField()
+	requirement = serializers.CharField(max_length=100, required=False, allow_blank=True)
+	nominal_value = serializers.DecimalField(max_digits=10, decimal_places=4)
+	upper_tolerance = serializers.DecimalField(max_digits=10, decimal_places=4, min_value=0)
+	lower_tolerance = serializers.DecimalField(max_digits=10, decimal_places=4, min_value=0)
+
+class DrawingRevisionSerializer(serializers.ModelSerializer):
+	characteristics = RevisedCharacteristicSerializer(many=True, allow_empty=False)
+
+	class Meta:
+		model = DrawingRevision
+		fields = '__all__'
+		read_only_fields = ['updated_count', 'created_at']
+
+	def validate_characteristics(self, value):
+		numbers = [change['char_number'] for change in value]
+		if len(numbers) != len(set(numbers)):
+			raise serializers.ValidationError("Each char_number can only be revised once per revision")
+		return value
+
+	def create(self, validated_data):
+		return apply_revision(**validated_data)
+
+class DrawingRevisionChangeSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = DrawingRevisionChange
+		fields = '__all__'
@@ -0,0 +1,300 @@
+# quality/spc.py
+"""
+Statistical process control across inspection reports.
+
+A characteristic is identified across reports by (part_number, char_number).
+Its capability (mean, sigma, Cp, Cpk) comes from a CharacteristicStatistics
+row holding running Welford statistics: count, mean and M2 (the sum of
+squared deviations). record() folds a batch of changed actual values into
+those rows by merging (and, for edited or deleted values, un-merging) the
+batch's statistics, so recording a measurement costs a few queries no
+matter how many have been taken before, and dashboards read one row per
+characteristic. InspectionCharacteristic.save()/delete(), the CMM import,
+InspectionReport.save() (a part number edit moves the report's values) and
+report deletes (report_deleted, connected to pre_delete) call it; rebuild()
+recomputes every row from scratch after writes that bypass them (queryset
+update() of part numbers or characteristics, raw SQL).
+
+Control charts (individuals/moving range and X-bar/R) need the sequence of
+values, so they read only the most recent `limit` values, newest reports
+last, with one values_list query.
+
+Sigma in the summary is the overall sample standard deviation, so its
+Cp/Cpk are strictly Pp/Ppk; the charts report the within sigma (R-bar/d2,
+or MR-bar/d2 for individuals) and the Cp/Cpk that follow from it.
+"""
+import itertools
+import math
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from core.caching import bump_versions
+
+from .models import CharacteristicStatistics, InspectionCharacteristic
+
+# Saving a characteristic only touches its statistics when one of these changed
+TRACKED_FIELDS = ('actual_value', 'nominal_value', 'upper_tolerance', 'lower_tolerance', 'char_number', 'report_id')
+
+DEFAULT_CHART_LIMIT = 100
+MAX_CHART_LIMIT = 2000
+
+# Subgroup size: (A2, D3, D4, d2)
+XBAR_R_CONSTANTS = {
+	2: (1.880, 0.0, 3.267, 1.128),
+	3: (1.023, 0.0, 2.574, 1.693),
+	4: (0.729, 0.0, 2.282, 2.059),
+	5: (0.577, 0.0, 2.114, 2.326),
+	6: (0.483, 0.0, 2.004, 2.534),
+	7: (0.419, 0.076, 1.924, 2.704),
+	8: (0.373, 0.136, 1.864, 2.847),
+	9: (0.337, 0.184, 1.816, 2.970),
+	10: (0.308, 0.223, 1.777, 3.078),
+}
+# Individuals chart: 3 / d2 for moving ranges of 2, and D4 for n=2
+E2, MR_D4, MR_D2 = 2.660, 3.267, 1.128
+
+class RunningStats:
+	"""count, mean and M2 of a set of values, combinable without the values"""
+
+	def __init__(self, count=0, mean=0.0, m2=0.0):
+		self.count = count
+		self.mean = mean
+		self.m2 = m2
+
+	@classmethod
+	def of(cls, values):
+		values = np.asarray(values, dtype=float)
+		if not len(values):
+			return cls()
+		mean = float(values.mean())
+		return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+	def merge(self, other):
+		"""Statistics of the union (Chan et al. parallel update)"""
+		if not other.count:
+			return RunningStats(self.count, self.mean, self.m2)
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		mean = self.mean + delta * other.count / count
+		m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+		return RunningStats(count, mean, m2)
+
+	def remove(self, other):
+		"""Statistics with the values of other taken out again"""
+		count = self.count - other.count
+		if count <= 0:
+			return RunningStats()
+		mean = (self.count * self.mean - other.count * other.mean) / count
+		delta = other.mean - mean
+		m2 = self.m2 - other.m2 - delta * delta * count * other.count / self.count
+		return RunningStats(count, mean, max(m2, 0.0))
+
+	@property
+	def sigma(self):
+		return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+def capability(mean, sigma, upper_limit, lower_limit):
+	"""(Cp, Cpk) for the given spread and specification limits; None where undefined"""
+	if not sigma or upper_limit is None or lower_limit is None:
+		return None, None
+	upper_limit, lower_limit = float(upper_limit), float(lower_limit)
+	cp = (upper_limit - lower_limit) / (6 * sigma)
+	cpk = min(upper_limit - mean, mean - lower_limit) / (3 * sigma)
+	return round(cp, 4), round(cpk, 4)
+
+class Change:
+	"""
+	An actual value leaving (old) and/or entering (new) a characteristic's
+	statistics; old leaves those of old_key, (part_number, char_number) as
+	stored, when the characteristic was renumbered or moved
+	"""
+	__slots__ = ['key', 'old_key', 'old', 'new', 'upper_limit', 'lower_limit', 'description']
+
+	def __init__(self, part_number, char_number, old, new, upper_limit=None, lower_limit=None, description='', old_key=None):
+		self.key = (part_number, char_number)
+		self.old_key = old_key or self.key
+		self.old = old
+		self.new = new
+		self.upper_limit = upper_limit
+		self.lower_limit = lower_limit
+		self.description = description
+
+	@classmethod
+	def of(cls, characteristic, old, removed=False, old_key=None):
+		return cls(
+			characteristic.report.part_number, characteristic.char_number,
+			old, None if removed else characteristic.actual_value,
+			characteristic.nominal_value + characteristic.upper_tolerance,
+			characteristic.nominal_value - characteristic.lower_tolerance,
+			characteristic.description, old_key,
+		)
+
+def report_changes(report_id, part_number=None):
+	"""
+	Changes taking the measured values of a report out of the statistics of
+	its stored part number, and into those of part_number unless it is None
+	"""
+	rows = InspectionCharacteristic.objects.filter(report_id=report_id, actual_value__isnull=False).values_list(
+		'report__part_number', 'char_number', 'actual_value',
+		'nominal_value', 'upper_tolerance', 'lower_tolerance', 'description',
+	)
+	return [
+		Change(
+			part_number or stored_part, number, value, None if part_number is None else value,
+			nominal + upper, nominal - lower, description, old_key=(stored_part, number),
+		)
+		for stored_part, number, value, nominal, upper, lower, description in rows
+	]
+
+def report_deleted(sender, instance, **kwargs):
+	"""pre_delete of InspectionReport: cascades skip InspectionCharacteristic.delete()"""
+	record(report_changes(instance.pk))
+
+def record(changes):
+	"""Fold changed actual values into CharacteristicStatistics (three queries per call)"""
+	added, removed, latest = {}, {}, {}
+	for change in changes:
+		if change.old is not None:
+			removed.setdefault(change.old_key, []).append(float(change.old))
+		if change.new is not None:
+			added.setdefault(change.key, []).append(float(change.new))
+			latest[change.key] = change
+	keys = added.keys() | removed.keys()
+	if not keys:
+		return
+
+	with transaction.atomic():
+		# Create missing rows first so concurrent writers lock the same row
+		CharacteristicStatistics.objects.bulk_create(
+			[CharacteristicStatistics(part_number=part, char_number=number) for part, number in keys],
+			ignore_conflicts=True,
+		)
+		rows = CharacteristicStatistics.objects.select_for_update().filter(
+			part_number__in={part for part, _ in keys}, char_number__in={number for _, number in keys},
+		)
+		updated, now = [], timezone.now()
+		for row in rows:
+			key = (row.part_number, row.char_number)
+			if key not in keys:
+				continue
+			stats = RunningStats(row.count, row.mean, row.m2)
+			stats = stats.remove(RunningStats.of(removed.get(key, []))).merge(RunningStats.of(added.get(key, [])))
+			row.count, row.mean, row.m2, row.updated_at = stats.count, stats.mean, stats.m2, now
+			if key in latest:
+				change = latest[key]
+				row.upper_limit, row.lower_limit = change.upper_limit, change.lower_limit
+				row.description = change.description[:200]
+			updated.append(row)
+		CharacteristicStatistics.objects.bulk_update(
+			updated, ['count', 'mean', 'm2', 'upper_limit', 'lower_limit', 'description', 'updated_at'],
+		)
+	bump_versions(CharacteristicStatistics)
+
+def rebuild(chunk_size=5000):
+	"""Recompute every CharacteristicStatistics row from the recorded actual values"""
+	values = (
+		InspectionCharacteristic.objects.filter(actual_value__isnull=False)
+		.order_by('report__part_number', 'char_number', 'report__created_at', 'report_id', 'id')
+		.values_list(
+			'report__part_number', 'char_number', 'actual_value',
+			'nominal_value', 'upper_tolerance', 'lower_tolerance', 'description',
+		)
+		.iterator(chunk_size=chunk_size)
+	)
+	rows = []
+	for (part, number), group in itertools.groupby(values, key=lambda row: row[:2]):
+		group = list(group)
+		stats = RunningStats.of([float(row[2]) for row in group])
+		*_, nominal, upper, lower, description = group[-1]
+		rows.append(CharacteristicStatistics(
+			part_number=part, char_number=number, description=description[:200],
+			count=stats.count, mean=stats.mean, m2=stats.m2,
+			upper_limit=nominal + upper, lower_limit=nominal - lower,
+		))
+	with transaction.atomic():
+		CharacteristicStatistics.objects.all().delete()
+		CharacteristicStatistics.objects.bulk_create(rows, batch_size=1000)
+	bump_versions(CharacteristicStatistics)
+	return len(rows)
+
+# -- control charts ------------------------------------------------------
+
+def recent_values(part_number, char_number, limit=DEFAULT_CHART_LIMIT):
+	"""The last limit (report number, inspection date, value) in inspection order"""
+	rows = list(
+		InspectionCharacteristic.objects.filter(
+			report__part_number=part_number, char_number=char_number, actual_value__isnull=False,
+		)
+		.order_by('-report__created_at', '-report_id', '-id')
+		.values_list('report__fai_report_number', 'report__inspection_date', 'actual_value')[:limit]
+	)
+	rows.reverse()
+	return rows
+
+def limits(center, upper, lower):
+	return {'center': round(center, 6), 'ucl': round(upper, 6), 'lcl': round(lower, 6)}
+
+def individuals_chart(rows, upper_limit=None, lower_limit=None):
+	"""Individuals / moving range chart over rows from recent_values()"""
+	values = np.array([float(value) for _, _, value in rows])
+	if len(values) < 2:
+		return {'type': 'individuals', 'points': [], 'x': None, 'mr': None, 'cp': None, 'cpk': None}
+	moving_ranges = np.abs(np.diff(values))
+	center, mr_bar = float(values.mean()), float(moving_ranges.mean())
+	x = limits(center, center + E2 * mr_bar, center - E2 * mr_bar)
+	mr = limits(mr_bar, MR_D4 * mr_bar, 0.0)
+	out = (values > x['ucl']) | (values < x['lcl'])
+
+	points = []
+	for index, (report, date, value) in enumerate(rows):
+		points.append({
+			'report': report,
+			'inspection_date': date,
+			'value': float(value),
+			'moving_range': round(float(moving_ranges[index - 1]), 6) if index else None,
+			'out_of_control': bool(out[index]),
+		})
+	cp, cpk = capability(center, mr_bar / MR_D2, upper_limit, lower_limit)
+	return {
+		'type': 'individuals', 'points': points, 'x': x, 'mr': mr,
+		'sigma_within': round(mr_bar / MR_D2, 6), 'cp': cp, 'cpk': cpk,
+	}
+
+def xbar_r_chart(rows, subgroup_size, upper_limit=None, lower_limit=None):
+	"""X-bar/R chart over consecutive subgroups of subgroup_size; the oldest partial subgroup is dropped"""
+	a2, d3, d4, d2 = XBAR_R_CONSTANTS[subgroup_size]
+	count = len(rows) // subgroup_size
+	if count < 2:
+		return {'type': 'xbar-r', 'subgroup_size': subgroup_size, 'subgroups': [], 'xbar': None, 'r': None, 'cp': None, 'cpk': None}
+	rows = rows[len(rows) - count * subgroup_size:]
+	values = np.array([float(value) for _, _, value in rows]).reshape(count, subgroup_size)
+	means, ranges = values.mean(axis=1), np.ptp(values, axis=1)
+	center, r_bar = float(means.mean()), float(ranges.mean())
+	xbar = limits(center, center + a2 * r_bar, center - a2 * r_bar)
+	r = limits(r_bar, d4 * r_bar, d3 * r_bar)
+	out = (means > xbar['ucl']) | (means < xbar['lcl']) | (ranges > r['ucl']) | (ranges < r['lcl'])
+
+	subgroups = []
+	for index in range(count):
+		first, last = rows[index * subgroup_size], rows[(index + 1) * subgroup_size - 1]
+		subgroups.append({
+			'first_report': first[0],
+			'last_report': last[0],
+			'mean': round(float(means[index]), 6),
+			'range': round(float(ranges[index]), 6),
+			'out_of_control': bool(out[index]),
+		})
+	cp, cpk = capability(center, r_bar / d2, upper_limit, lower_limit)
+	return {
+		'type': 'xbar-r', 'subgroup_size': subgroup_size, 'subgroups': subgroups,
+		'xbar': xbar, 'r': r, 'sigma_within': round(r_bar / d2, 6), 'cp': cp, 'cpk': cpk,
+	}
+
+def chart(statistics, chart_type='individuals', subgroup_size=5, limit=DEFAULT_CHART_LIMIT):
+	"""Control chart for a CharacteristicStatistics row; cp/cpk use the within-subgroup sigma"""
+	rows = recent_values(statistics.part_number, statistics.char_number, limit)
+	if chart_type == 'xbar-r':
+		return xbar_r_chart(rows, subgroup_size, statistics.upper_limit, statistics.lower_limit)
+	return individuals_chart(rows, statistics.upper_limit, statistics.lower_limit)
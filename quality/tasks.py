@@ -0,0 +1,23 @@
+# quality/tasks.py
+from celery import shared_task
+
+from core.artifacts import release_render
+
+from .documents import AS9102Document
+
+@shared_task
+def render_as9102(report_id, file_format, path):
+	"""
+	Render the AS9102 forms for a report and store them under path.
+
+	path is the key the API computed when it queued the task; if the report
+	changed in between, the newer content is stored and the next request
+	computes a new key anyway.
+	"""
+	try:
+		document = AS9102Document.load(report_id, file_format)
+		document.path = path
+		document.save()
+	finally:
+		release_render(path)
+	return {'report_id': report_id, 'file_format': file_format}
@@ -1,3 +1,434 @@
-from django.test import TestCase
+import importlib
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from production.models import Customer, Job
+from . import spc
+from .models import Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics
+
+class ListQueryCountTests(TestCase):
+	"""Each list endpoint must issue the same number of queries for 2 rows as for 12"""
+
+	endpoints = [
+		'/api/quality/equipment/',
+		'/api/quality/equipment/calibration_due/',
+		'/api/quality/inspections/',
+		'/api/quality/inspections/?expand=characteristics',
+		'/api/quality/async/inspections/?expand=characteristics',
+		'/api/quality/async/equipment/calibration_due/',
+		'/api/quality/inspections/1/',
+		'/api/quality/characteristics/',
+	]
+
+	def setUp(self):
+		self.client = APIClient()
+		self.customer = Customer.objects.create(name="Customer", email="c@example.com", identification_prefix="CUS")
+		self.job = Job.objects.create(customer=self.customer, part_number="P-1", quantity=1, due_date=date.today())
+		self.report = InspectionReport.objects.create(job=self.job, part_number="P-1", part_name="Bracket")
+		self.created = 0
+
+	def create_rows(self, count):
+		for _ in range(count):
+			self.created += 1
+			n = self.created
+			equipment = Equipment.objects.create(
+				name=f"Caliper {n}", serial_number=f"CAL-{n}",
+				last_calibration_date=date.today() - timedelta(days=400)
+			)
+			report = InspectionReport.objects.create(job=self.job, part_number="P-1", part_name="Bracket")
+			for report in (self.report, report):
+				InspectionCharacteristic.objects.create(
+					report=report, char_number=n, description="Length", requirement="1.000 +/- 0.005",
+					nominal_value=1, upper_tolerance=0.005, lower_tolerance=0.005,
+					actual_value=1.001, equipment_used=equipment
+				)
+
+	def count_queries(self, url):
+		url = url.replace('/1/', f'/{self.report.pk}/')
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200, url)
+		return len(queries)
+
+	def test_query_count_does_not_grow_with_rows(self):
+		self.create_rows(2)
+		small = {url: self.count_queries(url) for url in self.endpoints}
+		self.create_rows(10)
+		for url in self.endpoints:
+			with self.subTest(url=url):
+				self.assertEqual(self.count_queries(url), small[url])
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CELERY_TASK_ALWAYS_EAGER=True)
+class StableOrderingTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		# Created the same day, so created_at alone does not order them
+		self.reports = [InspectionReport.objects.create(part_number=f"P-{n}", part_name="Bracket") for n in range(7)]
+		for report in self.reports[:2]:
+			for number in (2, 1):
+				InspectionCharacteristic.objects.create(
+					report=report, char_number=number, description="OD", requirement="0.500 +/- 0.005",
+					nominal_value=Decimal('0.500'), upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+				)
+
+	def walk(self, url):
+		ids = []
+		while url:
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			ids += [row['id'] for row in response.json()['results']]
+			url = response.json()['next']
+		return ids
+
+	def test_lists_are_ordered_with_an_id_tie_breaker(self):
+		newest_first = [report.pk for report in reversed(self.reports)]
+		for url in ('/api/quality/inspections/', '/api/quality/async/inspections/'):
+			with self.subTest(url=url):
+				self.assertEqual([row['id'] for row in self.client.get(url).json()['results']], newest_first)
+				self.assertEqual(self.walk(f'{url}?pagination=cursor&page_size=3'), newest_first)
+
+		characteristics = list(InspectionCharacteristic.objects.order_by('report_id', 'char_number').values_list('id', flat=True))
+		self.assertEqual(self.walk('/api/quality/characteristics/?pagination=cursor&page_size=3'), characteristics)
+		self.assertEqual([row['id'] for row in self.client.get('/api/quality/characteristics/').data['results']], characteristics)
+
+class AS9102Tests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.report = InspectionReport.objects.create(part_number="P-1", part_name="Bracket")
+		self.characteristic = InspectionCharacteristic.objects.create(
+			report=self.report, char_number=1, description="Bore (A)", requirement="0.500 +/- 0.001",
+			nominal_value=Decimal('0.500'), upper_tolerance=Decimal('0.001'), lower_tolerance=Decimal('0.001'),
+		)
+		self.url = f'/api/quality/inspections/{self.report.pk}/as9102/'
+
+	def test_forms_are_rendered_until_characteristics_change(self):
+		pdf = self.client.get(self.url)
+		self.assertEqual(pdf.status_code, 200)
+		content = b''.join(pdf.streaming_content)
+		self.assertTrue(content.startswith(b'%PDF') and content.rstrip().endswith(b'%%EOF'))
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=pdf['ETag']).status_code, 304)
+
+		self.characteristic.actual_value = Decimal('0.5004')
+		self.characteristic.save()
+		self.assertNotEqual(self.client.get(self.url)['ETag'], pdf['ETag'])
+
+		xlsx = self.client.get(self.url, {'file_format': 'xlsx'})
+		self.assertEqual(xlsx['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+		self.assertEqual(self.client.get(self.url, {'file_format': 'doc'}).status_code, 400)
+
+class CMMImportTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user("inspector"))
+		self.report = InspectionReport.objects.create(part_number="P-1", part_name="Bracket")
+		for number in (1, 2, 3):
+			InspectionCharacteristic.objects.create(
+				report=self.report, char_number=number, description=f"Feature {number}", requirement="0.500 +/- 0.005",
+				nominal_value=Decimal('0.500'), upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+			)
+		self.url = f'/api/quality/inspections/{self.report.pk}/cmm-import/'
+
+	def upload(self, name, content):
+		content = content if isinstance(content, bytes) else content.encode()
+		return self.client.post(self.url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+	def actuals(self):
+		return list(self.report.characteristics.order_by('char_number').values_list('actual_value', 'pass_fail'))
+
+	def test_csv_limits_are_inclusive(self):
+		response = self.upload('results.csv', "Balloon,Meas\n1,0.505\n2,0.4950\n3,0.5051\n9,0.5\n2,0.5\n")
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['matched'], response.data['failed']), (3, 1))
+		self.assertEqual(response.data['unmatched'], [9])
+		self.assertEqual(response.data['error_count'], 1)
+		self.assertEqual(self.actuals(), [(Decimal('0.505'), True), (Decimal('0.495'), True), (Decimal('0.5051'), False)])
+		self.report.refresh_from_db()
+		self.assertEqual(self.report.status, 'FAIL')
+
+	def test_pcdmis_rolls_up_to_pass(self):
+		text = (
+			"PART NAME  : BRACKET\n"
+			"DIM 1= LOCATION OF CIRCLE CIR1  UNITS=IN\n"
+			"AX    NOMINAL    +TOL    -TOL    MEAS     DEV    OUTTOL\n"
+			"D      0.5000  0.0050  0.0050  0.5012  0.0012  0.0000\n"
+			"X      1.0000  0.0050  0.0050  1.0400  0.0400  0.0350\n"
+			"DIM 2= DISTANCE PLN1 TO PLN2\n"
+			"AX    NOMINAL    +TOL    -TOL    MEAS     DEV    OUTTOL\n"
+			"M      0.5000  0.0050  0.0050  0.4990 -0.0010  0.0000\n"
+		)
+		self.upload('results.txt', text)
+		self.assertEqual(self.actuals()[:2], [(Decimal('0.5012'), True), (Decimal('0.499'), True)])
+		self.report.refresh_from_db()
+		self.assertEqual(self.report.status, 'PENDING')
+
+		response = self.upload('more.csv', "char_number,actual\n3,0.5\n")
+		self.assertEqual(response.data['status'], 'PASS')
+
+	def test_latin_1_csv(self):
+		response = self.upload('results.csv', "balloon,actual,comment\n1,0.501,\u00d8 12 bore\n".encode('latin-1'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['matched'], 1)
+
+	def test_out_of_range_values_are_line_errors(self):
+		response = self.upload('results.csv', "balloon,actual\n1,1e20\n2,-1000000\n3,999999.9999\n")
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+		self.assertEqual(response.data['matched'], 1)
+		self.assertEqual(self.actuals()[2], (Decimal('999999.9999'), False))
+
+	def test_unreadable_file(self):
+		self.assertEqual(self.upload('results.csv', "part,value\n1,2\n").status_code, 400)
+		self.assertEqual(self.upload('results.pdf', "%PDF").status_code, 400)
+
+class SPCTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.characteristics = []
+		for index, actual in enumerate(['0.5010', '0.4990', '0.5020', '0.4980', '0.5000', '0.5030']):
+			report = InspectionReport.objects.create(part_number="P-7", part_name="Shaft")
+			self.characteristics.append(InspectionCharacteristic.objects.create(
+				report=report, char_number=4, description="OD", requirement="0.500 +/- 0.005",
+				nominal_value=Decimal('0.500'), upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+				actual_value=Decimal(actual),
+			))
+
+	def assertMatchesValues(self):
+		values = [float(c.actual_value) for c in InspectionCharacteristic.objects.filter(actual_value__isnull=False)]
+		statistics = CharacteristicStatistics.objects.get(part_number="P-7", char_number=4)
+		self.assertEqual(statistics.count, len(values))
+		self.assertAlmostEqual(statistics.mean, np.mean(values))
+		self.assertAlmostEqual(statistics.m2, np.var(values) * len(values))
+		return statistics
+
+	def test_running_statistics_follow_edits_and_deletes(self):
+		self.assertMatchesValues()
+		self.characteristics[0].actual_value = Decimal('0.5100')
+		self.characteristics[0].save()
+		self.characteristics[1].delete()
+		self.assertMatchesValues()
+
+		CharacteristicStatistics.objects.update(count=0, mean=0, m2=0)
+		spc.rebuild()
+		statistics = self.assertMatchesValues()
+		self.assertEqual(statistics.upper_limit, Decimal('0.505'))
+
+	def assertMatchesAllValues(self):
+		"""Every statistics row against the values stored under its (part, balloon)"""
+		expected = {}
+		for part, number, value in InspectionCharacteristic.objects.filter(actual_value__isnull=False).values_list(
+			'report__part_number', 'char_number', 'actual_value',
+		):
+			expected.setdefault((part, number), []).append(float(value))
+		for statistics in CharacteristicStatistics.objects.all():
+			values = expected.pop((statistics.part_number, statistics.char_number), [])
+			self.assertEqual(statistics.count, len(values), statistics)
+			if values:
+				self.assertAlmostEqual(statistics.mean, np.mean(values))
+				self.assertAlmostEqual(statistics.m2, np.var(values) * len(values))
+		self.assertEqual(expected, {})
+
+	def test_renumbered_and_moved_characteristics_move_their_values(self):
+		renumbered = self.characteristics[0]
+		renumbered.char_number = 5
+		renumbered.save()
+		moved = self.characteristics[1]
+		moved.report = InspectionReport.objects.create(part_number="P-8", part_name="Shaft")
+		moved.save()
+		self.assertMatchesAllValues()
+		self.assertEqual(CharacteristicStatistics.objects.get(part_number="P-7", char_number=4).count, 4)
+
+		InspectionCharacteristic.objects.get(pk=renumbered.pk).delete()
+		self.assertEqual(CharacteristicStatistics.objects.get(part_number="P-7", char_number=5).count, 0)
+		self.assertMatchesAllValues()
+
+	def test_report_edits_and_deletes_through_the_api(self):
+		self.client.force_authenticate(User.objects.create_user('inspector', password='x'))
+		reports = [characteristic.report for characteristic in self.characteristics]
+		response = self.client.patch(f'/api/quality/inspections/{reports[0].pk}/', {'part_number': 'P-8'}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.client.delete(f'/api/quality/inspections/{reports[1].pk}/').status_code, 204)
+		reports[2].job = Job.objects.create(
+			customer=Customer.objects.create(name="Acme", identification_prefix="ACM"),
+			part_number="P-7", quantity=1, due_date=date.today(),
+		)
+		reports[2].save()
+		reports[2].job.delete()
+		self.assertMatchesAllValues()
+		self.assertEqual(CharacteristicStatistics.objects.get(part_number="P-7", char_number=4).count, 3)
+
+	def test_migration_backfills_existing_values(self):
+		backfill = importlib.import_module('quality.migrations.0007_characteristicstatistics').backfill_statistics
+		CharacteristicStatistics.objects.all().delete()
+		backfill(django_apps, None)
+		self.assertMatchesValues()
+
+	def test_capability_and_charts(self):
+		statistics = CharacteristicStatistics.objects.get()
+		summary = self.client.get('/api/quality/spc/', {'part_number': 'P-7'}).data['results'][0]
+		sigma = np.std([0.501, 0.499, 0.502, 0.498, 0.500, 0.503], ddof=1)
+		self.assertAlmostEqual(summary['sigma'], sigma)
+		self.assertAlmostEqual(summary['cp'], 0.010 / (6 * sigma), places=3)
+
+		chart = self.client.get(f'/api/quality/spc/{statistics.pk}/chart/').data
+		self.assertEqual([point['value'] for point in chart['points']], [0.501, 0.499, 0.502, 0.498, 0.5, 0.503])
+		self.assertAlmostEqual(chart['x']['center'], 0.5005)
+
+		chart = self.client.get(f'/api/quality/spc/{statistics.pk}/chart/', {'type': 'xbar-r', 'subgroup_size': 3}).data
+		self.assertEqual([subgroup['range'] for subgroup in chart['subgroups']], [0.003, 0.005])
+		self.assertEqual(self.client.get(f'/api/quality/spc/{statistics.pk}/chart/', {'subgroup_size': 11}).status_code, 400)
+
+	def test_chart_is_cached_until_a_value_changes(self):
+		url = f'/api/quality/spc/{CharacteristicStatistics.objects.get().pk}/chart/'
+		first = self.client.get(url)
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+		self.characteristics[0].actual_value = Decimal('0.5040')
+		self.characteristics[0].save()
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['points'][0]['value'], 0.504)
+
+class ReportCounterTests(TestCase):
+	def setUp(self):
+		self.report = InspectionReport.objects.create(part_number="P-1", part_name="Bracket")
+
+	def add(self, actual=None):
+		return InspectionCharacteristic.objects.create(
+			report=self.report, char_number=self.report.characteristics.count() + 1, description="Slot", requirement="1.000 +/- 0.010",
+			nominal_value=Decimal('1.000'), upper_tolerance=Decimal('0.010'), lower_tolerance=Decimal('0.010'), actual_value=actual,
+		)
+
+	def assertCounts(self, total, measured, passed, failed, status):
+		self.report.refresh_from_db()
+		self.assertEqual(
+			(self.report.characteristic_count, self.report.measured_count, self.report.passed_count, self.report.failed_count, self.report.status),
+			(total, measured, passed, failed, status),
+		)
+
+	def test_counters_and_status_follow_characteristics(self):
+		first = self.add()
+		second = self.add(Decimal('1.005'))
+		self.assertCounts(2, 1, 1, 0, 'PENDING')
+
+		first.actual_value = Decimal('1.020')
+		first.save()
+		self.assertCounts(2, 2, 1, 1, 'FAIL')
+
+		first.delete()
+		self.assertCounts(1, 1, 1, 0, 'PASS')
+
+		# Bulk writes bypass save() and are reconciled with recount()
+		InspectionCharacteristic.objects.filter(pk=second.pk).update(actual_value=None)
+		InspectionReport.recount(pk=self.report.pk)
+		self.assertCounts(1, 0, 0, 0, 'PENDING')
+
+class GaugeRecallTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		job = Job.objects.create(customer=customer, part_number="P-1", quantity=1, due_date=date.today())
+		self.gauge = Equipment.objects.create(name="Micrometer", serial_number="M-1", last_calibration_date=date(2026, 1, 1))
+		other = Equipment.objects.create(name="Caliper", serial_number="C-1", last_calibration_date=date(2026, 1, 1))
+		self.reports = [InspectionReport.objects.create(job=job, part_number="P-1", part_name="Bracket") for _ in range(3)]
+		measured = [
+			(self.reports[0], self.gauge, '2025-12-31T12:00:00Z'),
+			(self.reports[1], self.gauge, '2026-01-05T12:00:00Z'),
+			(self.reports[1], self.gauge, '2026-02-01T12:00:00Z'),
+			(self.reports[2], other, '2026-02-01T12:00:00Z'),
+		]
+		for number, (report, equipment, measured_at) in enumerate(measured, start=1):
+			InspectionCharacteristic.objects.create(
+				report=report, char_number=number, description="Bore", requirement="0.500 +/- 0.005",
+				nominal_value=Decimal('0.500'), upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+				actual_value=Decimal('0.501'), equipment_used=equipment, measured_at=measured_at,
+			)
+		self.url = f'/api/quality/equipment/{self.gauge.pk}/impact/'
+
+	def test_impact_since_last_calibration(self):
+		data = self.client.get(self.url).data
+		self.assertEqual((data['characteristics'], data['reports'], data['jobs'], data['customers']), (2, 1, 1, 1))
+		self.assertEqual([row['fai_report_number'] for row in data['results']], [self.reports[1].fai_report_number])
+		self.assertEqual(data['results'][0]['customer'], "Acme")
+
+		data = self.client.get(self.url, {'since': '2025-12-01', 'until': '2026-01-31'}).data
+		self.assertEqual(data['characteristics'], 2)
+		self.assertEqual(self.client.get(self.url, {'since': 'last week'}).status_code, 400)
+
+	def test_impact_is_cached_until_a_measurement_changes(self):
+		first = self.client.get(self.url)
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+		characteristic = InspectionCharacteristic.objects.get(report=self.reports[0])
+		characteristic.measured_at = '2026-01-10T12:00:00Z'
+		characteristic.save()
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['reports'], 2)
+
+	def test_export_streams_affected_characteristics(self):
+		response = self.client.get(f'{self.url}export/')
+		lines = b''.join(response.streaming_content).decode().splitlines()
+		self.assertEqual(len(lines), 3)
+		self.assertTrue(lines[1].startswith('2026-01-05'))
+
+	def test_recording_a_value_sets_measured_at(self):
+		characteristic = InspectionCharacteristic.objects.create(
+			report=self.reports[0], char_number=9, description="Slot", requirement="1.000 +/- 0.010",
+			nominal_value=Decimal('1.000'), upper_tolerance=Decimal('0.010'), lower_tolerance=Decimal('0.010'),
+		)
+		self.assertIsNone(characteristic.measured_at)
+		characteristic.actual_value = Decimal('1.001')
+		characteristic.save()
+		self.assertIsNotNone(characteristic.measured_at)
+
+class DrawingRevisionTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.client.force_authenticate(User.objects.create_user("engineer"))
+		customer = Customer.objects.create(name="Acme", email="acme@example.com", identification_prefix="ACM")
+		self.open_job = Job.objects.create(customer=customer, part_number="P-9", quantity=1, due_date=date.today())
+		closed_job = Job.objects.create(customer=customer, part_number="P-9", quantity=1, due_date=date.today(), status='COMPLETE')
+		self.open_report = InspectionReport.objects.create(job=self.open_job, part_number="P-9", part_name="Pin")
+		self.closed_report = InspectionReport.objects.create(job=closed_job, part_number="P-9", part_name="Pin")
+		for report in (self.open_report, self.closed_report):
+			for number, actual in ((1, '0.2540'), (2, None)):
+				InspectionCharacteristic.objects.create(
+					report=report, char_number=number, description="Dia", requirement="0.250 +/- 0.005",
+					nominal_value=Decimal('0.250'), upper_tolerance=Decimal('0.005'), lower_tolerance=Decimal('0.005'),
+					actual_value=actual and Decimal(actual),
+				)
+
+	def test_revision_updates_open_characteristics_in_bulk(self):
+		payload = {
+			'part_number': "P-9", 'revision': "C",
+			'characteristics': [
+				{'char_number': 1, 'requirement': "0.250 +/- 0.002", 'nominal_value': '0.250', 'upper_tolerance': '0.002', 'lower_tolerance': '0.002'},
+				{'char_number': 2, 'nominal_value': '0.300', 'upper_tolerance': '0.010', 'lower_tolerance': '0.010'},
+			],
+		}
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.post('/api/quality/drawing-revisions/', payload, format='json')
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.data['updated_count'], 2)
+		self.assertLess(len(queries), 15)
+
+		revised = self.open_report.characteristics.get(char_number=1)
+		self.assertEqual((revised.requirement, revised.upper_tolerance, revised.pass_fail), ("0.250 +/- 0.002", Decimal('0.002'), False))
+		self.assertEqual(self.open_report.characteristics.get(char_number=2).nominal_value, Decimal('0.300'))
+		self.assertTrue(self.closed_report.characteristics.get(char_number=1).pass_fail)
+		self.open_report.refresh_from_db()
+		self.assertEqual((self.open_report.status, self.open_report.failed_count), ('FAIL', 1))
+
+		changes = self.client.get(f"/api/quality/drawing-revisions/{response.data['id']}/changes/").data['results']
+		before = [(change['char_number'], change['old_upper_tolerance'], change['old_pass_fail'], change['new_pass_fail']) for change in changes]
+		self.assertEqual(before, [(1, '0.0050', True, False), (2, '0.0050', False, False)])
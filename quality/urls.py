@@ -6,7 +6,12 @@ router = DefaultRouter()
 router.register(r'equipment', views.EquipmentViewSet, basename='equipment')
 router.register(r'inspections', views.InspectionReportViewSet, basename='inspection')
 router.register(r'characteristics', views.InspectionCharacteristicViewSet, basename='characteristic')
+router.register(r'spc', views.CharacteristicStatisticsViewSet, basename='spc')
+router.register(r'drawing-revisions', views.DrawingRevisionViewSet, basename='drawing-revision')
 
 urlpatterns = [
+    # Async variants of dashboard lists, with ?wait= long polling under ASGI (core/asyncviews.py)
+    path('async/inspections/', views.InspectionListAsyncView.as_view(), name='inspection-list-async'),
+    path('async/equipment/calibration_due/', views.CalibrationDueAsyncView.as_view(), name='equipment-calibration-due-async'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
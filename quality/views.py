@@ -1,41 +1,272 @@
-from rest_framework import viewsets, filters
+from rest_framework import mixins, viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Equipment, InspectionReport, InspectionCharacteristic
+from core.artifacts import artifact_response, enqueue_render, pending_response
+from core.asyncviews import AsyncListView
+from core.caching import CachedResponseMixin
+from core.exports import ExportMixin, csv_response, iter_rows, xlsx_response
+from core.mixins import OptimizedQuerysetMixin
+
+from . import cmm, recall, spc, tasks
+from .documents import AS9102Document, FORMATS
+from .models import (
+    Equipment, InspectionReport, InspectionCharacteristic, CharacteristicStatistics, DrawingRevision,
+)
 from .serializers import (
     EquipmentSerializer,
     InspectionReportListSerializer,
     InspectionReportDetailSerializer,
-    InspectionCharacteristicSerializer
+    InspectionCharacteristicSerializer,
+    CharacteristicStatisticsSerializer,
+    DrawingRevisionSerializer,
+    DrawingRevisionChangeSerializer,
 )
 
-class EquipmentViewSet(viewsets.ModelViewSet):
+class EquipmentViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
 	queryset = Equipment.objects.all()
+	cache_models = ['quality.Equipment']
 	serializer_class = EquipmentSerializer
 	filter_backends = [filters.SearchFilter]
 	search_fields = ['name', 'serial_number']
+	ordering = ['name']
+	cached_actions = ('list', 'retrieve', 'impact')
+
+	def get_queryset(self):
+		return super().get_queryset().order_by(*self.ordering, 'id')
 
 	@action(detail=False, methods=['get'])
 	def calibration_due(self, request):
-		due_equipment = [eq for eq in self.get_queryset() if eq.is_calibration_due()]
-		serializer = EquipmentSerializer(due_equipment, many=True)
+		due_equipment = self.filter_queryset(
+			self.get_queryset().calibration_due().order_by('next_calibration_due', 'id')
+		)
+		page = self.paginate_queryset(due_equipment)
+		if page is not None:
+			serializer = self.get_serializer(page, many=True)
+			return self.get_paginated_response(serializer.data)
+		serializer = self.get_serializer(due_equipment, many=True)
 		return Response(serializer.data)
-	
-class InspectionReportViewSet(viewsets.ModelViewSet):
-	queryset = InspectionReport.objects.prefetch_related('characteristics')
+
+	impact_models = [
+		'quality.Equipment', 'quality.InspectionCharacteristic', 'quality.InspectionReport',
+		'production.Job', 'production.Customer',
+	]
+
+	def impact_window(self, request, equipment):
+		"""(since, until) from the query string; since defaults to the last good calibration"""
+		window = []
+		for name, default in (('since', equipment.last_calibration_date), ('until', None)):
+			value = request.query_params.get(name)
+			date = parse_date(value) if value else default
+			if value and date is None:
+				raise ValueError(f"{name} is not a date")
+			window.append(date)
+		return window
+
+	@action(detail=True, methods=['get'], cache_models=impact_models)
+	def impact(self, request, pk=None):
+		"""Reports, jobs and customers measured with this gauge ?since=YYYY-MM-DD (default: last calibration)&until="""
+		equipment = self.get_object()
+		try:
+			since, until = self.impact_window(request, equipment)
+		except ValueError:
+			return Response({"error": "since and until must be dates (YYYY-MM-DD)"}, status=400)
+		characteristics = recall.affected_characteristics(equipment, since, until)
+
+		totals = {'equipment': equipment.pk, 'since': since, 'until': until, **recall.impact_totals(characteristics)}
+		reports = recall.affected_reports(characteristics)
+		page = self.paginate_queryset(reports)
+		if page is not None:
+			response = self.get_paginated_response(page)
+			response.data = {**totals, **response.data}
+			return response
+		return Response({**totals, 'results': list(reports)})
+
+	@action(detail=True, methods=['get'], url_path='impact/export')
+	def impact_export(self, request, pk=None):
+		"""Every affected characteristic with its report, job and customer as ?file_format=csv|xlsx"""
+		equipment = self.get_object()
+		file_format = request.query_params.get('file_format', 'csv')
+		if file_format not in ('csv', 'xlsx'):
+			return Response({"error": "file_format must be one of csv, xlsx"}, status=400)
+		try:
+			since, until = self.impact_window(request, equipment)
+		except ValueError:
+			return Response({"error": "since and until must be dates (YYYY-MM-DD)"}, status=400)
+
+		characteristics = recall.affected_characteristics(equipment, since, until).order_by('measured_at', 'id')
+		rows = iter_rows(characteristics, recall.EXPORT_COLUMNS)
+		filename = f"recall-equipment-{equipment.pk}-{since:%Y%m%d}"
+		if file_format == 'xlsx':
+			return xlsx_response(rows, recall.EXPORT_COLUMNS, filename, title='Recall impact')
+		return csv_response(rows, recall.EXPORT_COLUMNS, filename)
+
+class CalibrationDueAsyncView(AsyncListView):
+	viewset = EquipmentViewSet
+	action = 'calibration_due'
+
+	def get_queryset(self, viewset):
+		return viewset.get_queryset().calibration_due().order_by('next_calibration_due', 'id')
+
+class InspectionReportViewSet(CachedResponseMixin, ExportMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
+	queryset = InspectionReport.objects.all()
+	cache_models = ['quality.InspectionReport', 'quality.InspectionCharacteristic', 'quality.Equipment']
 	filter_backends = [filters.SearchFilter, DjangoFilterBackend]
 	search_fields = ['fai_report_number', 'part_number']
 	filterset_fields = ['status', 'inspection_type']
 	ordering = ['-created_at']
 
+	def get_queryset(self):
+		# No OrderingFilter here: the id keeps pages stable among reports created the same day
+		return super().get_queryset().order_by(*self.ordering, '-id')
+
+	# AS9102 Form 3: one row per characteristic with its report header repeated
+	export_filename = 'inspections'
+	export_columns = [
+		('FAI Report Number', 'fai_report_number'),
+		('Inspection Type', 'inspection_type'),
+		('Part Number', 'part_number'),
+		('Part Name', 'part_name'),
+		('Serial Number', 'serial_number'),
+		('Job Number', 'job__job_number'),
+		('Customer', 'job__customer__name'),
+		('Inspector', 'inspector_name'),
+		('Inspection Date', 'inspection_date'),
+		('Report Status', 'status'),
+		('Char No.', 'characteristics__char_number'),
+		('Characteristic', 'characteristics__description'),
+		('Requirement', 'characteristics__requirement'),
+		('Nominal', 'characteristics__nominal_value'),
+		('Upper Tolerance', 'characteristics__upper_tolerance'),
+		('Lower Tolerance', 'characteristics__lower_tolerance'),
+		('Actual', 'characteristics__actual_value'),
+		('Pass', 'characteristics__pass_fail'),
+		('Equipment', 'characteristics__equipment_used__name'),
+		('Equipment Serial', 'characteristics__equipment_used__serial_number'),
+	]
+
+	def get_export_queryset(self, queryset):
+		return queryset.order_by(*self.ordering, 'pk', 'characteristics__char_number', 'characteristics__id')
+
+	@action(detail=True, methods=['get'])
+	def as9102(self, request, pk=None):
+		"""AS9102 Forms 1-3 as ?file_format=pdf|xlsx; 202 with a task status URL while rendering"""
+		file_format = request.query_params.get('file_format', 'pdf')
+		if file_format not in FORMATS:
+			return Response({"error": f"file_format must be one of {', '.join(FORMATS)}"}, status=400)
+		report = get_object_or_404(AS9102Document.queryset(), pk=pk)
+		self.check_object_permissions(request, report)
+		document = AS9102Document(report, file_format)
+
+		if not document.exists():
+			result = enqueue_render(tasks.render_as9102, document.path, report.pk, file_format, document.path)
+			if not document.exists():
+				return pending_response(request, result, download_url=request.build_absolute_uri())
+		return artifact_response(request, document.path, document.filename, document.content_type)
+
+	@action(detail=True, methods=['post'], url_path='cmm-import', parser_classes=[MultiPartParser])
+	def cmm_import(self, request, pk=None):
+		"""Record actual values and pass/fail from an uploaded CMM results file (see quality/cmm.py)"""
+		report = self.get_object()
+		upload = request.FILES.get('file')
+		if upload is None:
+			return Response({"error": "Upload the CMM results as 'file'"}, status=400)
+		file_format = request.data.get('file_format') or cmm.format_for(upload.name)
+
+		equipment, equipment_id = None, request.data.get('equipment')
+		if equipment_id:
+			if str(equipment_id).isdigit():
+				equipment = Equipment.objects.filter(pk=equipment_id).first()
+			if equipment is None:
+				return Response({"error": "Unknown equipment"}, status=400)
+
+		try:
+			result = cmm.import_measurements(report, upload, file_format, equipment=equipment)
+		except cmm.CMMFileError as exc:
+			return Response({"error": str(exc)}, status=400)
+		return Response(result)
+
 	def get_serializer_class(self):
 		if self.action == 'list':
 			return InspectionReportListSerializer
 		return InspectionReportDetailSerializer
 	
-class InspectionCharacteristicViewSet(viewsets.ModelViewSet):
+class InspectionListAsyncView(AsyncListView):
+	viewset = InspectionReportViewSet
+
+class InspectionCharacteristicViewSet(CachedResponseMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
 	queryset = InspectionCharacteristic.objects.all()
+	cache_models = ['quality.InspectionCharacteristic', 'quality.Equipment']
 	serializer_class = InspectionCharacteristicSerializer
-	filterset_fields = ['report', 'pass_fail']
\ No newline at end of file
+	filterset_fields = ['report', 'pass_fail']
+	ordering = ['report_id', 'char_number']
+
+	def get_queryset(self):
+		return super().get_queryset().order_by(*self.ordering, 'id')
+
+class CharacteristicStatisticsViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+	"""Process capability per part_number + char_number across reports (see quality/spc.py)"""
+	queryset = CharacteristicStatistics.objects.all()
+	cache_models = ['quality.CharacteristicStatistics']
+	serializer_class = CharacteristicStatisticsSerializer
+	filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+	search_fields = ['part_number', 'description']
+	filterset_fields = ['part_number', 'char_number']
+	ordering = ['part_number', 'char_number']
+	cached_actions = ('list', 'retrieve', 'chart')
+
+	def get_queryset(self):
+		return super().get_queryset().order_by(*self.ordering)
+
+	@action(detail=True, methods=['get'], cache_models=[
+		'quality.CharacteristicStatistics', 'quality.InspectionCharacteristic', 'quality.InspectionReport',
+	])
+	def chart(self, request, pk=None):
+		"""?type=individuals|xbar-r&subgroup_size=2..10&limit=N over the most recent values"""
+		chart_type = request.query_params.get('type', 'individuals')
+		if chart_type not in ('individuals', 'xbar-r'):
+			return Response({"error": "type must be individuals or xbar-r"}, status=400)
+		try:
+			subgroup_size = int(request.query_params.get('subgroup_size', 5))
+			limit = int(request.query_params.get('limit', spc.DEFAULT_CHART_LIMIT))
+		except ValueError:
+			return Response({"error": "subgroup_size and limit must be whole numbers"}, status=400)
+		if subgroup_size not in spc.XBAR_R_CONSTANTS:
+			return Response({"error": "subgroup_size must be between 2 and 10"}, status=400)
+		if not 2 <= limit <= spc.MAX_CHART_LIMIT:
+			return Response({"error": f"limit must be between 2 and {spc.MAX_CHART_LIMIT}"}, status=400)
+
+		statistics = self.get_object()
+		return Response(spc.chart(statistics, chart_type, subgroup_size, limit))
+
+class DrawingRevisionViewSet(
+	CachedResponseMixin,
+	mixins.CreateModelMixin,
+	mixins.ListModelMixin,
+	mixins.RetrieveModelMixin,
+	viewsets.GenericViewSet,
+):
+	"""Revisions are applied on create (see quality/revisions.py) and kept unchanged as an audit trail"""
+	queryset = DrawingRevision.objects.all()
+	cache_models = ['quality.DrawingRevision']
+	serializer_class = DrawingRevisionSerializer
+	filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+	search_fields = ['part_number', 'revision']
+	filterset_fields = ['part_number']
+	ordering = ['-created_at']
+
+	def get_queryset(self):
+		return super().get_queryset().order_by(*self.ordering, '-id')
+
+	@action(detail=True, methods=['get'], serializer_class=DrawingRevisionChangeSerializer)
+	def changes(self, request, pk=None):
+		"""Each characteristic the revision updated, with its values before and pass/fail after"""
+		changes = self.get_object().changes.order_by('report_id', 'char_number', 'id')
+		page = self.paginate_queryset(changes)
+		if page is not None:
+			return self.get_paginated_response(self.get_serializer(page, many=True).data)
+		return Response(self.get_serializer(changes, many=True).data)